@@ -4,6 +4,7 @@ set -e
 # Run Django setup tasks
 python ./homelab_operator/manage.py makemigrations
 python ./homelab_operator/manage.py migrate
+python ./homelab_operator/manage.py createcachetable
 python ./homelab_operator/manage.py create_default_superuser
 
 # Write environment variables to /etc/environment
@@ -31,6 +32,12 @@ else
   nginx -c /app/nginx/ingress-handler.conf
 fi
 
+# Start the background status poller
+python ./homelab_operator/manage.py poll_status &
+
+# Start the background auto-discovery job runner
+python ./homelab_operator/manage.py run_discovery_jobs &
+
 # Start gunicorn (in foreground)
 cd ./homelab_operator
 exec gunicorn homelab_operator.wsgi:application --bind 127.0.0.1:8000 --worker-class=gevent
@@ -101,6 +101,26 @@ else:
             'NAME': BASE_DIR / 'db.sqlite3',
     }}
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Probe results, shared by all gunicorn workers (created by `manage.py createcachetable`)
+    'status': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'webui_status_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Minutes between two calls of the cron endpoint, see the crontab entry of the Dockerfile
+CRON_INTERVAL_MINUTES = int(os.getenv('CRON_INTERVAL_MINUTES', 10))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -1,48 +1,92 @@
 /**
- * Checks the server status and updates the status dot class.
- * @param {string} endpoint - The URL to check.
- * @param {string} dotId - The DOM element ID of the status dot.
+ * Sets the status class of a status dot.
+ * @param {Element} dot - The status dot element.
+ * @param {string} statusClass - One of success-dot, error-dot, warning-dot, unknown-dot.
+ * @param {string} [message] - Optional tooltip text (used for warnings).
  */
-async function check_online(endpoint, dotId) {
+function set_dot_status(dot, statusClass, message) {
+    if (!dot) return;
+
+    // Remove all possible status classes and previous tooltips first
+    dot.classList.remove('success-dot', 'error-dot', 'warning-dot', 'unknown-dot', 'tooltip');
+    dot.querySelectorAll('.tooltiptext').forEach(tooltip => tooltip.remove());
+    dot.classList.add(statusClass);
+
+    if (message) {
+        dot.classList.add('tooltip');
+        tooltiptext = document.createElement('span');
+        tooltiptext.className = 'tooltiptext';
+        dot.appendChild(tooltiptext);
+        tooltiptext.innerHTML = message;
+    }
+    dot.classList.remove('loading-dot');
+}
+
+/**
+ * Updates a status dot from a status value of the batch status API.
+ * @param {Element} dot - The status dot element.
+ * @param {boolean|string|undefined} state - true (online), false (offline) or an error message.
+ */
+function set_dot_state(dot, state) {
+    if (state === true) {
+        set_dot_status(dot, 'success-dot'); // Online
+    } else if (state === false) {
+        set_dot_status(dot, 'error-dot');   // Offline
+    } else if (typeof state === 'string') {
+        set_dot_status(dot, 'warning-dot', state); // Error message
+    } else {
+        set_dot_status(dot, 'unknown-dot'); // Unknown or network error
+    }
+}
+
+/**
+ * Applies a (partial) status document to all status dots (server_<id> / service_<id>).
+ * @param {object} status - {"servers": {"<id>": state}, "services": {"<id>": state}}.
+ */
+function apply_status(status) {
+    for (const kind of ['server', 'service']) {
+        const states = status[`${kind}s`] || {};
+        for (const [id, state] of Object.entries(states)) {
+            document.querySelectorAll(`#${kind}_${id}`).forEach(dot => set_dot_state(dot, state));
+        }
+    }
+}
+
+/**
+ * Fetches the status of all servers and services of a homelab in one request
+ * and updates every status dot (server_<id> / service_<id>) on the page.
+ * @param {string} endpoint - The batch status URL, e.g. /status/<api_key>/<homelab_id>/.
+ */
+async function check_online_batch(endpoint) {
     try {
         const response = await fetch(endpoint, { method: 'GET' });
-
-        const dots = document.querySelectorAll(`#${dotId}`);
-        dots.forEach(async function(dot) {
-            //const dot = document.getElementById(dotId);
-
-            if (!dot) return;
-
-            // Remove all possible status classes first
-            dot.classList.remove('success-dot', 'error-dot', 'warning-dot', 'unknown-dot');
-
-            if (response.status === 200) {
-                dot.classList.add('success-dot'); // Online
-            } else if (response.status === 503) {
-                dot.classList.add('error-dot');   // Offline
-            } else if (response.status === 400 || response.status === 403) {
-                dot.classList.add('unknown-dot'); // Unknown
-            } else {
-                dot.classList.add('warning-dot'); // Bad request
-                const body = await response.text();
-
-                dot.classList.add('tooltip');
-                tooltiptext = document.createElement('span');
-                tooltiptext.className = 'tooltiptext';
-                dot.appendChild(tooltiptext);
-                tooltiptext.innerHTML = body;
-            }
-            dot.classList.remove('loading-dot');
-        });
+        if (response.status === 200) {
+            apply_status(await response.json());
+        }
     } catch (error) {
-        const dots = document.querySelectorAll(`#${dotId}`);
-        dots.forEach(dot => {
-            dot.classList.remove('success-dot', 'error-dot', 'warning-dot', 'unknown-dot');
-            dot.classList.add('unknown-dot'); // Network error
-        });
+        // Network error, remaining dots are set to unknown below
     }
+
+    document.querySelectorAll('.indicator-dot.loading-dot').forEach(dot => {
+        set_dot_state(dot, undefined);
+    });
+}
+
+/**
+ * Subscribes to the server-sent status stream and updates status dots on every change.
+ * The browser reconnects automatically when the stream is closed by the server.
+ * @param {string} endpoint - The stream URL, e.g. /status_stream/<api_key>/<homelab_id>/.
+ */
+function watch_status(endpoint) {
+    if (!window.EventSource) return;
+
+    const source = new EventSource(endpoint);
+    source.onmessage = function(event) {
+        apply_status(JSON.parse(event.data));
+    };
 }
 
 // Example usage:
-// <div id="status-dot" class="indicator-dot unknown-dot">&nbsp;</div>
-// checkServerStatus('/api/status', 'status-dot');
+// <div id="server_1" class="indicator-dot loading-dot">&nbsp;</div>
+// check_online_batch('/status/<api_key>/<homelab_id>/');
+// watch_status('/status_stream/<api_key>/<homelab_id>/');
@@ -3,7 +3,7 @@ from django.contrib.contenttypes.admin import GenericTabularInline
 
 from .models import Server, Service, Network, WOLSchedule, ShutdownURLConfiguration, Homelab, \
     Wiki, UserProfile, ServerUptimeStatistic, AppState, Ingress, MaintenancePlan, \
-    MaintenanceReport
+    MaintenanceReport, DiscoveryJob, UptimeRollup
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -57,4 +57,14 @@ class MaintenancePlanAdmin(admin.ModelAdmin):
 
 @admin.register(MaintenanceReport)
 class MaintenanceReportAdmin(admin.ModelAdmin):
-    list_display = ('certifier', 'result', 'date')
\ No newline at end of file
+    list_display = ('certifier', 'result', 'date')
+
+@admin.register(DiscoveryJob)
+class DiscoveryJobAdmin(admin.ModelAdmin):
+    list_display = ('task_id', 'network', 'status', 'created_at', 'finished_at')
+    list_filter = ('status',)
+
+@admin.register(UptimeRollup)
+class UptimeRollupAdmin(admin.ModelAdmin):
+    list_display = ('bucket', 'level', 'server', 'service', 'online', 'total')
+    list_filter = ('level',)
@@ -4,7 +4,7 @@ from django.forms import ModelForm, DateTimeInput, BooleanField, CharField, Text
     ModelMultipleChoiceField, CheckboxSelectMultiple, ChoiceField, Select, ValidationError, \
     DateInput
 from .models import Server, Service, Network, WOLSchedule, ShutdownURLConfiguration, Homelab, \
-    Wiki, UserProfile, Ingress, MaintenancePlan, MaintenanceReport
+    Wiki, UserProfile, Ingress, MaintenancePlan, MaintenanceReport, ServerUptimeStatistic
 from .widgets import HoCheckbox
 from django.utils.safestring import mark_safe
 
@@ -128,6 +128,12 @@ class ShutdownURLConfigurationForm(ModelForm):
         model = ShutdownURLConfiguration
         fields = '__all__'
 
+class ServerUptimeStatisticForm(ModelForm):
+    '''Form for configuring the estimator of ServerUptimeStatistic instances.'''
+    class Meta:
+        model = ServerUptimeStatistic
+        fields = ['estimator', 'window_days', 'half_life_days']
+
 class HomelabForm(ModelForm):
     '''Form for creating and updating Homelab instances.'''
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,126 @@
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.core.cache import caches
+
+from ..models import AppState, UptimeRollup
+from .uptime import bucket_counts, bucket_start, histogram_percentile, series_level, \
+    server_latency_counts, UPTIME_HOUR_RETENTION_DAYS
+
+ANALYTICS_CACHE_TTL = 60  # Seconds, for ranges that include buckets not rolled up yet
+ANALYTICS_CLOSED_CACHE_TTL = 60 * 60 * 24  # For ranges that are completely rolled up
+
+def load_buckets(server_ids, start, end, level):
+    '''Loads the level buckets of the servers between start and end as columnar
+    arrays (server id, bucket start in epoch seconds, online, total), sorted by
+    server and bucket. Rolled up buckets are read as they are, the most recent
+    ones are built by bucket_counts().'''
+    rolled_up = AppState.ensure_exists().last_uptime_rollup
+    start = bucket_start(start, level)
+    rolled = max(start, min(end, bucket_start(rolled_up, level))) if rolled_up else start
+    rows = list(UptimeRollup.objects.filter(level=level, server_id__in=server_ids,
+                                            bucket__gte=start, bucket__lt=rolled)
+                .values_list('server_id', 'bucket', 'online', 'total'))
+    if rolled < end:
+        rows += [(key[0], key[2], online, total) for key, (online, total) in bucket_counts(
+            level, rolled, end, rolled_up, server_id__in=server_ids).items()]
+
+    size = len(rows)
+    servers = np.fromiter((row[0] for row in rows), dtype=np.int64, count=size)
+    buckets = np.fromiter((row[1].timestamp() for row in rows), dtype=np.float64, count=size)
+    online = np.fromiter((row[2] for row in rows), dtype=np.float64, count=size)
+    total = np.fromiter((row[3] for row in rows), dtype=np.float64, count=size)
+    order = np.lexsort((buckets, servers))
+    return servers[order], buckets[order], online[order], total[order]
+
+def outage_intervals(servers, buckets, down, duration):
+    '''Finds runs of consecutive down buckets of the same server. Buckets without
+    probes end a run. Returns the arrays (server id, start, end) of the runs.'''
+    if not len(down):
+        empty = np.array([], dtype=np.float64)
+        return np.array([], dtype=np.int64), empty, empty
+    adjacent = (servers[1:] == servers[:-1]) & (buckets[1:] - buckets[:-1] == duration)
+    begins = down & ~np.concatenate(([False], adjacent & down[:-1]))
+    ends = down & ~np.concatenate((adjacent & down[1:], [False]))
+    return servers[begins], buckets[begins], buckets[ends] + duration
+
+def iso(seconds):
+    '''Formats epoch seconds as ISO 8601 (UTC).'''
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc).isoformat()
+
+def uptime_report(servers, start, end):
+    '''Computes availability, outage intervals, MTBF, MTTR and RTT percentiles of
+    the servers between start and end.
+
+    Availability is the share of online probes. Buckets of the level picked by
+    series_level() in which fewer than half of the probes were online count as
+    down, consecutive down buckets form an outage. MTTR is the mean outage duration,
+    MTBF the observed up time divided by the number of outages. RTT percentiles are
+    estimated from the hourly latency histograms (see server_latency_counts()), so
+    they cover whole hours and only the last UPTIME_HOUR_RETENTION_DAYS days;
+    rtt_probes is the number of probes they are based on. Results are cached per
+    servers and range.'''
+    servers = list(servers)
+    server_ids = sorted(server.id for server in servers)
+    level = series_level(start, end)
+    rolled_up = AppState.ensure_exists().last_uptime_rollup
+    digest = hashlib.sha1(','.join(map(str, server_ids)).encode()).hexdigest()
+    key = f'uptime_report:{digest}:{start.timestamp():.0f}:{end.timestamp():.0f}:{level}'
+    report = caches['status'].get(key)
+    if report is not None:
+        return report
+
+    duration = UptimeRollup.LEVEL_DURATIONS[level].total_seconds()
+    ids, buckets, online, total = load_buckets(server_ids, start, end, level)
+    down = online * 2 < total
+    positions = np.searchsorted(server_ids, ids)
+    size = len(server_ids)
+    online_sum = np.bincount(positions, weights=online, minlength=size)
+    total_sum = np.bincount(positions, weights=total, minlength=size)
+    observed = np.bincount(positions, minlength=size) * duration
+    downtime = np.bincount(positions, weights=down, minlength=size) * duration
+
+    outage_ids, outage_starts, outage_ends = outage_intervals(ids, buckets, down, duration)
+    failures = np.bincount(np.searchsorted(server_ids, outage_ids), minlength=size)
+    rtts = server_latency_counts(server_ids, start, end)
+
+    outages = {server_id: [] for server_id in server_ids}
+    for server_id, outage_start, outage_end in zip(outage_ids.tolist(), outage_starts.tolist(),
+                                                   outage_ends.tolist()):
+        outages[server_id].append({
+            'start': iso(outage_start),
+            'end': iso(outage_end),
+            'duration': outage_end - outage_start,
+        })
+
+    names = {server.id: server.name for server in servers}
+    report = {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'level': level,
+        'rtt_retention_days': UPTIME_HOUR_RETENTION_DAYS,
+        'availability': float(online_sum.sum() / total_sum.sum() * 100)
+            if total_sum.sum() else None,
+        'servers': {},
+    }
+    for index, server_id in enumerate(server_ids):
+        report['servers'][server_id] = {
+            'name': names[server_id],
+            'availability': float(online_sum[index] / total_sum[index] * 100)
+                if total_sum[index] else None,
+            'probes': int(total_sum[index]),
+            'downtime': float(downtime[index]),
+            'outages': outages[server_id],
+            'mttr': float(downtime[index] / failures[index]) if failures[index] else None,
+            'mtbf': float((observed[index] - downtime[index]) / failures[index])
+                if failures[index] else None,
+            'rtt_p50': histogram_percentile(rtts.get(server_id, ()), 0.5),
+            'rtt_p95': histogram_percentile(rtts.get(server_id, ()), 0.95),
+            'rtt_probes': sum(rtts.get(server_id, ())),
+        }
+
+    closed = rolled_up is not None and end <= bucket_start(rolled_up, level)
+    caches['status'].set(key, report,
+                         timeout=ANALYTICS_CLOSED_CACHE_TTL if closed else ANALYTICS_CACHE_TTL)
+    return report
@@ -1,90 +1,194 @@
-import subprocess
+import os
+import re
+import html
 import requests
 import ipaddress
 import socket
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
 
-from django.core.cache import cache
+from .ping import liveness_sweep, ping_hosts, icmp6_multicast_echo
+from .neighbors import read_neighbor_table, local_ipv6_addresses, mdns_responders, \
+    normalize_mac
+from .probe import probe_targets
+from .resolver import resolve_hostnames
+
+DISCOVERY_CONCURRENCY = int(os.getenv('DISCOVERY_CONCURRENCY', '128'))  # Hosts pinged in parallel
+DISCOVERY_RATE = float(os.getenv('DISCOVERY_RATE', '200'))  # Max. pings started per second
+# Back off concurrency and rate while timeouts rise (AIMD)
+DISCOVERY_ADAPTIVE = os.getenv('DISCOVERY_ADAPTIVE', 'True') == 'True'
+# Larger IPv4 prefixes (and all IPv6 prefixes) are not swept, only neighbors are discovered
+DISCOVERY_MAX_SWEEP_ADDRESSES = int(os.getenv('DISCOVERY_MAX_SWEEP_ADDRESSES', '4096'))
+DISCOVERY_NEIGHBOR_TIMEOUT = 1  # Seconds to wait for multicast echo and mDNS replies
+
+# Service fingerprinting: TCP ports checked on every live host (comma separated)
+DISCOVERY_PORTS = [int(port) for port in os.getenv(
+    'DISCOVERY_PORTS', '21,22,25,80,443,445,3000,3306,5432,8006,8080,8123,8443,9000,9090,32400'
+    ).split(',') if port.strip()]
+DISCOVERY_SERVICE_CONCURRENCY = int(os.getenv('DISCOVERY_SERVICE_CONCURRENCY', '64'))
+DISCOVERY_CONNECT_TIMEOUT = 1  # Seconds, port connect phase
+DISCOVERY_PROBE_TIMEOUT = 2  # Seconds, protocol probe phase
+DISCOVERY_PORT_PROTOCOLS = {
+    21: 'ftp',
+    22: 'ssh',
+    25: 'smtp',
+    80: 'http',
+    443: 'https',
+    445: 'smb',
+    3000: 'http',
+    3306: 'mysql',
+    5432: 'postgresql',
+    8006: 'https',  # Proxmox Web Interface
+    8080: 'http',
+    8123: 'http',  # Home Assistant
+    8443: 'https',
+    9000: 'http',
+    9090: 'http',
+    32400: 'http',  # Plex
+}
+DISCOVERY_TITLE_MAX_BYTES = 64 * 1024  # Bytes of a web page read to find its <title>
+DISCOVERY_DEFAULT_PORTS = {'ftp': 21, 'ssh': 22, 'smtp': 25}
+DISCOVERY_PROTOCOL_NAMES = {
+    'ftp': 'FTP Server',
+    'ssh': 'SSH Server',
+    'smtp': 'SMTP Mail Server',
+    'smb': 'SMB File Share',
+    'mysql': 'MySQL/MariaDB Database Server',
+    'postgresql': 'PostgreSQL Database Server',
+}
+
+# Page title signatures (case insensitive) -> product name, in order of precedence
+SERVICE_SIGNATURES = [
+    ('homelab operator', 'Homelab Operator'),
+    ('opnsense', 'OPNsense Firewall'),
+    ('nginx', 'Generic Nginx Web Server'),
+    ('nextcloud', 'Nextcloud'),
+    ('paperless', 'Paperless-ngx Document Management'),
+    ('jellyfin', 'Jellyfin Media Server'),
+    ('home assistant', 'Home Assistant'),
+    ('portainer', 'Portainer'),
+    ('traefik', 'Traefik Reverse Proxy'),
+    ('unraid', 'Unraid Server'),
+    ('proxmox', 'Proxmox Virtual Environment'),
+    ('pi-hole', 'Pi-hole DNS Ad Blocker'),
+    ('grafana', 'Grafana Dashboard'),
+    ('mysql', 'MySQL/MariaDB Database Server'),
+    ('mariadb', 'MySQL/MariaDB Database Server'),
+]
+SERVICE_SIGNATURE_PATTERN = re.compile('|'.join(
+    f'(?P<s{index}>{re.escape(signature)})'
+    for index, (signature, _) in enumerate(SERVICE_SIGNATURES)), re.IGNORECASE)
+TITLE_PATTERN = re.compile(rb'<title[^>]*>(.*?)</title\s*>', re.IGNORECASE | re.DOTALL)
+TITLE_END_PATTERN = re.compile(rb'</title', re.IGNORECASE)
 
 def ping_host(ip):
-    # Use system ping for simplicity (Linux)
-    # TODO implement fallback or a pure Python ping
-    try:
-        output = subprocess.check_output(['ping', '-c', '1', '-W', '1', ip])
-        return True
-    except subprocess.CalledProcessError:
-        return False
+    '''Checks if a single host is alive (ICMP echo, TCP as fallback).'''
+    return ping_hosts([ip]).get(ip, False)
+
+def ping_sweep(hosts, concurrency=DISCOVERY_CONCURRENCY, rate=DISCOVERY_RATE, rtts=None,
+               adaptive=DISCOVERY_ADAPTIVE):
+    '''Pings hosts in parallel and yields (ip, alive) tuples in the order of `hosts`.
+    At most `concurrency` pings are in flight and at most `rate` pings are started
+    per second, both are lowered while timeouts rise if `adaptive` is set. Round
+    trip times are stored in `rtts` if given.'''
+    return liveness_sweep(hosts, rate=rate, concurrency=concurrency, rtts=rtts,
+                          adaptive=adaptive)
+
+def extract_title(html_text):
+    '''Returns the content of the <title> tag of a HTML document, or None.'''
+    if isinstance(html_text, str):
+        html_text = html_text.encode('utf-8', errors='replace')
+    match = TITLE_PATTERN.search(html_text)
+    if not match:
+        return None
+    return html.unescape(match.group(1).decode('utf-8', errors='replace')).strip()
+
+def fetch_title(url, timeout=DISCOVERY_PROBE_TIMEOUT, max_bytes=DISCOVERY_TITLE_MAX_BYTES):
+    '''Streams a web page and returns its title. Reads at most `max_bytes` and
+    closes the connection as soon as the closing </title> tag was received.
+    Raises requests exceptions if the page cannot be fetched.'''
+    buffer = b''
+    with requests.get(url, timeout=timeout, verify=False, stream=True) as response:  # TODO Insecure HTTPS request?
+        for chunk in response.iter_content(chunk_size=4096):
+            buffer += chunk
+            if TITLE_END_PATTERN.search(buffer, max(0, len(buffer) - len(chunk) - 8)) \
+                    or len(buffer) >= max_bytes:
+                break
+    return extract_title(buffer[:max_bytes])
+
+def match_service_name(title):
+    '''Maps a page title to a well-known product name using SERVICE_SIGNATURES.
+    All signatures are matched in a single pass; if several match, the one listed
+    first in SERVICE_SIGNATURES wins.'''
+    if not title:
+        return 'Unknown'
+    matches = [int(match.lastgroup[1:]) for match in SERVICE_SIGNATURE_PATTERN.finditer(title)]
+    if matches:
+        return SERVICE_SIGNATURES[min(matches)][1]
+    return title.strip() or 'Unknown'
 
 def evaluate_service_name(response_text):
-    soup = BeautifulSoup(response_text, 'html.parser')
-    title_tag = soup.title
-    name = title_tag.string if title_tag and title_tag.string else 'Unknown'
-
-    lowered = name.lower()
-    if 'homelab operator' in lowered:
-        name = 'Homelab Operator'
-    elif 'opnsense' in lowered:
-        name = 'OPNsense Firewall'
-    elif 'nginx' in lowered:
-        name = 'Generic Nginx Web Server'
-    elif 'nextcloud' in lowered:
-        name = 'Nextcloud'
-    elif 'paperless' in lowered:
-        name = 'Paperless-ngx Document Management'
-    elif 'jellyfin' in lowered:
-        name = 'Jellyfin Media Server'
-    elif 'home assistant' in lowered:
-        name = 'Home Assistant'
-    elif 'portainer' in lowered:
-        name = 'Portainer'
-    elif 'traefik' in lowered:
-        name = 'Traefik Reverse Proxy'
-    elif 'unraid' in lowered:
-        name = 'Unraid Server'
-    elif 'proxmox' in lowered:
-        name = 'Proxmox Virtual Environment'
-    elif 'pi-hole' in lowered:
-        name = 'Pi-hole DNS Ad Blocker'
-    elif 'grafana' in lowered:
-        name = 'Grafana Dashboard'
-    elif 'mysql' in lowered or 'mariadb' in lowered:
-        name = 'MySQL/MariaDB Database Server'
-    else:
-        name = name.strip() or 'Unknown'
-
-    return name
-
-def check_http(ip):
-    services = []
-    port_schemes = [
-        (443, 'https'),
-        (80, 'http'),
-        (8006, 'https'),  # Proxmox Web Interface
-        ]
-    for port, scheme in port_schemes:
-        try:
-            url = f'{scheme}://{ip}'
-            response = requests.get(url, timeout=2, verify=False)  # TODO Insecure HTTPS request?
-            if response.text:
-                name = evaluate_service_name(response.text)
-            else:
-                name = 'Unknown'
-            services.append({
-                    'name': name,
-                    'endpoint': ip,
-                    'port': port,
-                    'url': url,
-                })
-            break
-        except Exception:
-            continue
+    '''Names a service after the title of its web page.'''
+    return match_service_name(extract_title(response_text))
 
-    return services
+def url_host(ip):
+    '''Returns the host part of an URL for an ip, IPv6 addresses are bracketed.'''
+    return f'[{ip}]' if ':' in ip else ip
+
+def check_http(ip, port=80, scheme='http', timeout=DISCOVERY_PROBE_TIMEOUT):
+    '''Fetches the web page on ip:port and names the service after its title.
+    Returns a service dict. If the page cannot be fetched, the open port is still
+    reported, as an unknown service.'''
+    default_port = {'http': 80, 'https': 443}[scheme]
+    host = url_host(ip)
+    url = f'{scheme}://{host}' if port == default_port else f'{scheme}://{host}:{port}'
+    try:
+        name = match_service_name(fetch_title(url, timeout=timeout))
+    except Exception:
+        name = f'Unknown Service (Port {port})'
+    return {
+        'name': name,
+        'endpoint': ip,
+        'port': port,
+        'url': url,
+    }
+
+def check_banner(ip, port, protocol, timeout=DISCOVERY_PROBE_TIMEOUT):
+    '''Reads the greeting banner of line based protocols (SSH, FTP, SMTP).
+    Returns a service dict named after the protocol and the banner.'''
+    name = DISCOVERY_PROTOCOL_NAMES[protocol]
+    try:
+        with socket.create_connection((ip, port), timeout=timeout) as sock:
+            banner = sock.recv(256).decode(errors='replace').splitlines()
+        if banner and banner[0].strip():
+            name = f'{name} ({banner[0].strip()[:60]})'
+    except OSError:
+        pass
+    return {
+        'name': name,
+        'endpoint': ip,
+        'port': port,
+        'url': f'{protocol}://{url_host(ip)}' if port == DISCOVERY_DEFAULT_PORTS.get(protocol) \
+            else f'{protocol}://{url_host(ip)}:{port}',
+    }
+
+def check_service(ip, port):
+    '''Runs the protocol specific probe for an open TCP port.'''
+    protocol = DISCOVERY_PORT_PROTOCOLS.get(port, 'tcp')
+    if protocol in ('http', 'https'):
+        return check_http(ip, port, protocol)
+    if protocol in ('ssh', 'ftp', 'smtp'):
+        return check_banner(ip, port, protocol)
+    return {
+        'name': DISCOVERY_PROTOCOL_NAMES.get(protocol, f'Unknown Service (Port {port})'),
+        'endpoint': ip,
+        'port': port,
+        'url': f'{protocol}://{url_host(ip)}:{port}',
+    }
 
 def check_dns(ip):
+    sock = socket.socket(socket.AF_INET6 if ':' in ip else socket.AF_INET, socket.SOCK_DGRAM)
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.settimeout(2)
+        sock.settimeout(DISCOVERY_PROBE_TIMEOUT)
         # Standard DNS query for root (.)
         query = bytes([
             0xAA,  # Start byte or header
@@ -108,7 +212,7 @@ def check_dns(ip):
                 'name': 'DNS Service',
                 'endpoint': ip,
                 'port': 53,
-                'url': f'dns://{ip}'
+                'url': f'dns://{url_host(ip)}'
             }]
     except Exception:
         pass
@@ -117,74 +221,253 @@ def check_dns(ip):
 
     return []
 
-def discover_services(ip_str: str):
-    services = []
-    services.extend(check_http(ip_str))
-    services.extend(check_dns(ip_str))
-    # TODO Add more service checks (SSH, FTP, etc.)
+def fingerprint_hosts(ips, ports=DISCOVERY_PORTS, concurrency=DISCOVERY_SERVICE_CONCURRENCY,
+                      known=None):
+    '''Discovers the services of many hosts at once. Returns a dict of ip -> list of
+    service dicts.
 
+    Runs in two phases sharing one concurrency budget: first all (ip, port) pairs
+    are connected to (DISCOVERY_CONNECT_TIMEOUT), then protocol specific probes run
+    on every open port plus a DNS query per host (DISCOVERY_PROBE_TIMEOUT). Every
+    service found is reported, not only the first one.
+
+    `known` maps ips to the services found by a previous scan. Their ports are
+    connected to as well, open ports that were already known reuse the previous
+    service instead of probing it again, and DNS is only queried again if the
+    host served DNS before.
+    '''
+    ips = list(ips)
+    if not ips:
+        return {}
+    known = {ip: {service['port']: service for service in known[ip]}
+             for ip in ips if known and ip in known}
+
+    services = {ip: [] for ip in ips}
+    checks = []
+    targets = [(ip, port) for ip in ips for port in ports]
+    targets += [(ip, port) for ip in known for port in known[ip] if port not in ports and port != 53]
+    open_ports = probe_targets(targets, timeout=DISCOVERY_CONNECT_TIMEOUT, concurrency=concurrency)
+    for (ip, port), is_open in open_ports.items():
+        if not is_open:
+            continue
+        if port in known.get(ip, {}):
+            services[ip].append(known[ip][port])
+        else:
+            checks.append((check_service, (ip, port)))
+    checks += [(check_dns, (ip,)) for ip in ips if ip not in known or 53 in known[ip]]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(checks)))) as executor:
+        results = executor.map(lambda check: check[0](*check[1]), checks)
+        for (_, args), result in zip(checks, results):
+            if isinstance(result, list):
+                services[args[0]].extend(result)
+            elif result:
+                services[args[0]].append(result)
+
+    for ip in ips:
+        services[ip].sort(key=lambda service: service['port'])
     return services
 
-def discover_network_stream(subnet, task_id=None):
-    yield f'<!DOCTYPE html>\n'.encode()
-    yield '<style>html {font-family: \'Segoe UI\', Tahoma, Geneva, Verdana, sans-serif; padding: 1rem;}</style>'.encode()
-
-    yield f"Starting discovery on subnet {subnet}<br><br>".encode()
-
-    servers = []
-    servers_found = 0
-    net = ipaddress.ip_network(subnet)
-
-    for ip in net.hosts():
-        ip_str = str(ip)
-        yield f"Pinging {ip_str}... ".encode()
-
-        if ping_host(ip_str):
-            yield f"alive.<br>".encode()
-
-            # Reverse DNS
-            try:
-                hostname = socket.gethostbyaddr(ip_str)[0]
-            except Exception:
-                hostname = None
-            yield f"- Hostname: {hostname or 'N/A'}<br>".encode()
-
-            # MAC address via ARP
-            mac = None
-            try:
-                arp_output = subprocess.check_output(['arp', '-n', ip_str]).decode()
-                for line in arp_output.splitlines():
-                    if ip_str in line:
-                        parts = line.split()
-                        for part in parts:
-                            if ':' in part and len(part) == 17:
-                                mac = part
-                                break
-                        if mac:
-                            break
-            except Exception:
-                pass
-            yield f"- MAC: {mac or 'N/A'}<br>".encode()
-
-            # Service discovery
-            services = discover_services(ip_str)
-
-            servers.append({
-                'ip_address': ip_str,
-                'hostname': hostname,
-                'mac_address': mac,
-                'services': services
-            })
-
-            if services:
-                servers_found += 1
-                yield f"- Services: {services}<br>".encode()
-            else:
-                yield f"- No services found.<br>".encode()
+def diff_discovery(previous, servers):
+    '''Compares the servers of a discovery with the hosts known before it.
+    `previous` maps ips to {'mac_address', 'services'}. Returns a dict of
+    added and vanished ips and the changed hosts:
+        {
+            "added": ["192.168.0.5", ...],
+            "vanished": [...],
+            "changed": [{"ip_address": ..., "mac_address": [<old>, <new>] or None,
+                         "services_added": [<port>, ...], "services_removed": [...],
+                         "services_changed": [...]}, ...]
+        }
+    '''
+    current = {server['ip_address']: server for server in servers}
+    diff = {
+        'added': [ip for ip in current if ip not in previous],
+        'vanished': [ip for ip in previous if ip not in current],
+        'changed': [],
+    }
+    for ip, server in current.items():
+        if ip not in previous:
+            continue
+        old_mac = normalize_mac(previous[ip].get('mac_address'))
+        new_mac = normalize_mac(server.get('mac_address'))
+        old_services = {service['port']: service for service in previous[ip].get('services', [])}
+        new_services = {service['port']: service for service in server['services']}
+        change = {
+            'ip_address': ip,
+            'mac_address': [old_mac, new_mac] if old_mac and new_mac and old_mac != new_mac \
+                else None,
+            'services_added': sorted(set(new_services) - set(old_services)),
+            'services_removed': sorted(set(old_services) - set(new_services)),
+            'services_changed': sorted(port for port in set(new_services) & set(old_services)
+                                       if new_services[port]['name'] != old_services[port]['name']),
+        }
+        if change['mac_address'] or change['services_added'] or \
+                change['services_removed'] or change['services_changed']:
+            diff['changed'].append(change)
+    return diff
+
+def discover_services(ip_str: str):
+    '''Discovers the services of a single host, see fingerprint_hosts().'''
+    return fingerprint_hosts([ip_str])[ip_str]
+
+def parse_address_range(value, limit=DISCOVERY_MAX_SWEEP_ADDRESSES):
+    '''Returns the addresses of a range like "192.168.1.100-192.168.1.200" or a
+    subnet like "192.168.1.128/25" as strings. Invalid ranges and ranges of more
+    than `limit` addresses give an empty list.'''
+    try:
+        if '-' in value:
+            first, last = (ipaddress.ip_address(part.strip()) for part in value.split('-', 1))
+            if first.version != last.version or int(last) - int(first) >= limit:
+                return []
+            return [str(ipaddress.ip_address(address))
+                    for address in range(int(first), int(last) + 1)]
+        network = ipaddress.ip_network(value.strip(), strict=False)
+        if network.num_addresses > limit:
+            return []
+        return [str(ip) for ip in network.hosts()]
+    except (TypeError, ValueError):
+        return []
+
+def parse_subnets(value):
+    '''Parses a comma separated list of IPv4 and IPv6 prefixes, e.g.
+    "192.168.1.0/24, fd00::/64". Raises ValueError if a prefix is invalid.'''
+    return [ipaddress.ip_network(prefix.strip(), strict=False)
+            for prefix in (value or '').split(',') if prefix.strip()]
+
+def in_subnets(ip, subnets):
+    '''Checks if an ip is in any of the (parsed) subnets.'''
+    address = ipaddress.ip_address(ip)
+    return any(address in subnet for subnet in subnets)
+
+def discover_neighbors(subnets, timeout=DISCOVERY_NEIGHBOR_TIMEOUT):
+    '''Finds hosts in prefixes that are too large to sweep. Sends an ICMPv6 echo to
+    all nodes and a mDNS query from every local address in the IPv6 prefixes, a
+    mDNS query for IPv4, and then reads the kernel's neighbor table.
+    Returns (addresses, confirmed), confirmed addresses answered a query.'''
+    confirmed = set()
+    if any(subnet.version == 4 for subnet in subnets):
+        confirmed |= mdns_responders(4, timeout=timeout)
+    for address, ifindex in local_ipv6_addresses():
+        if in_subnets(str(address), [subnet for subnet in subnets if subnet.version == 6]):
+            confirmed |= icmp6_multicast_echo(address, ifindex, timeout=timeout)
+            confirmed |= mdns_responders(6, source=(address, ifindex), timeout=timeout)
+
+    neighbors = read_neighbor_table()
+    addresses = [ip for ip in dict.fromkeys([*sorted(confirmed), *neighbors])
+                 if in_subnets(ip, subnets)]
+    return addresses, confirmed.intersection(addresses)
+
+def discover_hosts(hosts, known, servers, confirmed=()):
+    '''Sweeps and fingerprints a list of addresses, see discover_network_stream().
+    Yields plain text progress lines and appends each discovered server to `servers`.
+    Hosts in `confirmed` are known to be alive and not swept.'''
+    # Ping sweep, results are reported in sweep order
+    alive_hosts = [ip for ip in hosts if ip in confirmed]
+    for ip_str in alive_hosts:
+        yield f"Found {ip_str} by neighbor discovery.\n"
+    rtts = {}
+    for ip_str, alive in ping_sweep([ip for ip in hosts if ip not in confirmed], rtts=rtts):
+        if alive:
+            alive_hosts.append(ip_str)
+        yield f"Pinging {ip_str}... {'alive' if alive else 'unreachable'}.\n"
+
+    yield f"\n{len(alive_hosts)} hosts alive.\n\n"
+    if not alive_hosts:
+        return
+
+    # The sweep filled the kernel's neighbor cache, read it once for all hosts
+    neighbors = read_neighbor_table()
+
+    # Known hosts are unchanged unless their MAC address changed
+    unchanged = {}
+    for ip_str in alive_hosts:
+        if ip_str not in known:
+            continue
+        known_mac = normalize_mac(known[ip_str].get('mac_address'))
+        mac = neighbors.get(ip_str)
+        if not known_mac or not mac or known_mac == mac:
+            unchanged[ip_str] = known[ip_str]
+
+    yield f"Discovering services on {len(alive_hosts)} hosts " + \
+        f"({len(unchanged)} known)...\n\n"
+    services_by_host = fingerprint_hosts(
+        alive_hosts, known={ip: host.get('services', []) for ip, host in unchanged.items()})
+
+    # Reverse DNS of all hosts at once, unless the host is known already
+    hostnames = resolve_hostnames(ip for ip in alive_hosts
+                                  if not unchanged.get(ip, {}).get('hostname'))
+
+    for ip_str in alive_hosts:
+        yield f"Checking {ip_str}...\n"
+
+        hostname = unchanged.get(ip_str, {}).get('hostname') or hostnames.get(ip_str)
+        yield f"- Hostname: {hostname or 'N/A'}\n"
+
+        # MAC address from the neighbor table
+        mac = neighbors.get(ip_str) or unchanged.get(ip_str, {}).get('mac_address')
+        yield f"- MAC: {mac or 'N/A'}\n"
+
+        services = services_by_host[ip_str]
+
+        servers.append({
+            'ip_address': ip_str,
+            'hostname': hostname,
+            'mac_address': mac,
+            'rtt': round(rtts[ip_str] * 1000, 2) if ip_str in rtts else None,  # ms
+            'services': services
+        })
+
+        if services:
+            yield f"- Services: {services}\n"
         else:
-            yield f"unreachable.<br>".encode()
-        yield f"\n".encode()
+            yield f"- No services found.\n"
+        yield f"\n"
+
+def discover_network_stream(subnet, known=None, priority=(), servers=None):
+    '''Discovers servers and services in one or more comma separated prefixes.
+    Yields plain text progress lines and returns the list of discovered servers when
+    exhausted.
+
+    `known` enables an incremental scan: it maps ips to the hosts known before
+    ({'hostname', 'mac_address', 'services'}). Hosts whose MAC address did not
+    change keep their hostname and the fingerprints of ports that are still open,
+    see fingerprint_hosts().
+
+    Known ips and the likely alive ips in `priority` (e.g. recently seen or in the
+    DHCP range) are discovered first, in a pass of their own, so their results are
+    available before the rest is swept. IPv4 prefixes of up to
+    DISCOVERY_MAX_SWEEP_ADDRESSES addresses are swept completely, in larger and in
+    IPv6 prefixes only neighbors are discovered (see discover_neighbors()), so the
+    scan time depends on the number of live hosts and not on the prefix size.
+    Discovered servers are appended to `servers` (if given) as soon as they are
+    complete.'''
+    known = known or {}
+    servers = [] if servers is None else servers
+    yield f"Starting {'incremental ' if known else ''}discovery on {subnet}\n\n"
+
+    subnets = parse_subnets(subnet)
+    swept = [net for net in subnets
+             if net.version == 4 and net.num_addresses <= DISCOVERY_MAX_SWEEP_ADDRESSES]
+    not_swept = [net for net in subnets if net not in swept]
+
+    likely_alive = [ip for ip in dict.fromkeys(list(known) + list(priority))
+                    if in_subnets(ip, subnets)]
+    confirmed = set()
+    if not_swept:
+        yield f"Discovering neighbors in {', '.join(str(net) for net in not_swept)}...\n\n"
+        neighbors, confirmed = discover_neighbors(not_swept)
+        likely_alive += [ip for ip in neighbors if ip not in likely_alive]
+
+    first_pass = set(likely_alive)
+    remaining = [str(ip) for net in swept for ip in net.hosts() if str(ip) not in first_pass]
+
+    for description, hosts in (('likely alive', likely_alive), ('remaining', remaining)):
+        if hosts:
+            yield f"Sweeping {len(hosts)} {description} addresses...\n\n"
+            yield from discover_hosts(hosts, known, servers, confirmed=confirmed)
 
-    cache.set(f"scan:{task_id}", servers, timeout=3600)
+    servers_found = sum(1 for server in servers if server['services'])
+    yield f"\nDiscovery complete. {servers_found} servers found.\n"
 
-    yield f"<br>Discovery complete. {servers_found} servers found.\n".encode()
+    return servers
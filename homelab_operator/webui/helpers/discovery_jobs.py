@@ -0,0 +1,214 @@
+import os
+import time
+import uuid
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from ..models import DiscoveryJob, HostObservation, Network, Server
+from .auto_discover import discover_network_stream, diff_discovery, parse_address_range, \
+    parse_subnets, in_subnets
+
+DISCOVERY_MAX_JOBS = int(os.getenv('DISCOVERY_MAX_JOBS', 2))  # Jobs running at the same time
+DISCOVERY_MAX_JOBS_PER_NETWORK = int(os.getenv('DISCOVERY_MAX_JOBS_PER_NETWORK', 1))
+DISCOVERY_FLUSH_INTERVAL = 1  # Seconds between two progress writes to the database
+DISCOVERY_RECENTLY_SEEN_DAYS = int(os.getenv('DISCOVERY_RECENTLY_SEEN_DAYS', 7))
+
+class DiscoveryCancelled(Exception):
+    '''Raised inside a discovery job when a cancellation was requested.'''
+
+def enqueue_discovery(network, user=None, incremental=True):
+    '''Queues a discovery of the network. Returns the active job of the network
+    instead if one is already queued or running.'''
+    active = network.discovery_jobs.filter(status__in=DiscoveryJob.ACTIVE_STATUSES).first()
+    if active:
+        return active
+    return DiscoveryJob.objects.create(
+        task_id=uuid.uuid4().hex,
+        network=network,
+        user=user,
+        subnet=network.subnet,
+        incremental=incremental,
+    )
+
+def enqueue_scheduled_discoveries(now=None):
+    '''Queues a discovery of every network whose discovery schedule is due and
+    advances its next run. Returns the number of queued networks.'''
+    now = now or timezone.now()
+    networks = Network.objects.filter(discovery_schedule__isnull=False, subnet__isnull=False) \
+        .exclude(discovery_schedule='').exclude(subnet='') \
+        .filter(Q(discovery_next_run__isnull=True) | Q(discovery_next_run__lte=now))
+
+    queued = 0
+    for network in networks:
+        enqueue_discovery(network, user=network.user)
+        interval = Network.DISCOVERY_INTERVALS[network.discovery_schedule]
+        next_run = network.discovery_next_run or now
+        while next_run <= now:
+            next_run += interval
+        network.discovery_next_run = next_run
+        network.save(update_fields=['discovery_next_run'])
+        queued += 1
+    return queued
+
+def known_hosts(network, subnet):
+    '''Returns the hosts of the network known before a new scan, as a dict of
+    ip -> {'hostname', 'mac_address', 'services'}. Seeded from the results of the
+    last completed discovery and the network's servers and their services.'''
+    try:
+        subnets = parse_subnets(subnet)
+    except ValueError:
+        return {}
+
+    known = {}
+    last_job = network.discovery_jobs.filter(status='DONE').order_by('-finished_at').first()
+    if last_job:
+        for server in last_job.results:
+            known[server['ip_address']] = {
+                'hostname': server.get('hostname'),
+                'mac_address': server.get('mac_address'),
+                'services': server.get('services', []),
+            }
+
+    for server in network.servers.exclude(ip_address__isnull=True).prefetch_related('services'):
+        host = known.setdefault(server.ip_address, {'hostname': None, 'services': []})
+        host['mac_address'] = server.mac_address or host.get('mac_address')
+        ports = {service['port'] for service in host['services']}
+        host['services'] += [{
+            'name': service.name,
+            'endpoint': service.endpoint,
+            'port': service.port,
+            'url': service.url,
+        } for service in server.services.all() if service.port and service.port not in ports]
+
+    return {ip: host for ip, host in known.items() if in_subnets(ip, subnets)}
+
+def likely_alive_hosts(network):
+    '''Returns the addresses of the network that are likely alive, most likely
+    first: the network's servers, hosts seen by recent discoveries (most recent
+    first) and the network's DHCP range.'''
+    since = timezone.now() - timezone.timedelta(days=DISCOVERY_RECENTLY_SEEN_DAYS)
+    servers = network.servers.exclude(ip_address__isnull=True) \
+        .values_list('ip_address', flat=True)
+    recently_seen = network.observations.filter(seen_at__gte=since) \
+        .order_by('-seen_at').values_list('ip_address', flat=True)
+    dhcp_range = parse_address_range(network.dhcp_range) if network.dhcp_range else []
+    return list(dict.fromkeys([*servers, *recently_seen, *dhcp_range]))
+
+def claim_discovery_job():
+    '''Marks the oldest startable queued job as running and returns it, or None.
+    A job is startable if fewer than DISCOVERY_MAX_JOBS jobs run in total and fewer
+    than DISCOVERY_MAX_JOBS_PER_NETWORK run on its network.'''
+    with transaction.atomic():
+        running = DiscoveryJob.objects.filter(status='RUNNING')
+        if running.count() >= DISCOVERY_MAX_JOBS:
+            return None
+        busy_networks = running.values('network_id') \
+            .annotate(jobs=Count('id')) \
+            .filter(jobs__gte=DISCOVERY_MAX_JOBS_PER_NETWORK) \
+            .values_list('network_id', flat=True)
+
+        job = DiscoveryJob.objects.select_for_update(skip_locked=True) \
+            .filter(status='QUEUED') \
+            .exclude(network_id__in=list(busy_networks)) \
+            .order_by('created_at') \
+            .first()
+        if not job:
+            return None
+
+        job.status = 'RUNNING'
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+        return job
+
+def fail_stale_jobs():
+    '''Marks jobs left running by a previous worker process as failed.
+    Returns the number of affected jobs.'''
+    return DiscoveryJob.objects.filter(status='RUNNING').update(
+        status='FAILED',
+        finished_at=timezone.now(),
+    )
+
+def record_observations(job):
+    '''Appends one HostObservation per host found by a completed job.'''
+    HostObservation.objects.bulk_create([HostObservation(
+        network_id=job.network_id,
+        job=job,
+        ip_address=server['ip_address'],
+        mac_address=server.get('mac_address'),
+        hostname=(server.get('hostname') or '')[:255] or None,
+        open_ports=[service['port'] for service in server.get('services', [])],
+        rtt=server.get('rtt'),
+        seen_at=job.finished_at,
+    ) for server in job.results])
+
+def reconcile_inventory(job):
+    '''Fills in missing MAC addresses of the network's servers from a completed job.
+    Returns the number of updated servers.'''
+    macs = {server['ip_address']: server['mac_address'] for server in job.results
+            if server.get('mac_address')}
+    servers = [server for server in job.network.servers.filter(ip_address__in=list(macs))
+               if not server.mac_address]
+    for server in servers:
+        server.mac_address = macs[server.ip_address]
+    Server.objects.bulk_update(servers, ['mac_address'])
+    return len(servers)
+
+def with_last_seen(servers):
+    '''Annotates a server queryset with `last_seen_at`, the time the server was
+    last observed by a discovery of its network.'''
+    return servers.annotate(last_seen_at=Subquery(
+        HostObservation.objects.filter(network_id=OuterRef('network_id'),
+                                       ip_address=OuterRef('ip_address'))
+            .order_by('-seen_at').values('seen_at')[:1]))
+
+def run_discovery_job(job):
+    '''Runs a claimed discovery job to completion. Progress is written to the job
+    about once a second, which is also when a requested cancellation is noticed.'''
+    progress = [job.progress]
+    last_flush = time.monotonic()
+
+    def flush():
+        job.progress = ''.join(progress)
+        job.save(update_fields=['progress', 'results'])
+        if DiscoveryJob.objects.filter(id=job.id, cancel_requested=True).exists():
+            raise DiscoveryCancelled()
+
+    previous = known_hosts(job.network, job.subnet)
+    job.results = []  # Filled by the discovery while it runs, flushed with the progress
+    stream = discover_network_stream(job.subnet, known=previous if job.incremental else None,
+                                     priority=likely_alive_hosts(job.network),
+                                     servers=job.results)
+    try:
+        while True:
+            try:
+                progress.append(next(stream))
+            except StopIteration as result:
+                job.results = result.value or []
+                job.diff = diff_discovery(previous, job.results)
+                break
+            if time.monotonic() - last_flush >= DISCOVERY_FLUSH_INTERVAL:
+                flush()
+                last_flush = time.monotonic()
+        job.status = 'DONE'
+    except DiscoveryCancelled:
+        stream.close()
+        progress.append("\nDiscovery cancelled.\n")
+        job.status = 'CANCELLED'
+    except Exception as e:
+        stream.close()
+        progress.append(f"\nDiscovery failed: {e}\n")
+        job.status = 'FAILED'
+
+    job.progress = ''.join(progress)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['progress', 'results', 'diff', 'status', 'finished_at'])
+
+    if job.status == 'DONE':
+        record_observations(job)
+        reconcile_inventory(job)
+        # Keep the progress log of the latest job only, results and diffs are kept
+        DiscoveryJob.objects.filter(network_id=job.network_id, finished_at__isnull=False) \
+            .exclude(id=job.id).exclude(progress='').update(progress='')
+    return job
@@ -0,0 +1,70 @@
+from django.core.cache import caches
+from django.utils.html import escape
+
+from ..models import AppState
+
+HEATMAP_CACHE_TTL = 60 * 60 * 24
+HEATMAP_CELL = 12  # Pixels, plus HEATMAP_GAP between two cells
+HEATMAP_GAP = 2
+HEATMAP_LABEL_WIDTH = 64
+HEATMAP_LABEL_HEIGHT = 16
+HEATMAP_HOUR_LABELS = (0, 5, 10, 15, 20)
+HEATMAP_DAY_LABELS = ('Monday', 'Thursday', 'Sunday')
+
+def percent_to_color(percent):
+    '''Returns the color of an uptime percentage (0 to 1), from grey (#cccccc)
+    to dark green (#006400).'''
+    percent = max(0.0, min(1.0, percent))
+    red = round(204 + (0 - 204) * percent)
+    green = round(204 + (100 - 204) * percent)
+    blue = round(204 + (0 - 204) * percent)
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+def render_uptime_heatmap(probability_matrix):
+    '''Renders a probability matrix (see ServerUptimeStatistic.get_probability_matrix)
+    as a single SVG document. Every cell has a title with its exact value.'''
+    step = HEATMAP_CELL + HEATMAP_GAP
+    width = HEATMAP_LABEL_WIDTH + 24 * step
+    height = HEATMAP_LABEL_HEIGHT + 7 * step
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="sans-serif" font-size="11" fill="#888">'
+    ]
+    for hour in HEATMAP_HOUR_LABELS:
+        parts.append(f'<text x="{HEATMAP_LABEL_WIDTH + hour * step}" y="11">{hour}:00</text>')
+    for row, (day, hours) in enumerate(probability_matrix):
+        y = HEATMAP_LABEL_HEIGHT + row * step
+        if day in HEATMAP_DAY_LABELS:
+            parts.append(f'<text x="{HEATMAP_LABEL_WIDTH - 8}" y="{y + 10}" '
+                         f'text-anchor="end">{escape(day)}</text>')
+        for hour, p in hours:
+            parts.append(f'<rect x="{HEATMAP_LABEL_WIDTH + hour * step}" y="{y}" '
+                         f'width="{HEATMAP_CELL}" height="{HEATMAP_CELL}" rx="3" '
+                         f'fill="{percent_to_color(p)}"><title>{escape(day)} {hour}:00: '
+                         f'{p:.2f}</title></rect>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+def heatmap_version(uptime_statistic):
+    '''Returns the version of an uptime statistic's heatmap, which changes whenever
+    the statistic or its estimator is updated. The sliding window and the exponential
+    decay are computed from the rollups, so their version also changes with every
+    uptime rollup.'''
+    version = f'{uptime_statistic.id}-{uptime_statistic.last_updated.timestamp():.0f}-' \
+              f'{uptime_statistic.estimator}'
+    if uptime_statistic.estimator == 'cumulative':
+        return version
+    parameter = uptime_statistic.window_days if uptime_statistic.estimator == 'window' \
+        else uptime_statistic.half_life_days
+    rolled_up = AppState.ensure_exists().last_uptime_rollup
+    return f'{version}-{parameter:g}-{rolled_up.timestamp() if rolled_up else 0:.0f}'
+
+def cached_uptime_heatmap(uptime_statistic):
+    '''Returns the SVG heatmap of an uptime statistic. Rendered heatmaps are kept in
+    the shared 'status' cache, keyed by heatmap_version().'''
+    key = f'uptime_heatmap:{heatmap_version(uptime_statistic)}'
+    svg = caches['status'].get(key)
+    if svg is None:
+        svg = render_uptime_heatmap(uptime_statistic.get_probability_matrix())
+        caches['status'].set(key, svg, timeout=HEATMAP_CACHE_TTL)
+    return svg
@@ -1,12 +1,15 @@
+import time
 from functools import wraps
 
 from django.utils import timezone
 from django.core.cache import cache
+from django.db import connection, transaction
 from django.http import HttpResponse
 
-from ..models import Server, WOLSchedule
+from ..models import WOLSchedule, ServerUptimeStatistic
 from .auto_discover import ping_host, evaluate_service_name, check_http, discover_network_stream
 from .ingress import generate_ingress_nginx_config
+from .probe import probe_servers
 
 def rate_limit(view_func):
     @wraps(view_func)
@@ -21,53 +24,60 @@ def rate_limit(view_func):
     return _wrapped_view
 
 def update_uptime_statistics():
-    now = timezone.now()
-    hour = now.hour
-    day = now.weekday()
+    '''Probes all servers with uptime statistics concurrently and counts the results
+    in one bulk update. Returns the cost of the pass:
+        {"duration": <seconds>, "servers": <count>, "queries": <count>}
+    '''
+    start = time.monotonic()
+    queries = []
+
+    def count_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        now = timezone.now()
+        hour = now.hour
+        day = now.weekday()
+
+        statistics = list(ServerUptimeStatistic.objects.select_related('server'))
+        # Probed directly, the status cache would cost several queries per server
+        online = probe_servers([statistic.server for statistic in statistics], use_cache=False)
 
-    for server in Server.objects.all():
-        if server.uptime_statistic.first():
-            uptime_statistic = server.uptime_statistic.first()
-            if not uptime_statistic.initialized:
-                uptime_statistic.initialize_matrix()
+        for statistic in statistics:
+            statistic.add_check(day, hour, online[statistic.server_id])
 
-            is_online = server.is_online()
-            uptime_statistic.update_uptime(day, hour, is_online)
+        with transaction.atomic():
+            ServerUptimeStatistic.objects.bulk_update(
+                statistics, ['counts', 'initialized', 'last_updated'])
+
+    return {
+        'duration': time.monotonic() - start,
+        'servers': len(statistics),
+        'queries': len(queries),
+    }
 
 def process_schedules():
+    '''Executes the enabled schedules whose next run is due within WOLSchedule.WINDOW
+    and advances their next run. Overdue runs are executed once, unless they are
+    more than WOLSchedule.LATE_WINDOW (one cron interval plus the window) late.
+    A single range query on the indexed next_run_at, independent of the number
+    of schedules.'''
     now = timezone.now()
-    minute_window = [(now.minute + offset) % 60 for offset in range(-5, 6)]
     schedules = WOLSchedule.objects.filter(
         enabled=True,
-        schedule_time__hour=now.hour,
-        schedule_time__minute__in=minute_window
-    )
-
-    for schedule in schedules.all():
-        if schedule.server.auto_wake is False:
-            schedules = schedules.exclude(id=schedule.id)
-            continue
-        if schedule.repeat:
-            if schedule.repeat_type == 'daily':
-                # schedule should be executed every day, no action needed
-                continue
-            if schedule.repeat_type == 'weekly':
-                if schedule.schedule_time.weekday() != now.weekday():
-                    schedules = schedules.exclude(id=schedule.id)
-            elif schedule.repeat_type == 'monthly':
-                if schedule.schedule_time.day != now.day:
-                    schedules = schedules.exclude(id=schedule.id)
-            else:
-                schedules = schedules.exclude(id=schedule.id)
-                continue
-        else:
-            if schedule.schedule_time.date() != now.date():
-                schedules = schedules.exclude(id=schedule.id)
+        next_run_at__lte=now + WOLSchedule.WINDOW,
+    ).select_related('server', 'user').order_by('next_run_at')
 
     for schedule in schedules:
-        log_entry = f'[{now}] - SCHEDULE: No action performed for schedule {schedule.id}'
+        log_entry = None
         server = schedule.server
-        if server:
+        if now - schedule.next_run_at > WOLSchedule.LATE_WINDOW:
+            log_entry = f'[{now}] - SCHEDULE: Missed run at {schedule.next_run_at} skipped'
+        elif not server:
+            log_entry = f'[{now}] - SCHEDULE: No server found for schedule {schedule.id}'
+        elif server.auto_wake:
+            log_entry = f'[{now}] - SCHEDULE: No action performed for schedule {schedule.id}'
             if schedule.type == 'WAKE':
                 response = server.wake()
                 if response is False:
@@ -84,11 +94,13 @@ def process_schedules():
                 else:
                     log_entry = f'[{now}] - SHUTDOWN: Failed to send shutdown command to ' + \
                                 f'{server.name}: {response}'
-        else:
-            log_entry = f'[{now}] - SCHEDULE: No server found for schedule {schedule.id}'
 
-        if schedule.enable_log:
+        if log_entry and schedule.enable_log:
             schedule.logs = (schedule.logs or '') + log_entry + '\n'
-            schedule.save()
+        # Advance past this run, a run executed early must not be picked up again
+        next_run_at = schedule.first_run_from(
+            max(schedule.next_run_at, now - WOLSchedule.WINDOW) + timezone.timedelta(microseconds=1))
+        WOLSchedule.objects.filter(pk=schedule.pk).update(next_run_at=next_run_at,
+                                                           logs=schedule.logs)
 
     return HttpResponse("OK", status=200)
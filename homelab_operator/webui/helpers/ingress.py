@@ -2,6 +2,7 @@ import os
 import subprocess
 from django.template.loader import render_to_string
 from ..models import Ingress, AppState
+from .resolver import cached_hostnames
 
 def test_nginx_ingress_config():
     """Test the nginx configuration for syntax errors."""
@@ -60,6 +61,15 @@ def generate_ingress_nginx_config(ingress, delete=False):
             os.remove(config_path)
         return
 
+    # Annotate the rules with the reverse DNS names of their upstream servers, only
+    # read from the cache the status poller keeps warm to not block the request
+    ingresses = list(ingresses.select_related('target_service__server'))
+    hostnames = cached_hostnames([ingress_rule.target_service.server.ip_address
+                                  for ingress_rule in ingresses])
+    for ingress_rule in ingresses:
+        ingress_rule.upstream_hostname = hostnames.get(
+            ingress_rule.target_service.server.ip_address)
+
     # Generate nginx config
     config_content = render_to_string('nginx/ingress.conf', {
         'hostname': ingress.hostname,
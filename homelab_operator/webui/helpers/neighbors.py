@@ -0,0 +1,150 @@
+import socket
+import struct
+import select
+import time
+import ipaddress
+
+PROC_NET_ARP = '/proc/net/arp'
+PROC_NET_IF_INET6 = '/proc/net/if_inet6'
+ARP_FLAG_COMPLETE = 0x2  # ATF_COM, the entry has a resolved hardware address
+
+# Netlink neighbor table dump (linux/rtnetlink.h, linux/neighbour.h)
+RTM_NEWNEIGH = 28
+RTM_GETNEIGH = 30
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NDA_DST = 1
+NDA_LLADDR = 2
+NUD_UNUSABLE = 0x01 | 0x20 | 0x40  # INCOMPLETE, FAILED, NOARP
+
+MDNS_GROUPS = {4: '224.0.0.251', 6: 'ff02::fb'}
+MDNS_PORT = 5353
+# PTR query for _services._dns-sd._udp.local with the unicast-response bit set
+MDNS_QUERY = b'\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00' + \
+    b'\x09_services\x07_dns-sd\x04_udp\x05local\x00' + b'\x00\x0c\x80\x01'
+
+def read_arp_table(path=PROC_NET_ARP):
+    '''Reads the kernel's IPv4 neighbor (ARP) table in a single pass.
+    Returns a dict of ip -> MAC address, incomplete entries are skipped.'''
+    table = {}
+    try:
+        with open(path, 'r') as f:
+            next(f, None)  # Header line
+            for line in f:
+                parts = line.split()
+                if len(parts) < 4:
+                    continue
+                ip, _, flags, mac = parts[:4]
+                if int(flags, 16) & ARP_FLAG_COMPLETE and mac != '00:00:00:00:00:00':
+                    table[ip] = mac.lower()
+    except (OSError, ValueError):
+        pass
+    return table
+
+def read_neighbor_table():
+    '''Reads the kernel's IPv4 and IPv6 neighbor tables with one netlink dump.
+    Returns a dict of ip -> MAC address of all usable entries. Falls back to the
+    ARP table if netlink is not available.'''
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+    except (AttributeError, OSError):
+        return read_arp_table()
+
+    table = {}
+    try:
+        sock.settimeout(1)
+        ndmsg = struct.pack('=BBHiHBB', socket.AF_UNSPEC, 0, 0, 0, 0, 0, 0)
+        sock.send(struct.pack('=IHHII', 16 + len(ndmsg), RTM_GETNEIGH,
+                              NLM_F_REQUEST | NLM_F_DUMP, 1, 0) + ndmsg)
+        done = False
+        while not done:
+            data = sock.recv(65536)
+            offset = 0
+            while offset + 16 <= len(data):
+                length, msg_type = struct.unpack_from('=IH', data, offset)
+                if length < 16 or msg_type in (NLMSG_DONE, NLMSG_ERROR):
+                    done = True
+                    break
+                if msg_type == RTM_NEWNEIGH:
+                    entry = parse_neighbor_message(data[offset + 16:offset + length])
+                    if entry:
+                        table[entry[0]] = entry[1]
+                offset += (length + 3) & ~3
+    except OSError:
+        return table or read_arp_table()
+    finally:
+        sock.close()
+    return table
+
+def parse_neighbor_message(payload):
+    '''Returns (ip, mac) of a RTM_NEWNEIGH message payload, None if unusable.'''
+    if len(payload) < 12:
+        return None
+    family, _, _, _, state, _, _ = struct.unpack_from('=BBHiHBB', payload)
+    if state & NUD_UNUSABLE:
+        return None
+    ip = mac = None
+    offset = 12
+    while offset + 4 <= len(payload):
+        attr_length, attr_type = struct.unpack_from('=HH', payload, offset)
+        if attr_length < 4:
+            break
+        value = payload[offset + 4:offset + attr_length]
+        if attr_type == NDA_DST:
+            ip = socket.inet_ntop(family, value)
+        elif attr_type == NDA_LLADDR and len(value) == 6 and any(value):
+            mac = ':'.join(f'{byte:02x}' for byte in value)
+        offset += (attr_length + 3) & ~3
+    return (ip, mac) if ip and mac else None
+
+def local_ipv6_addresses(path=PROC_NET_IF_INET6):
+    '''Returns the IPv6 addresses of this host as a list of (address, interface index).'''
+    addresses = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 6:
+                    continue
+                address = ipaddress.IPv6Address(bytes.fromhex(parts[0]))
+                addresses.append((address, int(parts[1], 16)))
+    except (OSError, ValueError):
+        pass
+    return addresses
+
+def mdns_responders(family=4, source=None, timeout=1):
+    '''Sends a DNS-SD service enumeration query to the mDNS group and returns the
+    addresses of all hosts answering within `timeout` seconds. Queries from an
+    ephemeral port are answered by unicast, so no multicast group is joined.
+    For IPv6, `source` is the (address, interface index) to send from.'''
+    responders = set()
+    try:
+        sock = socket.socket(socket.AF_INET if family == 4 else socket.AF_INET6,
+                             socket.SOCK_DGRAM)
+    except OSError:
+        return responders
+    try:
+        if family == 4:
+            sock.sendto(MDNS_QUERY, (MDNS_GROUPS[4], MDNS_PORT))
+        else:
+            address, ifindex = source
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_IF, ifindex)
+            sock.bind((str(address), 0, 0, ifindex if address.is_link_local else 0))
+            sock.sendto(MDNS_QUERY, (MDNS_GROUPS[6], MDNS_PORT, 0, ifindex))
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            if not select.select([sock], [], [], remaining)[0]:
+                break
+            _, sender = sock.recvfrom(9000)
+            responders.add(sender[0].split('%')[0])
+    except OSError:
+        pass
+    finally:
+        sock.close()
+    return responders
+
+def normalize_mac(mac):
+    '''Normalizes a MAC address to lower case and colon separators, None if empty.'''
+    return mac.strip().lower().replace('-', ':') if mac and mac.strip() else None
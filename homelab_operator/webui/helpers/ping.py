@@ -0,0 +1,361 @@
+import os
+import time
+import errno
+import select
+import selectors
+import socket
+import struct
+import threading
+import ipaddress
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+IPV6_ALL_NODES = 'ff02::1'
+ICMP_PAYLOAD = b'homelab-operator'
+TCP_FALLBACK_PORTS = (22, 80, 443, 445)  # Probed if no ICMP socket can be opened
+ICMP_SEND_BATCH = 32  # Requests sent before replies are read again
+ICMP_RECEIVE_BUFFER = 1024 * 1024
+
+class RateLimiter:
+    '''Thread-safe limiter spacing out calls to at most `rate` per second (0 = unlimited).'''
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        '''Blocks until the next call is allowed.'''
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class AdaptiveConcurrency:
+    '''Thread-safe AIMD controller for the number of outstanding probes of a sweep.
+
+    The window starts at a quarter of `maximum` and grows by one per result (slow
+    start) until the first back off, after that by one per eight results.
+    It is halved when the recent timeout ratio rises more than `threshold` above
+    the long-term ratio of the sweep. Unused addresses time out as well, so only a
+    rise of the ratio is taken as a sign of overloaded hosts or switches.
+    '''
+    def __init__(self, maximum, minimum=1, threshold=0.25):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.threshold = threshold
+        self.window = max(self.minimum, self.maximum / 4)
+        self.slow_start = True
+        self.recent_loss = None  # Fast moving average of the timeout ratio
+        self.baseline_loss = None  # Slow moving average of the timeout ratio
+        self.cooldown = 0  # Results to wait for before the next back off
+        self.outstanding = 0
+        self.condition = threading.Condition()
+
+    def limit(self):
+        '''Returns the current number of probes allowed to be outstanding.'''
+        return int(self.window)
+
+    def rate_factor(self):
+        '''Returns the share of the target rate the sweep should currently use.'''
+        return self.window / self.maximum
+
+    def record(self, timed_out):
+        '''Records the result of a probe and adapts the window.'''
+        with self.condition:
+            loss = 1.0 if timed_out else 0.0
+            if self.recent_loss is None:
+                self.recent_loss = self.baseline_loss = loss
+            self.recent_loss += 0.05 * (loss - self.recent_loss)
+            self.baseline_loss += 0.005 * (loss - self.baseline_loss)
+            self.cooldown = max(0, self.cooldown - 1)
+
+            if self.recent_loss > self.baseline_loss + self.threshold and not self.cooldown:
+                self.window = max(self.minimum, self.window / 2)
+                self.slow_start = False
+                self.cooldown = int(self.window) + 1
+            elif self.slow_start:
+                self.window = min(self.maximum, self.window + 1)
+            else:
+                self.window = min(self.maximum, self.window + 0.125)
+            self.condition.notify_all()
+
+    def acquire(self):
+        '''Blocks until another probe may be started (for thread pool sweeps).'''
+        with self.condition:
+            while self.outstanding >= self.limit():
+                self.condition.wait()
+            self.outstanding += 1
+
+    def release(self, timed_out):
+        '''Marks a probe started with acquire() as finished and records its result.'''
+        with self.condition:
+            self.outstanding -= 1
+        self.record(timed_out)
+
+def icmp_checksum(data):
+    '''Computes the internet checksum (RFC 1071) of data.'''
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+def build_echo_request(identifier, sequence, payload=ICMP_PAYLOAD):
+    '''Builds an ICMP echo request packet.'''
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    checksum = icmp_checksum(header + payload)
+    return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, identifier, sequence) + payload
+
+def parse_echo_reply(packet, is_raw):
+    '''Returns (identifier, sequence) of an ICMP echo reply, None for any other packet.
+    Raw sockets deliver the IP header as well, which is skipped.'''
+    if is_raw:
+        packet = packet[(packet[0] & 0x0f) * 4:]
+    if len(packet) < 8:
+        return None
+    icmp_type, _, _, identifier, sequence = struct.unpack('!BBHHH', packet[:8])
+    if icmp_type != ICMP_ECHO_REPLY:
+        return None
+    return identifier, sequence
+
+def open_icmp_socket():
+    '''Opens an ICMP socket. Tries an unprivileged datagram socket first (needs
+    net.ipv4.ping_group_range), then a raw socket (needs CAP_NET_RAW).
+    Returns (sock, is_raw), or (None, False) if neither is permitted.'''
+    for sock_type in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+        try:
+            sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+            return sock, sock_type == socket.SOCK_RAW
+        except OSError:
+            continue
+    return None, False
+
+def icmp_available():
+    '''Checks if an ICMP socket can be opened in this process.'''
+    sock, _ = open_icmp_socket()
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+def icmp_sweep(hosts, timeout=1, rate=0, concurrency=256, rtts=None, adaptive=False):
+    '''Pings IPv4 hosts over a single ICMP socket.
+
+    All outstanding echo requests are multiplexed over the one socket and replies
+    are matched by source address and sequence number (and identifier for raw
+    sockets; datagram sockets only receive replies for their own identifier).
+    Yields (ip, alive) in the order of `hosts` as soon as each result is known.
+    At most `concurrency` requests are outstanding and at most `rate` requests
+    are sent per second (0 = unlimited). If `rtts` is a dict, the round trip time
+    of every reply is stored in it (ip -> seconds). If `adaptive` is set, the
+    number of outstanding requests and the rate are lowered when timeouts rise,
+    see AdaptiveConcurrency. Raises OSError if no ICMP socket can be opened.
+    '''
+    hosts = list(hosts)
+    sock, is_raw = open_icmp_socket()
+    if sock is None:
+        raise OSError('No ICMP socket available')
+
+    identifier = os.getpid() & 0xffff
+    controller = AdaptiveConcurrency(concurrency) if adaptive else None
+    interval = 1 / rate if rate > 0 else 0
+    pending = deque()  # (ip, sequence, deadline) in send order
+    sent = {}  # (ip, sequence) -> send time
+    replied = {}  # (ip, sequence) -> receive time
+    index = 0
+    next_send = time.monotonic()
+
+    sock.setblocking(False)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, ICMP_RECEIVE_BUFFER)
+    except OSError:
+        pass
+    try:
+        while index < len(hosts) or pending:
+            now = time.monotonic()
+            if controller:
+                concurrency = controller.limit()
+                interval = 1 / (rate * controller.rate_factor()) if rate > 0 else 0
+            batch_end = index + ICMP_SEND_BATCH
+            while index < min(len(hosts), batch_end) and len(pending) < concurrency \
+                    and now >= next_send:
+                ip = hosts[index]
+                sequence = index % 0xffff + 1
+                try:
+                    sock.sendto(build_echo_request(identifier, sequence), (ip, 0))
+                    sent[(ip, sequence)] = time.monotonic()
+                    deadline = now + timeout
+                except OSError:
+                    deadline = now  # e.g. network unreachable
+                pending.append((ip, sequence, deadline))
+                index += 1
+                next_send = max(next_send + interval, now) if interval else now
+
+            while True:
+                try:
+                    packet, address = sock.recvfrom(1024)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    continue  # Queued ICMP error of a previous request
+                reply = parse_echo_reply(packet, is_raw)
+                if reply and (not is_raw or reply[0] == identifier):
+                    replied[(address[0], reply[1])] = time.monotonic()
+
+            while pending and ((pending[0][0], pending[0][1]) in replied or
+                               now >= pending[0][2]):
+                ip, sequence, _ = pending.popleft()
+                sent_at = sent.pop((ip, sequence), None)
+                alive = (ip, sequence) in replied
+                if alive and sent_at and rtts is not None:
+                    rtts[ip] = replied[(ip, sequence)] - sent_at
+                if controller and sent_at:
+                    controller.record(not alive)
+                yield ip, alive
+
+            waits = [pending[0][2] - now] if pending else []
+            if index < len(hosts) and len(pending) < concurrency:
+                waits.append(0 if index >= batch_end else next_send - now)
+            if waits:
+                select.select([sock], [], [], max(0, min(waits)))
+    finally:
+        sock.close()
+
+def icmp6_multicast_echo(source, ifindex, timeout=1):
+    '''Sends one ICMPv6 echo request to all nodes on the link (ff02::1) and returns
+    the addresses of all hosts replying within `timeout` seconds. Replies are sent
+    from an address of the same scope as `source`, so sending from a global address
+    discovers the global addresses of the link. Returns an empty set if no ICMPv6
+    socket can be opened.'''
+    responders = set()
+    sock = None
+    for sock_type in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+        try:
+            sock = socket.socket(socket.AF_INET6, sock_type, socket.IPPROTO_ICMPV6)
+            break
+        except OSError:
+            continue
+    if sock is None:
+        return responders
+
+    identifier = os.getpid() & 0xffff
+    try:
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_IF, ifindex)
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, 1)
+        sock.bind((str(source), 0, 0, ifindex if ipaddress.ip_address(source).is_link_local
+                   else 0))
+        # The kernel computes the ICMPv6 checksum, it depends on the IPv6 pseudo header
+        packet = struct.pack('!BBHHH', ICMPV6_ECHO_REQUEST, 0, 0, identifier, 1) + ICMP_PAYLOAD
+        sock.sendto(packet, (IPV6_ALL_NODES, 0, 0, ifindex))
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            if not select.select([sock], [], [], remaining)[0]:
+                break
+            reply, address = sock.recvfrom(1024)
+            if len(reply) >= 8 and reply[0] == ICMPV6_ECHO_REPLY:
+                responders.add(address[0].split('%')[0])
+    except OSError:
+        pass
+    finally:
+        sock.close()
+    return responders
+
+def tcp_alive(ip, ports=TCP_FALLBACK_PORTS, timeout=1):
+    '''Last resort liveness check without ICMP. A host is alive if any of the ports
+    accepts the connection or actively refuses it. All ports are connected to at
+    once and share one deadline, so a dead host costs `timeout` seconds once.'''
+    family = socket.AF_INET6 if ':' in ip else socket.AF_INET
+    selector = selectors.DefaultSelector()
+    try:
+        for port in ports:
+            try:
+                sock = socket.socket(family, socket.SOCK_STREAM)
+            except OSError:
+                continue
+            sock.setblocking(False)
+            error = sock.connect_ex((ip, port))
+            if error in (0, errno.ECONNREFUSED):
+                sock.close()
+                return True
+            if error not in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+                sock.close()
+                continue
+            selector.register(sock, selectors.EVENT_WRITE)
+
+        deadline = time.monotonic() + timeout
+        while selector.get_map() and (remaining := deadline - time.monotonic()) > 0:
+            for key, _ in selector.select(remaining):
+                error = key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error in (0, errno.ECONNREFUSED):
+                    return True
+                selector.unregister(key.fileobj)
+                key.fileobj.close()
+        return False
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+
+def tcp_sweep(hosts, timeout=1, rate=0, concurrency=128, rtts=None, adaptive=False):
+    '''Like icmp_sweep(), but uses tcp_alive() on a thread pool. The round trip
+    time is the duration of the successful check.'''
+    hosts = list(hosts)
+    limiter = RateLimiter(rate)
+    controller = AdaptiveConcurrency(concurrency) if adaptive else None
+
+    def check(ip):
+        if controller:
+            controller.acquire()
+            if rate > 0:
+                limiter.interval = 1 / (rate * controller.rate_factor())
+        limiter.wait()
+        start = time.monotonic()
+        alive = False
+        try:
+            alive = tcp_alive(ip, timeout=timeout)
+        finally:
+            if controller:
+                controller.release(not alive)
+        if alive and rtts is not None:
+            rtts[ip] = time.monotonic() - start
+        return alive
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(hosts) or 1)))
+    try:
+        yield from zip(hosts, executor.map(check, hosts))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def liveness_sweep(hosts, timeout=1, rate=0, concurrency=128, rtts=None, adaptive=False):
+    '''Checks which hosts are alive, using ICMP if possible and TCP as fallback.
+    Yields (ip, alive) in the order of `hosts`, see icmp_sweep() for `rtts` and
+    `adaptive`. IPv6 hosts are checked with TCP and reported after IPv4 hosts.'''
+    hosts = list(hosts)
+    ipv6_hosts = [ip for ip in hosts if ':' in ip]
+    if not ipv6_hosts:
+        sweep = icmp_sweep if icmp_available() else tcp_sweep
+        return sweep(hosts, timeout=timeout, rate=rate, concurrency=concurrency, rtts=rtts,
+                     adaptive=adaptive)
+    return mixed_liveness_sweep(hosts, ipv6_hosts, timeout=timeout, rate=rate,
+                                concurrency=concurrency, rtts=rtts, adaptive=adaptive)
+
+def mixed_liveness_sweep(hosts, ipv6_hosts, **kwargs):
+    '''Sweeps IPv4 hosts with liveness_sweep() and IPv6 hosts with tcp_sweep().
+    Yields all IPv4 results first, then the IPv6 results.'''
+    ipv4_hosts = [ip for ip in hosts if ':' not in ip]
+    if ipv4_hosts:
+        yield from liveness_sweep(ipv4_hosts, **kwargs)
+    yield from tcp_sweep(ipv6_hosts, **kwargs)
+
+def ping_hosts(hosts, timeout=1, **kwargs):
+    '''Checks which hosts are alive. Returns a dict of ip -> bool.'''
+    return dict(liveness_sweep(list(dict.fromkeys(hosts)), timeout=timeout, **kwargs))
@@ -0,0 +1,136 @@
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Server, Service, StatusTransition
+from .probe import probe_status, probe_ttfbs
+from .resolver import resolve_hostnames
+from .uptime import record_samples
+
+def poll_due_targets(now=None):
+    '''Probes all servers and services whose next check is due and stores the
+    results on the rows. Returns the number of polled targets.'''
+    now = now or timezone.now()
+    due = Q(next_check__isnull=True) | Q(next_check__lte=now)
+    servers = list(Server.objects.filter(due))
+    services = list(Service.objects.filter(due))
+    if not servers and not services:
+        return 0
+
+    previous = {('server', server.id): server.online for server in servers}
+    previous.update({('service', service.id): service.online for service in services})
+
+    rtts = {}
+    # Probed without the status cache, cached results carry no latency
+    status = probe_status(servers=servers, services=services, use_cache=False, rtts=rtts)
+    ttfbs = probe_ttfbs([service.ttfb_target() for service in services
+                         if status['services'][service.id] is True and service.ttfb_target()])
+
+    def milliseconds(seconds):
+        return seconds * 1000 if seconds is not None else None
+
+    for server in servers:
+        server.online = status['servers'][server.id]
+        server.latency = milliseconds(rtts.get(server.probe_target()))
+        server.last_checked = now
+        server.next_check = now + timezone.timedelta(seconds=max(server.check_interval, 1))
+    for service in services:
+        result = status['services'][service.id]
+        service.online = result if isinstance(result, bool) else None
+        service.status_message = '' if isinstance(result, bool) else result
+        service.latency = milliseconds(rtts.get(service.probe_target()))
+        service.ttfb = milliseconds(ttfbs.get(service.ttfb_target()))
+        service.last_checked = now
+        service.next_check = now + timezone.timedelta(seconds=max(service.check_interval, 1))
+
+    Server.objects.bulk_update(servers, ['online', 'latency', 'last_checked', 'next_check'])
+    Service.objects.bulk_update(services, ['online', 'status_message', 'latency', 'ttfb',
+                                           'last_checked', 'next_check'])
+    record_samples(servers, services, timestamp=now)
+    record_transitions(servers, services, previous, timestamp=now)
+
+    # Keep the reverse DNS cache warm for the dashboard, cached entries are not looked up
+    resolve_hostnames(server.ip_address for server in servers if server.ip_address)
+    return len(servers) + len(services)
+
+def record_transitions(servers, services, previous, timestamp=None):
+    '''Appends a StatusTransition for every server and service whose online state
+    differs from `previous`, a dict of ('server' or 'service', id) -> state.
+    Returns the number of transitions.'''
+    timestamp = timestamp or timezone.now()
+    transitions = [StatusTransition(
+        server=target if kind == 'server' else None,
+        service=target if kind == 'service' else None,
+        old_state=previous.get((kind, target.id)),
+        new_state=target.online,
+        timestamp=timestamp,
+        latency=target.latency,
+    ) for kind, targets in (('server', servers), ('service', services)) for target in targets
+        if (kind, target.id) in previous and previous[(kind, target.id)] != target.online]
+    StatusTransition.objects.bulk_create(transitions)
+    return len(transitions)
+
+def recent_transitions(hours=24, servers=None, services=None):
+    '''Returns the transitions of the last `hours` hours, newest first. The result
+    can be limited to servers and services (querysets or lists).'''
+    transitions = StatusTransition.objects.filter(
+        timestamp__gte=timezone.now() - timezone.timedelta(hours=hours))
+    if servers is not None or services is not None:
+        transitions = transitions.filter(Q(server__in=servers or []) |
+                                         Q(service__in=services or []))
+    return transitions.select_related('server', 'service').order_by('-timestamp')
+
+def seconds_until_next_check(now=None, maximum=60):
+    '''Returns the number of seconds until the next server or service is due.'''
+    now = now or timezone.now()
+    next_checks = [
+        Server.objects.filter(next_check__isnull=False).order_by('next_check')
+            .values_list('next_check', flat=True).first(),
+        Service.objects.filter(next_check__isnull=False).order_by('next_check')
+            .values_list('next_check', flat=True).first(),
+    ]
+    next_checks = [next_check for next_check in next_checks if next_check]
+    if not next_checks:
+        return maximum
+    return max(0, min(maximum, (min(next_checks) - now).total_seconds()))
+
+def get_status(servers, services):
+    '''Returns the last known status of servers and services, probing only those
+    that were never polled:
+        {
+            "servers": {<server_id>: true, ...},
+            "services": {<service_id>: false, ...},  # or an error message
+            "last_checked": {"servers": {<server_id>: "<iso timestamp>"}, "services": {...}},
+            "latency": {"servers": {<server_id>: <connect ms>},
+                        "services": {<service_id>: {"connect": <ms>, "ttfb": <ms>}}}
+        }
+    '''
+    servers = list(servers)
+    services = list(services)
+    unchecked = probe_status(
+        servers=[server for server in servers if server.last_checked is None],
+        services=[service for service in services if service.last_checked is None])
+
+    status = {
+        'servers': {},
+        'services': {},
+        'last_checked': {'servers': {}, 'services': {}},
+        'latency': {'servers': {}, 'services': {}},
+    }
+    for server in servers:
+        if server.last_checked is None:
+            status['servers'][server.id] = unchecked['servers'][server.id]
+        else:
+            status['servers'][server.id] = server.online
+            status['last_checked']['servers'][server.id] = server.last_checked.isoformat()
+            status['latency']['servers'][server.id] = server.latency
+    for service in services:
+        if service.last_checked is None:
+            status['services'][service.id] = unchecked['services'][service.id]
+        else:
+            status['services'][service.id] = service.status_message or service.online
+            status['last_checked']['services'][service.id] = service.last_checked.isoformat()
+            status['latency']['services'][service.id] = {
+                'connect': service.latency,
+                'ttfb': service.ttfb,
+            }
+    return status
@@ -0,0 +1,185 @@
+import os
+import ssl
+import time
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import caches
+
+from .ping import ping_hosts
+
+PROBE_TIMEOUT = float(os.getenv('PROBE_TIMEOUT', '1'))
+PROBE_CONCURRENCY = int(os.getenv('PROBE_CONCURRENCY', '64'))
+PROBE_CACHE_TTL = int(os.getenv('PROBE_CACHE_TTL', '30'))
+PROBE_CACHE_NEGATIVE_TTL = int(os.getenv('PROBE_CACHE_NEGATIVE_TTL', '15'))
+
+def probe_tcp(host, port, timeout=PROBE_TIMEOUT, rtts=None):
+    '''Checks if a TCP connection to host:port can be established. If `rtts` is a
+    dict, the connect time (seconds) is stored in it under (host, port).'''
+    if not host or not port:
+        return False
+    try:
+        start = time.monotonic()
+        with socket.create_connection((host, int(port)), timeout=timeout):
+            if rtts is not None:
+                rtts[(host, port)] = time.monotonic() - start
+            return True
+    except (socket.timeout, OSError, ValueError):
+        return False
+
+def probe_targets(targets, timeout=PROBE_TIMEOUT, concurrency=PROBE_CONCURRENCY, rtts=None):
+    '''Probes a list of (host, port) targets concurrently.
+
+    Targets without a port are pinged instead (see ping_hosts()). Duplicate
+    targets are only probed once. Returns a dict mapping each (host, port)
+    target to True (online) or False (offline). The total
+    runtime is bounded by the slowest single probe as long as the number
+    of distinct targets does not exceed the concurrency limit. If `rtts` is a
+    dict, the connect or echo time (seconds) of every online target is stored in it.
+
+    Under the gunicorn gevent worker the thread pool is monkey patched and
+    runs on greenlets, outside of it (cron, management commands) on threads.
+    '''
+    unique_targets = list(dict.fromkeys(targets))
+    if not unique_targets:
+        return {}
+
+    # Targets without a port are checked with an ICMP echo instead
+    tcp_targets = [target for target in unique_targets if target[1]]
+    icmp_hosts = [host for host, port in unique_targets if host and not port]
+
+    results = {target: False for target in unique_targets}
+    workers = max(1, min(concurrency, len(tcp_targets) + bool(icmp_hosts)))
+    icmp_rtts = {}
+    alive = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # The ICMP sweep multiplexes all hosts over one socket and needs one worker only
+        sweep = executor.submit(ping_hosts, icmp_hosts, timeout=timeout,
+                                concurrency=concurrency, rtts=icmp_rtts) if icmp_hosts else None
+        results.update(zip(tcp_targets, executor.map(
+            lambda target: probe_tcp(*target, timeout=timeout, rtts=rtts), tcp_targets)))
+        if sweep:
+            alive = sweep.result()
+    results.update({(host, port): alive.get(host, False) for host, port in unique_targets
+                    if host and not port})
+    if rtts is not None:
+        rtts.update({(host, port): icmp_rtts[host] for host, port in unique_targets
+                     if host and not port and host in icmp_rtts})
+    return results
+
+def probe_ttfb(host, port, tls=False, timeout=PROBE_TIMEOUT):
+    '''Returns the seconds from connecting to host:port until the first byte of the
+    response to an HTTP HEAD request arrives, including the TLS handshake if `tls`.
+    Returns None if the target does not respond in time.'''
+    if not host or not port:
+        return None
+    try:
+        start = time.monotonic()
+        with socket.create_connection((host, int(port)), timeout=timeout) as sock:
+            if tls:
+                context = ssl.create_default_context()
+                context.check_hostname = False  # Self-signed certificates are common in homelabs
+                context.verify_mode = ssl.CERT_NONE
+                sock = context.wrap_socket(sock, server_hostname=host)
+            sock.sendall(f'HEAD / HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'
+                         .encode())
+            if not sock.recv(1):
+                return None
+            return time.monotonic() - start
+    except (socket.timeout, OSError, ValueError):
+        return None
+
+def probe_ttfbs(targets, timeout=PROBE_TIMEOUT, concurrency=PROBE_CONCURRENCY):
+    '''Measures the HTTP time to first byte of (host, port, tls) targets concurrently.
+    Returns a dict of target -> seconds, targets that did not respond are left out.'''
+    unique_targets = list(dict.fromkeys(targets))
+    if not unique_targets:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(unique_targets)))) as executor:
+        results = zip(unique_targets, executor.map(
+            lambda target: probe_ttfb(*target, timeout=timeout), unique_targets))
+        return {target: ttfb for target, ttfb in results if ttfb is not None}
+
+def probe_cache_key(host, port):
+    '''Returns the status cache key for a probe target.'''
+    return f'probe:{host}:{port}'
+
+def cached_probe_targets(targets, ttl=PROBE_CACHE_TTL, negative_ttl=PROBE_CACHE_NEGATIVE_TTL,
+                         **kwargs):
+    '''Like probe_targets(), but serves results from the shared 'status' cache.
+
+    The cache is database backed and therefore shared by all gunicorn workers.
+    Online results are kept for `ttl` seconds, offline results for `negative_ttl`
+    seconds. Probes are single-flight: a worker only probes a target if it can
+    acquire the target's lock, other workers wait for the lock holder's result.
+    '''
+    status_cache = caches['status']
+    unique_targets = list(dict.fromkeys(targets))
+    if not unique_targets:
+        return {}
+
+    keys = {target: probe_cache_key(*target) for target in unique_targets}
+    cached = status_cache.get_many(keys.values())
+    results = {target: cached[key] for target, key in keys.items() if key in cached}
+
+    missing = [target for target in unique_targets if target not in results]
+    timeout = kwargs.get('timeout', PROBE_TIMEOUT)
+    lock_timeout = int(timeout) + 5
+    owned = [target for target in missing
+             if status_cache.add(f'{keys[target]}:lock', True, timeout=lock_timeout)]
+    waiting = [target for target in missing if target not in owned]
+
+    fresh = probe_targets(owned, **kwargs)
+    for target, online in fresh.items():
+        status_cache.set(keys[target], online, timeout=ttl if online else negative_ttl)
+        status_cache.delete(f'{keys[target]}:lock')
+    results.update(fresh)
+
+    # Wait for the probes other workers are running, fall back to probing ourselves
+    deadline = time.monotonic() + timeout + 1
+    while waiting and time.monotonic() < deadline:
+        time.sleep(0.1)
+        cached = status_cache.get_many([keys[target] for target in waiting])
+        for target in waiting:
+            if keys[target] in cached:
+                results[target] = cached[keys[target]]
+        waiting = [target for target in waiting if target not in results]
+    results.update(probe_targets(waiting, **kwargs))
+
+    return results
+
+def cached_probe_tcp(host, port, **kwargs):
+    '''Cached, single-flight variant of probe_tcp(). Hosts without a port are pinged.'''
+    if not host:
+        return False
+    return cached_probe_targets([(host, port)], **kwargs)[(host, port)]
+
+def probe_status(servers=(), services=(), use_cache=True, **kwargs):
+    '''Probes servers and services together in a single concurrent batch.
+
+    Returns a dict with 'servers' (server id -> bool) and 'services' (service id ->
+    bool, or an error message (str) if the service cannot be probed). Results are
+    served from the shared status cache unless use_cache is False.'''
+    servers = list(servers)
+    services = list(services)
+    probeable = [service for service in services if service.endpoint]
+    probe = cached_probe_targets if use_cache else probe_targets
+    results = probe([server.probe_target() for server in servers] +
+                    [service.probe_target() for service in probeable], **kwargs)
+
+    status = {
+        'servers': {server.id: results[server.probe_target()] for server in servers},
+        'services': {service.id: 'No endpoint provided.' for service in services},
+    }
+    for service in probeable:
+        status['services'][service.id] = results[service.probe_target()]
+    return status
+
+def probe_servers(servers, **kwargs):
+    '''Probes servers concurrently. Returns a dict of server id -> bool.'''
+    return probe_status(servers=servers, **kwargs)['servers']
+
+def probe_services(services, **kwargs):
+    '''Probes services concurrently. Returns a dict of service id -> bool, or an
+    error message (str) if the service cannot be probed.'''
+    return probe_status(services=services, **kwargs)['services']
@@ -0,0 +1,107 @@
+import os
+import time
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.cache import caches
+
+RESOLVER_TIMEOUT = float(os.getenv('RESOLVER_TIMEOUT', '1'))  # Seconds per PTR lookup
+RESOLVER_CONCURRENCY = int(os.getenv('RESOLVER_CONCURRENCY', '32'))
+RESOLVER_CACHE_TTL = int(os.getenv('RESOLVER_CACHE_TTL', '3600'))
+RESOLVER_NEGATIVE_TTL = int(os.getenv('RESOLVER_NEGATIVE_TTL', '300'))  # Missing or timed out
+
+MEMORY_CACHE = {}  # ip -> (hostname or None, expires at)
+MEMORY_CACHE_LOCK = threading.Lock()
+
+def resolver_cache_key(ip):
+    '''Returns the status cache key of a reverse DNS entry.'''
+    return f'rdns:{ip}'
+
+def lookup_hostname(ip):
+    '''Blocking PTR lookup of a single ip. Returns the hostname or None.'''
+    try:
+        return socket.gethostbyaddr(ip)[0]
+    except (OSError, UnicodeError):
+        return None
+
+def remember_hostname(ip, hostname):
+    '''Stores a lookup result in the in-memory cache.'''
+    ttl = RESOLVER_CACHE_TTL if hostname else RESOLVER_NEGATIVE_TTL
+    with MEMORY_CACHE_LOCK:
+        MEMORY_CACHE[ip] = (hostname, time.monotonic() + ttl)
+
+def cached_hostnames(ips):
+    '''Returns the cached reverse DNS entries of the ips without resolving anything,
+    as a dict of ip -> hostname (None for cached misses). Uncached ips are left out.
+    Reads the in-memory cache first, then the shared 'status' cache.'''
+    now = time.monotonic()
+    results = {}
+    with MEMORY_CACHE_LOCK:
+        for ip in ips:
+            entry = MEMORY_CACHE.get(ip)
+            if entry and entry[1] > now:
+                results[ip] = entry[0]
+
+    missing = [ip for ip in dict.fromkeys(ips) if ip and ip not in results]
+    if missing:
+        keys = {ip: resolver_cache_key(ip) for ip in missing}
+        stored = caches['status'].get_many(keys.values())
+        for ip, key in keys.items():
+            if key in stored:
+                results[ip] = stored[key] or None
+                remember_hostname(ip, results[ip])
+    return results
+
+def remember_late_hostname(ip, future):
+    '''Stores the result of a lookup that finished after resolve_hostnames() gave up
+    on it in the in-memory cache.'''
+    if not future.cancelled() and future.exception() is None:
+        remember_hostname(ip, future.result())
+
+def resolve_hostnames(ips, timeout=RESOLVER_TIMEOUT, concurrency=RESOLVER_CONCURRENCY):
+    '''Resolves the hostnames (PTR records) of many ips concurrently.
+    Returns a dict of ip -> hostname, or None if there is no record.
+
+    Cached entries are served from cached_hostnames(). The remaining ips are
+    looked up in batches of `concurrency`, each batch gets at most `timeout`
+    seconds. Missing records are cached for RESOLVER_NEGATIVE_TTL seconds,
+    hostnames for RESOLVER_CACHE_TTL seconds. Lookups that did not finish in time
+    are not cached, they are remembered in memory once they finish.
+    '''
+    ips = [ip for ip in dict.fromkeys(ips) if ip]
+    results = cached_hostnames(ips)
+    missing = [ip for ip in ips if ip not in results]
+    if not missing:
+        return results
+
+    finished = {}
+    for start in range(0, len(missing), concurrency):
+        batch = missing[start:start + concurrency]
+        # Every batch gets its own pool, lookups that time out keep blocking their thread
+        executor = ThreadPoolExecutor(max_workers=len(batch))
+        try:
+            futures = {ip: executor.submit(lookup_hostname, ip) for ip in batch}
+            wait(futures.values(), timeout=timeout)
+            for ip, future in futures.items():
+                if future.done():
+                    finished[ip] = future.result()
+                else:
+                    future.add_done_callback(
+                        lambda future, ip=ip: remember_late_hostname(ip, future))
+                results[ip] = finished.get(ip)
+        finally:
+            executor.shutdown(wait=False)
+
+    for ip, hostname in finished.items():
+        remember_hostname(ip, hostname)
+    caches['status'].set_many({resolver_cache_key(ip): hostname for ip, hostname
+                               in finished.items() if hostname}, timeout=RESOLVER_CACHE_TTL)
+    caches['status'].set_many({resolver_cache_key(ip): '' for ip, hostname
+                               in finished.items() if not hostname},
+                              timeout=RESOLVER_NEGATIVE_TTL)
+    return results
+
+def resolve_hostname(ip, **kwargs):
+    '''Resolves the hostname of a single ip, see resolve_hostnames().'''
+    return resolve_hostnames([ip], **kwargs).get(ip)
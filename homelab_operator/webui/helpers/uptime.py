@@ -0,0 +1,306 @@
+import os
+import struct
+from bisect import bisect_left
+from datetime import timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from ..models import AppState, LatencyHistogram, UptimeRollup, UptimeSample
+
+UPTIME_SAMPLE_RETENTION_DAYS = int(os.getenv('UPTIME_SAMPLE_RETENTION_DAYS', 1))
+UPTIME_MINUTE_RETENTION_DAYS = int(os.getenv('UPTIME_MINUTE_RETENTION_DAYS', 2))
+UPTIME_HOUR_RETENTION_DAYS = int(os.getenv('UPTIME_HOUR_RETENTION_DAYS', 90))
+# Day buckets are kept forever, that is one row per target and day
+UPTIME_MAX_BUCKETS = int(os.getenv('UPTIME_MAX_BUCKETS', 1440))  # Per range query
+UPTIME_ROLLUP_DELAY = 120  # Seconds, samples of slow probes are written after their timestamp
+
+LEVELS = ['minute', 'hour', 'day']
+FINER_LEVEL = {'minute': None, 'hour': 'minute', 'day': 'hour'}
+RETENTION = {
+    'minute': timezone.timedelta(days=UPTIME_MINUTE_RETENTION_DAYS),
+    'hour': timezone.timedelta(days=UPTIME_HOUR_RETENTION_DAYS),
+    'day': None,
+}
+
+def bucket_start(moment, level):
+    '''Returns the start (UTC) of the minute, hour or day bucket containing moment.'''
+    moment = moment.astimezone(dt_timezone.utc).replace(second=0, microsecond=0)
+    if level in ('hour', 'day'):
+        moment = moment.replace(minute=0)
+    if level == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+def target_filter(server=None, service=None):
+    '''Returns the queryset filter of the samples and rollups of a server or a service.'''
+    if server is not None:
+        return {'server': server}
+    if service is not None:
+        return {'service': service}
+    return {}
+
+def record_samples(servers=(), services=(), timestamp=None):
+    '''Appends one sample per probed server and service, with the latencies the
+    status poller stored on them. Targets without a result (online is None, e.g.
+    services without an endpoint) are skipped.'''
+    timestamp = timestamp or timezone.now()
+    samples = [UptimeSample(server=server, timestamp=timestamp, online=server.online,
+                            rtt=server.latency)
+               for server in servers if server.online is not None]
+    samples += [UptimeSample(service=service, timestamp=timestamp, online=service.online,
+                             rtt=service.latency, ttfb=service.ttfb)
+                for service in services if service.online is not None]
+    UptimeSample.objects.bulk_create(samples)
+    return len(samples)
+
+def aggregate_buckets(level, start, end):
+    '''Aggregates the source of a level (samples for minute buckets, minute buckets
+    for hour buckets, hour buckets for day buckets) between start and end into
+    rows of (server_id, service_id, bucket, online, total).'''
+    finer = FINER_LEVEL[level]
+    if finer is None:
+        source = UptimeSample.objects.filter(timestamp__gte=start, timestamp__lt=end) \
+            .annotate(slot=Trunc('timestamp', level, tzinfo=dt_timezone.utc))
+        counts = {'online_count': Count('id', filter=Q(online=True)), 'total_count': Count('id')}
+    else:
+        source = UptimeRollup.objects.filter(level=finer, bucket__gte=start, bucket__lt=end) \
+            .annotate(slot=Trunc('bucket', level, tzinfo=dt_timezone.utc))
+        counts = {'online_count': Sum('online'), 'total_count': Sum('total')}
+    return source.values('server_id', 'service_id', 'slot').annotate(**counts).order_by() \
+        .values_list('server_id', 'service_id', 'slot', 'online_count', 'total_count')
+
+def latency_histograms(start, end, **filters):
+    '''Builds the hourly LatencyHistogram rows (unsaved) of the samples between
+    start and end, optionally filtered (e.g. server_id__in=[...]).'''
+    histograms = {}
+    for server_id, service_id, timestamp, rtt, ttfb in UptimeSample.objects \
+            .filter(timestamp__gte=start, timestamp__lt=end, **filters) \
+            .filter(Q(rtt__isnull=False) | Q(ttfb__isnull=False)) \
+            .values_list('server_id', 'service_id', 'timestamp', 'rtt', 'ttfb'):
+        hour = bucket_start(timestamp, 'hour')
+        for metric, value in (('connect', rtt), ('ttfb', ttfb)):
+            if value is not None:
+                counts = histograms.setdefault((server_id, service_id, metric, hour),
+                                               [0] * (len(LatencyHistogram.EDGES) + 1))
+                counts[bisect_left(LatencyHistogram.EDGES, value)] += 1
+    return [LatencyHistogram(
+        server_id=server_id,
+        service_id=service_id,
+        metric=metric,
+        bucket=hour,
+        counts=struct.pack(LatencyHistogram.COUNTS_FORMAT, *counts),
+    ) for (server_id, service_id, metric, hour), counts in histograms.items()]
+
+def rollup_uptime(now=None):
+    '''Rolls the samples up into minute buckets, minute buckets into hour buckets
+    and hour buckets into day buckets. The samples' latencies are rolled up into
+    hourly LatencyHistogram rows along with the hour buckets. Only buckets that ended UPTIME_ROLLUP_DELAY
+    seconds ago are built, each bucket once it is complete. Returns the number of
+    written buckets.'''
+    app_state = AppState.ensure_exists()
+    until = (now or timezone.now()) - timezone.timedelta(seconds=UPTIME_ROLLUP_DELAY)
+    since = app_state.last_uptime_rollup or UptimeSample.objects.order_by('timestamp') \
+        .values_list('timestamp', flat=True).first()
+    if since is None or since >= until:
+        return 0
+
+    written = 0
+    with transaction.atomic():
+        for level in LEVELS:
+            start, end = bucket_start(since, level), bucket_start(until, level)
+            if start >= end:
+                continue
+            rows = list(aggregate_buckets(level, start, end))
+            # Rebuilding the whole range keeps the rollup idempotent
+            UptimeRollup.objects.filter(level=level, bucket__gte=start, bucket__lt=end).delete()
+            UptimeRollup.objects.bulk_create([UptimeRollup(
+                server_id=server_id,
+                service_id=service_id,
+                level=level,
+                bucket=bucket,
+                online=online,
+                total=total,
+            ) for server_id, service_id, bucket, online, total in rows], batch_size=1000)
+            written += len(rows)
+            if level == 'hour':
+                LatencyHistogram.objects.filter(bucket__gte=start, bucket__lt=end).delete()
+                LatencyHistogram.objects.bulk_create(latency_histograms(start, end),
+                                                     batch_size=1000)
+        AppState.objects.filter(pk=app_state.pk).update(last_uptime_rollup=until)
+    return written
+
+def prune_uptime(now=None):
+    '''Deletes samples, minute and hour buckets and latency histograms older than
+    their retention.
+    Data that has not been rolled up yet is kept. Returns the number of deleted rows.'''
+    now = now or timezone.now()
+    rolled_up = AppState.ensure_exists().last_uptime_rollup
+    if rolled_up is None:
+        return 0
+
+    cutoff = min(now - timezone.timedelta(days=UPTIME_SAMPLE_RETENTION_DAYS),
+                 bucket_start(rolled_up, 'minute'))
+    deleted = UptimeSample.objects.filter(timestamp__lt=cutoff).delete()[0]
+    for level in ('minute', 'hour'):
+        coarser = LEVELS[LEVELS.index(level) + 1]
+        cutoff = min(now - RETENTION[level], bucket_start(rolled_up, coarser))
+        deleted += UptimeRollup.objects.filter(level=level, bucket__lt=cutoff).delete()[0]
+    deleted += LatencyHistogram.objects.filter(bucket__lt=now - RETENTION['hour']).delete()[0]
+    return deleted
+
+def bucket_counts(level, start, end, rolled_up, **filters):
+    '''Returns {(server_id, service_id, bucket): [online, total]} of the level
+    buckets between start and end. Buckets that have been rolled up are read from
+    UptimeRollup, the most recent ones are built from the finer levels and the samples.'''
+    counts = {}
+
+    def add(server_id, service_id, bucket, online, total):
+        entry = counts.setdefault((server_id, service_id, bucket_start(bucket, level)), [0, 0])
+        entry[0] += online
+        entry[1] += total
+
+    rolled = min(end, bucket_start(rolled_up, level)) if rolled_up else start
+    if rolled > start:
+        for row in UptimeRollup.objects \
+                .filter(level=level, bucket__gte=start, bucket__lt=rolled, **filters) \
+                .values_list('server_id', 'service_id', 'bucket', 'online', 'total'):
+            add(*row)
+
+    start = max(start, rolled)
+    if start < end:
+        finer = FINER_LEVEL[level]
+        if finer:
+            for (server_id, service_id, bucket), (online, total) in bucket_counts(
+                    finer, start, end, rolled_up, **filters).items():
+                add(server_id, service_id, bucket, online, total)
+        else:
+            for row in UptimeSample.objects \
+                    .filter(timestamp__gte=start, timestamp__lt=end, **filters) \
+                    .annotate(slot=Trunc('timestamp', level, tzinfo=dt_timezone.utc)) \
+                    .values('server_id', 'service_id', 'slot') \
+                    .annotate(online_count=Count('id', filter=Q(online=True)),
+                              total_count=Count('id')) \
+                    .order_by() \
+                    .values_list('server_id', 'service_id', 'slot', 'online_count',
+                                 'total_count'):
+                add(*row)
+    return counts
+
+def series_level(start, end, now=None):
+    '''Returns the finest level that still holds data at start and serves the range
+    with at most UPTIME_MAX_BUCKETS buckets.'''
+    now = now or timezone.now()
+    for level in LEVELS:
+        retention = RETENTION[level]
+        if retention is not None and start < now - retention:
+            continue
+        if (end - start) / UptimeRollup.LEVEL_DURATIONS[level] <= UPTIME_MAX_BUCKETS:
+            return level
+    return 'day'
+
+def uptime_series(start, end, server=None, service=None, level=None):
+    '''Returns the uptime of a server or a service between start and end as
+    (level, [(bucket start, online, total), ...]), one entry per bucket with probes.
+    The level is picked by series_level() unless given.'''
+    level = level or series_level(start, end)
+    counts = bucket_counts(level, bucket_start(start, level), end,
+                           AppState.ensure_exists().last_uptime_rollup,
+                           **target_filter(server, service))
+    return level, [(key[2], online, total) for key, (online, total) in sorted(counts.items())]
+
+def uptime_availability(start, end, server=None, service=None):
+    '''Returns the share of online probes of a server or a service between start
+    and end, or None if there were no probes.'''
+    series = uptime_series(start, end, server=server, service=service)[1]
+    total = sum(entry[2] for entry in series)
+    return sum(entry[1] for entry in series) / total if total else None
+
+def uptime_matrix_counts(server, since=None, now=None, half_life=None, checks_per_bucket=None):
+    '''Returns the online and total counts of the server's probes per hour of the
+    week (slot = weekday * 24 + hour, UTC) as two lists of 168 numbers, the format
+    of ServerUptimeStatistic. Built from the hour buckets since `since`, by default
+    the whole hour retention. With a half_life (timedelta) every bucket is weighted
+    by 0.5 ** (age / half_life). With checks_per_bucket every bucket counts as that
+    many checks instead of its probes, split by its share of online probes.'''
+    now = now or timezone.now()
+    since = since or now - RETENTION['hour']
+    online = [0] * 168
+    total = [0] * 168
+    series = uptime_series(since, now, server=server, level='hour')[1]
+    for bucket, bucket_online, bucket_total in series:
+        slot = bucket.weekday() * 24 + bucket.hour
+        if checks_per_bucket:
+            bucket_online = bucket_online / bucket_total * checks_per_bucket
+            bucket_total = checks_per_bucket
+        weight = 0.5 ** ((now - bucket) / half_life) if half_life else 1
+        online[slot] += bucket_online * weight
+        total[slot] += bucket_total * weight
+    return online, total
+
+def histogram_percentile(counts, quantile):
+    '''Estimates a percentile (ms) from LatencyHistogram counts, interpolating
+    linearly inside the bucket. Latencies above the last edge are reported as the
+    last edge. Returns None for empty counts.'''
+    total = sum(counts)
+    if not total:
+        return None
+    edges = LatencyHistogram.EDGES
+    rank = quantile * total
+    seen = 0
+    for index, count in enumerate(counts):
+        if count and seen + count >= rank:
+            if index == len(edges):
+                return float(edges[-1])
+            lower = edges[index - 1] if index else 0
+            return lower + (edges[index] - lower) * (rank - seen) / count
+        seen += count
+    return float(edges[-1])
+
+def latency_summaries(servers=(), services=(), since=None):
+    '''Returns the latency percentiles of servers and services since `since` (by
+    default the last 24 hours) from their hourly histograms, as
+        {('server' or 'service', id): {metric: {'p50': ms, 'p95': ms, 'probes': n}}}
+    '''
+    since = bucket_start(since or timezone.now() - timezone.timedelta(hours=24), 'hour')
+    server_ids = [server.id for server in servers]
+    service_ids = [service.id for service in services]
+    totals = {}
+    for server_id, service_id, metric, counts in LatencyHistogram.objects \
+            .filter(Q(server_id__in=server_ids) | Q(service_id__in=service_ids),
+                    bucket__gte=since) \
+            .values_list('server_id', 'service_id', 'metric', 'counts'):
+        key = ('server', server_id) if server_id else ('service', service_id)
+        total = totals.setdefault(key, {}).setdefault(metric,
+                                                       [0] * (len(LatencyHistogram.EDGES) + 1))
+        for index, count in enumerate(struct.unpack(LatencyHistogram.COUNTS_FORMAT,
+                                                    bytes(counts))):
+            total[index] += count
+    return {key: {metric: {
+        'p50': histogram_percentile(counts, 0.5),
+        'p95': histogram_percentile(counts, 0.95),
+        'probes': sum(counts),
+    } for metric, counts in metrics.items()} for key, metrics in totals.items()}
+
+def server_latency_counts(server_ids, start, end, metric='connect'):
+    '''Returns {server id: counts} of the servers' latencies between the start of
+    the hour containing start and end, summed from the hourly histograms. Hours
+    that are not rolled up yet are built from the samples. Histograms are kept for
+    UPTIME_HOUR_RETENTION_DAYS.'''
+    rolled_up = AppState.ensure_exists().last_uptime_rollup
+    start = bucket_start(start, 'hour')
+    rolled = max(start, min(end, bucket_start(rolled_up, 'hour'))) if rolled_up else start
+    histograms = list(LatencyHistogram.objects.filter(metric=metric, server_id__in=server_ids,
+                                                      bucket__gte=start, bucket__lt=rolled))
+    if rolled < end:
+        histograms += [histogram for histogram in latency_histograms(
+            rolled, end, server_id__in=server_ids) if histogram.metric == metric]
+
+    totals = {}
+    for histogram in histograms:
+        total = totals.setdefault(histogram.server_id, [0] * (len(LatencyHistogram.EDGES) + 1))
+        for index, count in enumerate(histogram.get_counts()):
+            total[index] += count
+    return totals
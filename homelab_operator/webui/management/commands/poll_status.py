@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from webui.helpers.poller import poll_due_targets, seconds_until_next_check
+
+class Command(BaseCommand):
+    help = 'Periodically probes all servers and services and stores their online state'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Poll all due targets once and exit')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['once']:
+            polled = poll_due_targets()
+            self.stdout.write(f"Polled {polled} targets.")
+            return
+
+        self.stdout.write("Status poller started.")
+        while True:
+            close_old_connections()
+            try:
+                poll_due_targets()
+            except Exception as e:
+                self.stderr.write(f"Status poller error: {e}")
+                time.sleep(5)
+                continue
+            time.sleep(max(1, seconds_until_next_check()))
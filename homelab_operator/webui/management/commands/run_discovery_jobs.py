@@ -0,0 +1,47 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from webui.helpers.discovery_jobs import DISCOVERY_MAX_JOBS, claim_discovery_job, \
+    fail_stale_jobs, run_discovery_job
+
+POLL_INTERVAL = 2  # Seconds between two checks for queued jobs
+
+class Command(BaseCommand):
+    help = 'Runs queued auto-discovery jobs in the background'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Run all startable queued jobs once and exit')
+
+    def run_job(self, job):
+        try:
+            run_discovery_job(job)
+        except Exception as e:
+            self.stderr.write(f"Discovery job {job.task_id} error: {e}")
+        finally:
+            connection.close()
+
+    def handle(self, *args, **kwargs):
+        if kwargs['once']:
+            while job := claim_discovery_job():
+                run_discovery_job(job)
+                self.stdout.write(f"Discovery job {job.task_id}: {job.status}.")
+            return
+
+        failed = fail_stale_jobs()
+        if failed:
+            self.stdout.write(f"Marked {failed} interrupted discovery jobs as failed.")
+
+        self.stdout.write("Discovery job runner started.")
+        with ThreadPoolExecutor(max_workers=max(1, DISCOVERY_MAX_JOBS)) as executor:
+            while True:
+                close_old_connections()
+                try:
+                    while job := claim_discovery_job():
+                        executor.submit(self.run_job, job)
+                except Exception as e:
+                    self.stderr.write(f"Discovery job runner error: {e}")
+                time.sleep(POLL_INTERVAL)
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.2 on 2026-10-18 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0040_maintenanceplan_homelab'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='server',
+            name='check_interval',
+            field=models.IntegerField(default=60, help_text='Seconds between background online checks'),
+        ),
+        migrations.AddField(
+            model_name='server',
+            name='last_checked',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='server',
+            name='next_check',
+            field=models.DateTimeField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='server',
+            name='online',
+            field=models.BooleanField(editable=False, help_text='Last known online state, set by the status poller', null=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='check_interval',
+            field=models.IntegerField(default=60, help_text='Seconds between background online checks'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='last_checked',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='next_check',
+            field=models.DateTimeField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='online',
+            field=models.BooleanField(editable=False, help_text='Last known online state, set by the status poller', null=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='status_message',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Reason why the service could not be checked', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='maintenanceplan',
+            name='scheduled_date',
+            field=models.DateField(help_text='When the maintenance is scheduled'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.2 on 2026-10-18 13:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0042_discoveryjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discoveryjob',
+            name='diff',
+            field=models.JSONField(blank=True, default=dict, help_text='Added, vanished and changed hosts since the last scan'),
+        ),
+        migrations.AddField(
+            model_name='discoveryjob',
+            name='incremental',
+            field=models.BooleanField(default=True, help_text='Reuse the fingerprints of known hosts'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.2 on 2026-10-18 13:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0043_discoveryjob_incremental'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='network',
+            name='discovery_next_run',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='network',
+            name='discovery_schedule',
+            field=models.CharField(blank=True, choices=[('hourly', 'Hourly'), ('daily', 'Daily'), ('weekly', 'Weekly')], help_text='Run an incremental auto discovery of the subnet on this schedule', max_length=10, null=True),
+        ),
+        migrations.CreateModel(
+            name='HostObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip_address', models.GenericIPAddressField()),
+                ('mac_address', models.CharField(blank=True, max_length=17, null=True)),
+                ('hostname', models.CharField(blank=True, max_length=255, null=True)),
+                ('open_ports', models.JSONField(blank=True, default=list)),
+                ('rtt', models.FloatField(blank=True, help_text='Round trip time in ms', null=True)),
+                ('seen_at', models.DateTimeField(db_index=True)),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='observations', to='webui.discoveryjob')),
+                ('network', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='observations', to='webui.network')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['network', 'ip_address', '-seen_at'], name='webui_hosto_network_b9a370_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0044_discovery_schedule_hostobservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='network',
+            name='dhcp_range',
+            field=models.CharField(blank=True, help_text='DHCP address range, swept first by auto discovery, e.g. 192.168.1.100-192.168.1.200', max_length=50, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.2 on 2026-10-18 13:49
+
+import webui.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0045_network_dhcp_range'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='discoveryjob',
+            name='subnet',
+            field=models.CharField(help_text='Subnets scanned by this job', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='network',
+            name='subnet',
+            field=models.CharField(blank=True, help_text='Subnets of the network, comma separated, e.g. 192.168.1.0/24, fd00::/64', max_length=200, null=True, validators=[webui.models.validate_subnets]),
+        ),
+    ]
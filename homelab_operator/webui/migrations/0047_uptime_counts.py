@@ -0,0 +1,65 @@
+# Generated by Django 5.2.2 on 2026-10-18 13:50
+
+import struct
+
+import webui.models
+from django.db import migrations, models
+
+SLOTS = 7 * 24
+COUNTS_FORMAT = f'<{2 * SLOTS}I'
+
+
+def matrix_to_counts(apps, schema_editor):
+    '''Converts the JSON matrix ({day: {hour: [p, n]}}) to online and total counts.'''
+    ServerUptimeStatistic = apps.get_model('webui', 'ServerUptimeStatistic')
+    for statistic in ServerUptimeStatistic.objects.all():
+        online = [0] * SLOTS
+        total = [0] * SLOTS
+        matrix = statistic.matrix if isinstance(statistic.matrix, dict) else {}
+        for day in range(7):
+            for hour in range(24):
+                try:
+                    p, n = matrix[str(day)][str(hour)]
+                    p, n = float(p), int(n)
+                except (KeyError, TypeError, ValueError):
+                    continue
+                total[day * 24 + hour] = n
+                online[day * 24 + hour] = min(n, round(p * n))
+        statistic.counts = struct.pack(COUNTS_FORMAT, *online, *total)
+        statistic.save(update_fields=['counts'])
+
+
+def counts_to_matrix(apps, schema_editor):
+    '''Converts the online and total counts back to the JSON matrix.'''
+    ServerUptimeStatistic = apps.get_model('webui', 'ServerUptimeStatistic')
+    for statistic in ServerUptimeStatistic.objects.all():
+        values = struct.unpack(COUNTS_FORMAT, bytes(statistic.counts))
+        statistic.matrix = {
+            str(day): {
+                str(hour): [values[day * 24 + hour] / values[SLOTS + day * 24 + hour]
+                            if values[SLOTS + day * 24 + hour] else 0.0,
+                            values[SLOTS + day * 24 + hour]]
+                for hour in range(24)
+            } for day in range(7)
+        }
+        statistic.save(update_fields=['matrix'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0046_network_multiple_subnets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serveruptimestatistic',
+            name='counts',
+            field=models.BinaryField(default=webui.models.empty_uptime_counts),
+        ),
+        migrations.RunPython(matrix_to_counts, counts_to_matrix),
+        migrations.RemoveField(
+            model_name='serveruptimestatistic',
+            name='matrix',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.2 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0047_uptime_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appstate',
+            name='last_cron_duration',
+            field=models.FloatField(blank=True, help_text='Seconds the last uptime statistics pass took', null=True),
+        ),
+        migrations.AddField(
+            model_name='appstate',
+            name='last_cron_queries',
+            field=models.IntegerField(blank=True, help_text='Database queries of the last pass', null=True),
+        ),
+        migrations.AddField(
+            model_name='appstate',
+            name='last_cron_servers',
+            field=models.IntegerField(blank=True, help_text='Servers updated by the last pass', null=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.2 on 2026-10-18 13:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0048_appstate_cron_cost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appstate',
+            name='last_uptime_rollup',
+            field=models.DateTimeField(blank=True, help_text='Time of the last uptime rollup', null=True),
+        ),
+        migrations.CreateModel(
+            name='UptimeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=6)),
+                ('bucket', models.DateTimeField(help_text='Start of the bucket')),
+                ('online', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('server', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='uptime_rollups', to='webui.server')),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='uptime_rollups', to='webui.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['level', 'server', 'bucket'], name='webui_uptim_level_99aa34_idx'), models.Index(fields=['level', 'service', 'bucket'], name='webui_uptim_level_c201a6_idx'), models.Index(fields=['level', 'bucket'], name='webui_uptim_level_934f9c_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UptimeSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(db_index=True)),
+                ('online', models.BooleanField()),
+                ('server', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='uptime_samples', to='webui.server')),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='uptime_samples', to='webui.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['server', 'timestamp'], name='webui_uptim_server__e95bf4_idx'), models.Index(fields=['service', 'timestamp'], name='webui_uptim_service_5e7cf8_idx')],
+            },
+        ),
+    ]
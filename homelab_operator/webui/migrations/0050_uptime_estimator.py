@@ -0,0 +1,29 @@
+# Generated by Django 5.2.2 on 2026-10-18 13:56
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0049_uptime_samples_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serveruptimestatistic',
+            name='estimator',
+            field=models.CharField(choices=[('cumulative', 'Cumulative, all checks since the last reset'), ('window', 'Sliding window over the last days'), ('decay', 'Exponential decay, recent checks weigh more')], default='cumulative', help_text='How the checks are weighted', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='serveruptimestatistic',
+            name='half_life_days',
+            field=models.FloatField(default=7, help_text='Days after which a check weighs half for the exponential decay', validators=[django.core.validators.MinValueValidator(0.1)]),
+        ),
+        migrations.AddField(
+            model_name='serveruptimestatistic',
+            name='window_days',
+            field=models.PositiveIntegerField(default=28, help_text='Days covered by the sliding window', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
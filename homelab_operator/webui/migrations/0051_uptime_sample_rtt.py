@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0050_uptime_estimator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uptimesample',
+            name='rtt',
+            field=models.FloatField(blank=True, help_text='Connect or echo time in ms', null=True),
+        ),
+    ]
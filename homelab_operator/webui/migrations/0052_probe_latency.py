@@ -0,0 +1,49 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:04
+
+import django.db.models.deletion
+import webui.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0051_uptime_sample_rtt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='server',
+            name='latency',
+            field=models.FloatField(editable=False, help_text='Last connect or echo time in ms, set by the status poller', null=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='latency',
+            field=models.FloatField(editable=False, help_text='Last connect time in ms, set by the status poller', null=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='ttfb',
+            field=models.FloatField(editable=False, help_text='Last HTTP time to first byte in ms, set by the status poller', null=True),
+        ),
+        migrations.AddField(
+            model_name='uptimesample',
+            name='ttfb',
+            field=models.FloatField(blank=True, help_text='HTTP time to first byte in ms', null=True),
+        ),
+        migrations.CreateModel(
+            name='LatencyHistogram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('connect', 'Connect time'), ('ttfb', 'Time to first byte')], max_length=7)),
+                ('bucket', models.DateTimeField(help_text='Start of the hour')),
+                ('counts', models.BinaryField(default=webui.models.empty_latency_counts)),
+                ('server', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='latency_histograms', to='webui.server')),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='latency_histograms', to='webui.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['server', 'bucket'], name='webui_laten_server__041803_idx'), models.Index(fields=['service', 'bucket'], name='webui_laten_service_fd26cc_idx'), models.Index(fields=['bucket'], name='webui_laten_bucket_06009e_idx')],
+            },
+        ),
+    ]
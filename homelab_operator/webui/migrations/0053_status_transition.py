@@ -0,0 +1,29 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0052_probe_latency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_state', models.BooleanField(null=True)),
+                ('new_state', models.BooleanField(null=True)),
+                ('timestamp', models.DateTimeField(db_index=True)),
+                ('latency', models.FloatField(blank=True, help_text='Connect or echo time in ms of the probe', null=True)),
+                ('server', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='status_transitions', to='webui.server')),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='status_transitions', to='webui.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['server', '-timestamp'], name='webui_statu_server__d3f657_idx'), models.Index(fields=['service', '-timestamp'], name='webui_statu_service_88ab73_idx')],
+            },
+        ),
+    ]
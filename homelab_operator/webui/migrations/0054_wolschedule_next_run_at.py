@@ -0,0 +1,57 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:07
+
+import math
+
+from django.db import migrations, models
+from django.utils import timezone
+
+WINDOW = timezone.timedelta(minutes=5)
+
+
+def first_run_from(schedule, moment):
+    '''Copy of WOLSchedule.first_run_from(), historical models have no methods.'''
+    run = schedule.schedule_time
+    if run >= moment:
+        return run
+    if not schedule.repeat:
+        return None
+    if schedule.repeat_type in ('daily', 'weekly'):
+        step = timezone.timedelta(days=1 if schedule.repeat_type == 'daily' else 7)
+        return run + step * math.ceil((moment - run) / step)
+    if schedule.repeat_type == 'monthly':
+        moment = moment.astimezone(run.tzinfo)
+        year, month = moment.year, moment.month
+        for _ in range(13):
+            try:
+                candidate = run.replace(year=year, month=month)
+                if candidate >= moment:
+                    return candidate
+            except ValueError:
+                pass
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return None
+
+
+def fill_next_run_at(apps, schema_editor):
+    '''Computes the next execution of the existing schedules.'''
+    WOLSchedule = apps.get_model('webui', 'WOLSchedule')
+    moment = timezone.now() - WINDOW
+    for schedule in WOLSchedule.objects.all():
+        schedule.next_run_at = first_run_from(schedule, moment)
+        schedule.save(update_fields=['next_run_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0053_status_transition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wolschedule',
+            name='next_run_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='Next execution, derived from the schedule time and the repeat type', null=True),
+        ),
+        migrations.RunPython(fill_next_run_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:15
+
+import django.core.validators
+import webui.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0054_wolschedule_next_run_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='serveruptimestatistic',
+            name='window_days',
+            field=models.PositiveIntegerField(default=28, help_text='Days covered by the sliding window, at most the hour bucket retention (UPTIME_HOUR_RETENTION_DAYS)', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(webui.models.uptime_hour_retention_days)]),
+        ),
+    ]
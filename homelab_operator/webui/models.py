@@ -1,13 +1,20 @@
 '''Models for the web UI of the homelab operator.'''
 import os
+import math
 import requests
 import socket
+import struct
+import ipaddress
+from django.conf import settings
 from django.db import models
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 
 from .helpers.system import is_process_running
+from .helpers.probe import cached_probe_tcp
 
 class UserProfile(models.Model):
     '''Model representing a user profile.'''
@@ -33,11 +40,19 @@ class UserProfile(models.Model):
             scheduled_date__gte=timezone.now() - timezone.timedelta(days=2),
             scheduled_date__lte=timezone.now() + timezone.timedelta(days=7),
         )
+        transitions = StatusTransition.objects.filter(
+            models.Q(server__user=self.user) | models.Q(service__server__user=self.user),
+            timestamp__gte=timezone.now() - timezone.timedelta(days=1),
+            old_state__isnull=False,
+        ).select_related('server', 'service__server').order_by('-timestamp')
 
         return [{
             'title': 'Upcoming Maintenance Plan.',
             'date': s.scheduled_date,
-            'content': s.title,} for s in maintenance_notifications]
+            'content': s.title,} for s in maintenance_notifications] + [{
+            'title': f'{t.target()} is {t.state_label(t.new_state)}.',
+            'date': t.timestamp,
+            'content': f'Was {t.state_label(t.old_state)}',} for t in transitions]
 
 class Server(models.Model):
     '''Model representing a server.'''
@@ -55,6 +70,14 @@ class Server(models.Model):
                                 related_name='servers')
     auto_wake = models.BooleanField(default=False,
                                     help_text='Automatically wake the server on access')
+    check_interval = models.IntegerField(default=60,
+                                         help_text='Seconds between background online checks')
+    online = models.BooleanField(null=True, editable=False,
+                                 help_text='Last known online state, set by the status poller')
+    last_checked = models.DateTimeField(null=True, editable=False)
+    next_check = models.DateTimeField(null=True, editable=False, db_index=True)
+    latency = models.FloatField(null=True, editable=False,
+                                help_text='Last connect or echo time in ms, set by the status poller')
     # TODO Shutdown URL configuration (related_name): implement as shutdown_adapther, which can be
     # a ShutdownURLConfiguration, ShutdownSSLConfiguration, similar ...
 
@@ -108,15 +131,20 @@ class Server(models.Model):
         except Exception as e:
             return f'Unknown error occurred: {str(e)}'
 
+    def probe_target(self):
+        '''Returns the (host, port) tuple used to check if the server is online.'''
+        return (self.ip_address, self.port)
+
     def is_online(self):
-        '''Checks if the server is online by attempting to connect to SSH.'''
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(1)
-                sock.connect((self.ip_address, self.port))
-            return True
-        except (socket.timeout, socket.error):
-            return False
+        '''Checks if the server is online by attempting to connect to its port.'''
+        return cached_probe_tcp(*self.probe_target())
+
+    def last_known_status(self):
+        '''Returns the online state stored by the status poller. Falls back to a
+        (cached) probe if the server was not polled yet.'''
+        if self.last_checked is None:
+            return self.is_online()
+        return self.online
 
 class Service(models.Model):
     '''Model representing a service running on a server.'''
@@ -129,36 +157,155 @@ class Service(models.Model):
                           help_text='URL to access the service, if applicable. Used to redirect to the service.')
     icon_url = models.URLField(null=True, blank=True)
     note = models.TextField(null=True, blank=True)
+    check_interval = models.IntegerField(default=60,
+                                         help_text='Seconds between background online checks')
+    online = models.BooleanField(null=True, editable=False,
+                                 help_text='Last known online state, set by the status poller')
+    status_message = models.CharField(max_length=200, blank=True, default='', editable=False,
+                                      help_text='Reason why the service could not be checked')
+    last_checked = models.DateTimeField(null=True, editable=False)
+    next_check = models.DateTimeField(null=True, editable=False, db_index=True)
+    latency = models.FloatField(null=True, editable=False,
+                                help_text='Last connect time in ms, set by the status poller')
+    ttfb = models.FloatField(null=True, editable=False,
+                             help_text='Last HTTP time to first byte in ms, set by the status poller')
 
     def __str__(self):
         return f"{self.name} on {self.server.name}"
 
+    def probe_target(self):
+        '''Returns the (host, port) tuple used to check if the service is online.'''
+        return (self.endpoint, self.port)
+
+    def ttfb_target(self):
+        '''Returns the (host, port, tls) tuple used to measure the HTTP time to first
+        byte, or None if the service has no HTTP(S) URL.'''
+        if not self.endpoint or not self.url or not self.url.startswith(('http://', 'https://')):
+            return None
+        return (self.endpoint, self.port, self.url.startswith('https://'))
+
     def is_online(self):
         '''Checks if the service is online by attempting to connect to the endpoint (domain or IP) and port.'''
         if not self.endpoint:
             return 'No endpoint provided.'
 
+        return cached_probe_tcp(*self.probe_target())
+
+    def last_known_status(self):
+        '''Returns the online state (or error message) stored by the status poller.
+        Falls back to a (cached) probe if the service was not polled yet.'''
+        if self.last_checked is None:
+            return self.is_online()
+        return self.status_message or self.online
+
+def validate_subnets(value):
+    '''Validates a comma separated list of IPv4 and IPv6 prefixes.'''
+    for prefix in (value or '').split(','):
+        if not prefix.strip():
+            continue
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(1)
-                sock.connect((self.endpoint, self.port))
-            return True
-        except (socket.timeout, socket.error):
-            return False
+            ipaddress.ip_network(prefix.strip(), strict=False)
+        except ValueError:
+            raise ValidationError(f'{prefix.strip()} is not a valid subnet.')
 
 class Network(models.Model):
     '''Model representing a network.'''
     name = models.CharField(max_length=20)
-    subnet = models.CharField(max_length=20, null=True, blank=True,
-                              help_text='Subnet of the network, e.g. 192.168.1.0/24')
+    subnet = models.CharField(max_length=200, null=True, blank=True,
+                              validators=[validate_subnets],
+                              help_text='Subnets of the network, comma separated, ' + \
+                                'e.g. 192.168.1.0/24, fd00::/64')
     note = models.TextField(null=True, blank=True)
     user = models.ForeignKey('auth.User', on_delete=models.CASCADE, null=True, blank=True)
     homelab = models.ForeignKey('Homelab', on_delete=models.CASCADE, null=True, blank=True,
                                 related_name='networks')
+    discovery_schedule = models.CharField(max_length=10,
+                                          choices=[
+                                              ('hourly', 'Hourly'),
+                                              ('daily', 'Daily'),
+                                              ('weekly', 'Weekly'),
+                                              ], null=True, blank=True,
+                                          help_text='Run an incremental auto discovery ' + \
+                                            'of the subnet on this schedule')
+    discovery_next_run = models.DateTimeField(null=True, blank=True, editable=False,
+                                              db_index=True)
+    dhcp_range = models.CharField(max_length=50, null=True, blank=True,
+                                  help_text='DHCP address range, swept first by auto discovery, ' + \
+                                    'e.g. 192.168.1.100-192.168.1.200')
+
+    DISCOVERY_INTERVALS = {
+        'hourly': timezone.timedelta(hours=1),
+        'daily': timezone.timedelta(days=1),
+        'weekly': timezone.timedelta(weeks=1),
+    }
 
     def __str__(self):
         return str(self.name)
 
+class DiscoveryJob(models.Model):
+    '''Model representing an auto-discovery run of a network, executed in the background
+    by the `run_discovery_jobs` management command.'''
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+    ACTIVE_STATUSES = ('QUEUED', 'RUNNING')
+
+    task_id = models.CharField(max_length=32, unique=True)
+    network = models.ForeignKey('Network', on_delete=models.CASCADE,
+                                related_name='discovery_jobs')
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED',
+                              db_index=True)
+    subnet = models.CharField(max_length=200, help_text='Subnets scanned by this job')
+    progress = models.TextField(blank=True, default='',
+                                help_text='Progress log of the discovery (HTML)')
+    results = models.JSONField(default=list, blank=True,
+                               help_text='Discovered servers and their services')
+    incremental = models.BooleanField(default=True,
+                                      help_text='Reuse the fingerprints of known hosts')
+    diff = models.JSONField(default=dict, blank=True,
+                            help_text='Added, vanished and changed hosts since the last scan')
+    cancel_requested = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Discovery of {self.subnet} ({self.status})"
+
+    def is_active(self):
+        '''Returns True while the job is queued or running.'''
+        return self.status in self.ACTIVE_STATUSES
+
+class HostObservation(models.Model):
+    '''Model representing a host seen by a discovery job. Rows are only appended,
+    one per alive host and scan.'''
+    network = models.ForeignKey('Network', on_delete=models.CASCADE,
+                                related_name='observations')
+    job = models.ForeignKey('DiscoveryJob', on_delete=models.SET_NULL, null=True, blank=True,
+                            related_name='observations')
+    ip_address = models.GenericIPAddressField()
+    mac_address = models.CharField(max_length=17, null=True, blank=True)
+    hostname = models.CharField(max_length=255, null=True, blank=True)
+    open_ports = models.JSONField(default=list, blank=True)
+    rtt = models.FloatField(null=True, blank=True, help_text='Round trip time in ms')
+    seen_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['network', 'ip_address', '-seen_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.ip_address} seen at {self.seen_at}"
+
 class WOLSchedule(models.Model):
     '''Model representing a Wake-on-LAN schedule.'''
     server = models.ForeignKey(Server, on_delete=models.CASCADE, related_name='wol_schedules')
@@ -182,10 +329,59 @@ class WOLSchedule(models.Model):
                             help_text='Logs of the WOL schedule execution')
     enable_log = models.BooleanField(default=True,
                                      help_text='Enable or disable logging for the WOL schedule')
+    next_run_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True,
+                                       help_text='Next execution, derived from the schedule time '
+                                                 'and the repeat type')
+
+    WINDOW = timezone.timedelta(minutes=5)  # Schedules are executed up to 5 minutes early
+    # and late by up to one cron interval plus the window, as cron ticks land after the run
+    LATE_WINDOW = timezone.timedelta(minutes=settings.CRON_INTERVAL_MINUTES) + WINDOW
 
     def __str__(self):
         return f"WOL for {self.server.name} at {self.schedule_time}"
 
+    def save(self, *args, **kwargs):
+        '''Recomputes next_run_at if the timing changed. Otherwise it only advances,
+        so a run that was already executed is not queued again.'''
+        moment = timezone.now() - self.WINDOW
+        stored = WOLSchedule.objects.filter(pk=self.pk).values(
+            'schedule_time', 'repeat', 'repeat_type', 'next_run_at').first() \
+            if self.pk else None
+        if stored is None or (stored['schedule_time'], stored['repeat'], stored['repeat_type']) \
+                != (self.schedule_time, self.repeat, self.repeat_type):
+            self.next_run_at = self.first_run_from(moment)
+        elif stored['next_run_at'] is None:
+            self.next_run_at = None
+        else:
+            self.next_run_at = self.first_run_from(
+                max(stored['next_run_at'], timezone.now() - self.LATE_WINDOW))
+        super().save(*args, **kwargs)
+
+    def first_run_from(self, moment):
+        '''Returns the first execution of the schedule at or after `moment`, or None
+        if the schedule is not executed again. Monthly schedules skip months without
+        the day of the schedule time.'''
+        run = self.schedule_time
+        if run >= moment:
+            return run
+        if not self.repeat:
+            return None
+        if self.repeat_type in ('daily', 'weekly'):
+            step = timezone.timedelta(days=1 if self.repeat_type == 'daily' else 7)
+            return run + step * math.ceil((moment - run) / step)
+        if self.repeat_type == 'monthly':
+            moment = moment.astimezone(run.tzinfo)
+            year, month = moment.year, moment.month
+            for _ in range(13):
+                try:
+                    candidate = run.replace(year=year, month=month)
+                    if candidate >= moment:
+                        return candidate
+                except ValueError:
+                    pass
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return None
+
 class ShutdownURLConfiguration(models.Model):
     '''Model representing a shutdown URL configuration.'''
     name = models.CharField(max_length=100)
@@ -230,59 +426,266 @@ class Wiki(models.Model):
     def __str__(self):
         return f"Wiki for {self.homelab.name}" if self.homelab else "Dangling Wiki"
 
+def empty_uptime_counts():
+    '''Returns the counts of an empty uptime statistic, see ServerUptimeStatistic.'''
+    return bytes(struct.calcsize(ServerUptimeStatistic.COUNTS_FORMAT))
+
+def uptime_hour_retention_days():
+    '''Returns the days hour buckets are kept, the longest sliding window.'''
+    from .helpers.uptime import UPTIME_HOUR_RETENTION_DAYS
+    return UPTIME_HOUR_RETENTION_DAYS
+
 class ServerUptimeStatistic(models.Model):
     '''Model representing server uptime statistics.
-    matrix is a 7x24 matrix storing uptime statistics for each hour of the week:
-        {
-            "0": { # Day 0 (Monday)
-                "0": [0.0, 1], # Hour 0 (00:00) - 0.0% uptime, 1 data point
-                "1": [0.0, 1], # Hour 1 (01:00) - 0.0% uptime, 1 data point
-                ...,
-                "23": [0.0, 1] # Hour 23 (23:00) - 0.0% uptime, 1 data point
-                },
-            "1": { # Day 1 (Tuesday)
-                ...
-                },
-            ...
-        }
+    counts stores the number of online checks and the total number of checks for each
+    of the 7x24 hours of the week (slot = day * 24 + hour, day 0 is Monday) as a
+    fixed-size blob of 2x168 unsigned 32 bit integers:
+        [online slot 0, ..., online slot 167, total slot 0, ..., total slot 167]
     '''
+    SLOTS = 7 * 24
+    COUNTS_FORMAT = f'<{2 * SLOTS}I'
+
+    ESTIMATOR_CHOICES = [
+        ('cumulative', 'Cumulative, all checks since the last reset'),
+        ('window', 'Sliding window over the last days'),
+        ('decay', 'Exponential decay, recent checks weigh more'),
+    ]
+
     server = models.ForeignKey('Server', on_delete=models.CASCADE, unique=True,
                                related_name='uptime_statistic')
-    matrix = models.JSONField(default={"not":"initialized"})  # stores 7×24 matrix as nested lists/dict
+    counts = models.BinaryField(default=empty_uptime_counts)
     initialized = models.BooleanField(default=False)
     last_updated = models.DateTimeField(auto_now=True)
+    estimator = models.CharField(max_length=10, choices=ESTIMATOR_CHOICES, default='cumulative',
+                                 help_text='How the checks are weighted')
+    window_days = models.PositiveIntegerField(default=28,
+                                              validators=[MinValueValidator(1),
+                                                          MaxValueValidator(
+                                                              uptime_hour_retention_days)],
+                                              help_text='Days covered by the sliding window, '
+                                                        'at most the hour bucket retention '
+                                                        '(UPTIME_HOUR_RETENTION_DAYS)')
+    half_life_days = models.FloatField(default=7, validators=[MinValueValidator(0.1)],
+                                       help_text='Days after which a check weighs half '
+                                                 'for the exponential decay')
 
     def __str__(self):
         return f"Uptime statistics for {self.server.name}"
 
+    def get_counts(self):
+        '''Returns the online counts and total counts as two lists of 168 integers.'''
+        values = struct.unpack(self.COUNTS_FORMAT, bytes(self.counts))
+        return list(values[:self.SLOTS]), list(values[self.SLOTS:])
+
     def initialize_matrix(self):
-        '''Initializes the uptime matrix with zeros.'''
-        self.matrix = {str(day): {str(hour): [0.0, 0] for hour in range(24)} for day in range(7)}
+        '''Initializes the uptime counts with zeros.'''
+        self.counts = empty_uptime_counts()
         self.initialized = True
         self.save()
 
-    def update_uptime(self, day: int, hour: int, is_online: bool):
-        '''Increments the uptime for a specific day and hour.'''
-        if not self.initialized:
-            self.initialize_matrix()
-
-        if str(day) in self.matrix and 0 <= hour < 24:
-            p_old, n = self.matrix[str(day)][str(hour)]
-            p_new = (p_old * n + int(is_online)) / (n + 1)
-            self.matrix[str(day)][str(hour)][0] = p_new
-            self.matrix[str(day)][str(hour)][1] += 1
-            self.save()
-        else:
+    def add_check(self, day: int, hour: int, is_online: bool):
+        '''Counts an online check for a specific day and hour without saving it,
+        see update_uptime() and bulk_update().'''
+        if not (0 <= day < 7 and 0 <= hour < 24):
             raise ValueError("Invalid day or hour for uptime matrix.")
 
+        if not self.initialized:
+            self.counts = empty_uptime_counts()
+            self.initialized = True
+        online, total = self.get_counts()
+        online[day * 24 + hour] += int(is_online)
+        total[day * 24 + hour] += 1
+        self.counts = struct.pack(self.COUNTS_FORMAT, *online, *total)
+        self.last_updated = timezone.now()
+
+    def update_uptime(self, day: int, hour: int, is_online: bool):
+        '''Counts an online check for a specific day and hour. Only the counts are
+        written, with a single UPDATE of this row.'''
+        self.add_check(day, hour, is_online)
+        ServerUptimeStatistic.objects.filter(pk=self.pk).update(
+            counts=self.counts, initialized=True, last_updated=self.last_updated)
+
+    def get_estimated_counts(self):
+        '''Returns the online and total counts weighted by the estimator. The sliding
+        window and the exponential decay are computed from the hourly uptime rollups
+        when read, so changing them does not touch the stored counts.'''
+        from .helpers.uptime import uptime_matrix_counts
+
+        now = timezone.now()
+        if self.estimator == 'window':
+            return uptime_matrix_counts(self.server, now=now,
+                                        since=now - timezone.timedelta(days=self.window_days))
+        if self.estimator == 'decay':
+            return uptime_matrix_counts(self.server, now=now,
+                                        half_life=timezone.timedelta(days=self.half_life_days))
+        return self.get_counts()
+
+    def estimator_description(self):
+        '''Returns a short description of the estimator.'''
+        if self.estimator == 'window':
+            days = min(self.window_days, uptime_hour_retention_days())
+            if days < self.window_days:
+                return f"Sliding window of {days} days (capped to the hour bucket retention)"
+            return f"Sliding window of {days} days"
+        if self.estimator == 'decay':
+            return f"Exponential decay, half-life {self.half_life_days:g} days"
+        return "Cumulative"
+
     def get_probability_matrix(self):
         '''Returns the probability matrix as a 7x24 list.'''
         DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        return [(DAY_NAMES[day], [(hour, self.matrix[str(day)][str(hour)][0]) for hour in range(24)]) for day in range(7)]
+        online, total = self.get_estimated_counts()
+        return [(DAY_NAMES[day], [(hour, online[day * 24 + hour] / total[day * 24 + hour]
+                                   if total[day * 24 + hour] else 0.0)
+                                  for hour in range(24)]) for day in range(7)]
+
+    def set_counts(self, online, total):
+        '''Replaces the counts with two lists of 168 integers, without saving.'''
+        self.counts = struct.pack(self.COUNTS_FORMAT, *online, *total)
+        self.initialized = True
+
+class UptimeSample(models.Model):
+    '''Model representing a single probe result of a server or a service. Rows are
+    only appended by the status poller and removed once they are older than the
+    sample retention, by then they are rolled up into UptimeRollup rows.'''
+    server = models.ForeignKey('Server', on_delete=models.CASCADE, null=True, blank=True,
+                               related_name='uptime_samples')
+    service = models.ForeignKey('Service', on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='uptime_samples')
+    timestamp = models.DateTimeField(db_index=True)
+    online = models.BooleanField()
+    rtt = models.FloatField(null=True, blank=True, help_text='Connect or echo time in ms')
+    ttfb = models.FloatField(null=True, blank=True, help_text='HTTP time to first byte in ms')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['server', 'timestamp']),
+            models.Index(fields=['service', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.server or self.service} {'online' if self.online else 'offline'} " \
+               f"at {self.timestamp}"
+
+class UptimeRollup(models.Model):
+    '''Model representing the number of online and total probes of a server or a
+    service in one minute, hour or day bucket (UTC). Minute buckets are built from
+    the samples, hour buckets from minute buckets and day buckets from hour buckets.'''
+    LEVEL_CHOICES = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+    LEVEL_DURATIONS = {
+        'minute': timezone.timedelta(minutes=1),
+        'hour': timezone.timedelta(hours=1),
+        'day': timezone.timedelta(days=1),
+    }
+
+    server = models.ForeignKey('Server', on_delete=models.CASCADE, null=True, blank=True,
+                               related_name='uptime_rollups')
+    service = models.ForeignKey('Service', on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='uptime_rollups')
+    level = models.CharField(max_length=6, choices=LEVEL_CHOICES)
+    bucket = models.DateTimeField(help_text='Start of the bucket')
+    online = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['level', 'server', 'bucket']),
+            models.Index(fields=['level', 'service', 'bucket']),
+            models.Index(fields=['level', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.server or self.service} {self.level} {self.bucket}: " \
+               f"{self.online}/{self.total}"
+
+class StatusTransition(models.Model):
+    '''Model representing a change of the online state of a server or a service,
+    written by the status poller. One row per change instead of one per probe.
+    A state of None means unknown, e.g. a service that could not be probed.'''
+    server = models.ForeignKey('Server', on_delete=models.CASCADE, null=True, blank=True,
+                               related_name='status_transitions')
+    service = models.ForeignKey('Service', on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='status_transitions')
+    old_state = models.BooleanField(null=True)
+    new_state = models.BooleanField(null=True)
+    timestamp = models.DateTimeField(db_index=True)
+    latency = models.FloatField(null=True, blank=True,
+                                help_text='Connect or echo time in ms of the probe')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['server', '-timestamp']),
+            models.Index(fields=['service', '-timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.server or self.service}: {self.state_label(self.old_state)} -> " \
+               f"{self.state_label(self.new_state)} at {self.timestamp}"
+
+    @staticmethod
+    def state_label(state):
+        '''Returns 'online', 'offline' or 'unknown'.'''
+        if state is None:
+            return 'unknown'
+        return 'online' if state else 'offline'
+
+    def target(self):
+        '''Returns the server or service of the transition.'''
+        return self.server or self.service
+
+def empty_latency_counts():
+    '''Returns the counts of an empty LatencyHistogram.'''
+    return bytes(4 * (len(LatencyHistogram.EDGES) + 1))
+
+class LatencyHistogram(models.Model):
+    '''Model representing the connect times or HTTP times to first byte of a server
+    or a service in one hour (UTC), built from the uptime samples. counts holds the
+    number of probes per latency bucket as unsigned 32 bit integers: bucket i counts
+    latencies up to EDGES[i] ms, the last bucket everything above EDGES[-1] ms.'''
+    EDGES = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+    COUNTS_FORMAT = f'<{len(EDGES) + 1}I'
+    METRIC_CHOICES = [
+        ('connect', 'Connect time'),
+        ('ttfb', 'Time to first byte'),
+    ]
+
+    server = models.ForeignKey('Server', on_delete=models.CASCADE, null=True, blank=True,
+                               related_name='latency_histograms')
+    service = models.ForeignKey('Service', on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='latency_histograms')
+    metric = models.CharField(max_length=7, choices=METRIC_CHOICES)
+    bucket = models.DateTimeField(help_text='Start of the hour')
+    counts = models.BinaryField(default=empty_latency_counts)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['server', 'bucket']),
+            models.Index(fields=['service', 'bucket']),
+            models.Index(fields=['bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.server or self.service} {self.metric} {self.bucket}"
+
+    def get_counts(self):
+        '''Returns the counts as a list of integers, one per latency bucket.'''
+        return list(struct.unpack(self.COUNTS_FORMAT, bytes(self.counts)))
 
 class AppState(models.Model):
     '''Singleton model representing the state of the application.'''
     last_cron = models.DateTimeField(blank=True, null=True)
+    last_cron_duration = models.FloatField(blank=True, null=True,
+                                           help_text='Seconds the last uptime statistics pass took')
+    last_cron_servers = models.IntegerField(blank=True, null=True,
+                                            help_text='Servers updated by the last pass')
+    last_cron_queries = models.IntegerField(blank=True, null=True,
+                                            help_text='Database queries of the last pass')
+    last_uptime_rollup = models.DateTimeField(blank=True, null=True,
+                                              help_text='Time of the last uptime rollup')
     last_exceptipon = models.DateTimeField(blank=True, null=True)
     exception = models.TextField(default='',)
 
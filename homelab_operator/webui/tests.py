@@ -1,3 +1,1323 @@
-from django.test import TestCase
+import json
+import time
+import importlib
+import socket
+import struct
+import tempfile
+import threading
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+import requests
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.cache import caches
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import AppState, DiscoveryJob, Homelab, Network, Server, ServerUptimeStatistic, \
+    Service, HostObservation, LatencyHistogram, StatusTransition, UptimeRollup, UptimeSample, \
+    UserProfile, WOLSchedule, validate_subnets
+from .helpers.helpers import process_schedules, update_uptime_statistics
+from .helpers import analytics, auto_discover, discovery_jobs, neighbors, ping, poller, probe, \
+    resolver, uptime
+from .helpers.discovery_jobs import known_hosts, with_last_seen
+from .helpers.heatmap import heatmap_version
+from .helpers.uptime import uptime_matrix_counts
+from .views_exp import status
+
+
+def listening_port(backlog=8):
+    '''Opens a TCP listener on localhost. Returns (socket, port).'''
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(backlog)
+    return sock, sock.getsockname()[1]
+
+def closed_port():
+    '''Returns a localhost port nothing listens on.'''
+    sock, port = listening_port()
+    sock.close()
+    return port
+
+def stalled_port():
+    '''Opens a listener whose accept queue is full, connections to it time out.
+    Returns (sockets to close, port).'''
+    sock, port = listening_port(backlog=0)
+    clients = []
+    for _ in range(3):
+        client = socket.socket()
+        client.setblocking(False)
+        client.connect_ex(('127.0.0.1', port))
+        clients.append(client)
+    time.sleep(0.1)
+    return [sock, *clients], port
+
+
+class WOLScheduleTests(TestCase):
+    '''Tests for the execution of WOL schedules.'''
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='password')
+        self.server = Server.objects.create(name='server', user=self.user, auto_wake=True,
+                                            mac_address='00:11:22:33:44:55')
+        self.schedule = WOLSchedule.objects.create(
+            server=self.server, user=self.user, type='WAKE', repeat=True, repeat_type='daily',
+            schedule_time=timezone.now() - timezone.timedelta(days=7, minutes=1))
+
+    @mock.patch.object(Server, 'wake', return_value=False)
+    def test_run_save_run_executes_once(self, wake):
+        '''Saving a schedule right after its run must not queue the run again.'''
+        process_schedules()
+        self.assertEqual(wake.call_count, 1)
+
+        schedule = WOLSchedule.objects.get(pk=self.schedule.pk)
+        schedule.note = 'edited'
+        schedule.save()
+        process_schedules()
+        self.assertEqual(wake.call_count, 1)
+        schedule.refresh_from_db()
+        self.assertGreater(schedule.next_run_at, timezone.now())
+
+    @mock.patch.object(Server, 'wake', return_value=False)
+    def test_changed_timing_recomputes_next_run(self, wake):
+        '''Changing the schedule time recomputes the next run.'''
+        process_schedules()
+        schedule = WOLSchedule.objects.get(pk=self.schedule.pk)
+        schedule.schedule_time = timezone.now() + timezone.timedelta(hours=1)
+        schedule.save()
+        self.assertEqual(schedule.next_run_at, schedule.schedule_time)
+        self.assertEqual(wake.call_count, 1)
+
+    @mock.patch.object(Server, 'wake', return_value=False)
+    def test_run_between_two_ticks_is_executed(self, wake):
+        '''A run between two cron ticks, more than WINDOW away from both, is
+        executed late by the second tick.'''
+        base = timezone.now().replace(second=0, microsecond=0)
+        with mock.patch('django.utils.timezone.now',
+                        return_value=base - timezone.timedelta(minutes=1)):
+            schedule = WOLSchedule.objects.create(
+                server=self.server, user=self.user, type='WAKE', repeat=False,
+                schedule_time=base + timezone.timedelta(minutes=5, seconds=2))
+        with mock.patch('django.utils.timezone.now',
+                        return_value=base + timezone.timedelta(seconds=1)):
+            process_schedules()
+        self.assertEqual(wake.call_count, 1)  # Only the daily schedule of setUp
+
+        with mock.patch('django.utils.timezone.now',
+                        return_value=base + timezone.timedelta(minutes=10, seconds=3)):
+            process_schedules()
+        self.assertEqual(wake.call_count, 2)
+        schedule.refresh_from_db()
+        self.assertIsNone(schedule.next_run_at)
+        self.assertIn('WAKE: Magic packet sent', schedule.logs)
+
+    @mock.patch.object(Server, 'wake', return_value=False)
+    def test_run_missed_by_more_than_a_tick_is_skipped(self, wake):
+        '''A run more than LATE_WINDOW overdue is logged as missed, not executed.'''
+        process_schedules()
+        schedule = WOLSchedule.objects.create(
+            server=self.server, user=self.user, type='WAKE', repeat=False,
+            schedule_time=timezone.now() + timezone.timedelta(hours=1))
+        WOLSchedule.objects.filter(pk=schedule.pk).update(
+            next_run_at=timezone.now() - WOLSchedule.LATE_WINDOW - timezone.timedelta(minutes=1))
+        process_schedules()
+        self.assertEqual(wake.call_count, 1)
+        schedule.refresh_from_db()
+        self.assertIn('Missed run', schedule.logs)
+
+
+class UptimeStatisticTests(TestCase):
+    '''Tests for the uptime statistics and their estimators.'''
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='password')
+        self.server = Server.objects.create(name='server', user=self.user)
+        # Monday 10:00 UTC, one hour bucket with 45 of 60 probes online
+        self.bucket = timezone.datetime(2026, 10, 12, 10, tzinfo=timezone.timezone.utc)
+        UptimeRollup.objects.create(server=self.server, level='hour', bucket=self.bucket,
+                                    online=45, total=60)
+        AppState.ensure_exists()
+        AppState.objects.update(last_uptime_rollup=self.bucket + timezone.timedelta(hours=2))
+        self.now = self.bucket + timezone.timedelta(hours=3)
+
+    def test_matrix_counts_probes(self):
+        '''Without checks_per_bucket the probes of the buckets are counted.'''
+        online, total = uptime_matrix_counts(self.server, now=self.now)
+        self.assertEqual((online[10], total[10]), (45, 60))
+        self.assertEqual(sum(total), 60)
+
+    def test_matrix_counts_checks_per_bucket(self):
+        '''With checks_per_bucket a bucket counts as that many checks, split by its
+        share of online probes.'''
+        online, total = uptime_matrix_counts(self.server, now=self.now, checks_per_bucket=6)
+        self.assertEqual((online[10], total[10]), (4.5, 6))
+
+    def test_estimators(self):
+        '''The sliding window only counts recent buckets, the exponential decay weighs
+        every bucket by its age and the cumulative counts are read as stored.'''
+        UptimeRollup.objects.create(server=self.server, level='hour', online=0, total=60,
+                                    bucket=self.bucket - timezone.timedelta(days=7))
+        statistic = ServerUptimeStatistic.objects.create(server=self.server, window_days=7,
+                                                         half_life_days=7)
+        statistic.add_check(0, 10, True)
+        results = {}
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            for estimator in ('cumulative', 'window', 'decay'):
+                statistic.estimator = estimator
+                online, total = statistic.get_estimated_counts()
+                results[estimator] = (online[10], total[10])
+            statistic.window_days = 28
+            statistic.estimator = 'window'
+            results['long window'] = tuple(counts[10]
+                                           for counts in statistic.get_estimated_counts())
+        self.assertEqual(results['cumulative'], (1, 1))
+        self.assertEqual(results['window'], (45, 60))
+        self.assertEqual(results['long window'], (45, 120))
+        recent, old = 0.5 ** (3 / 168), 0.5 ** (171 / 168)
+        self.assertAlmostEqual(results['decay'][0], 45 * recent)
+        self.assertAlmostEqual(results['decay'][1], 60 * (recent + old))
+
+    def test_window_is_limited_to_the_hour_retention(self):
+        '''The sliding window cannot be longer than the hour buckets are kept.'''
+        statistic = ServerUptimeStatistic(server=self.server, estimator='window',
+                                          window_days=uptime.UPTIME_HOUR_RETENTION_DAYS + 1)
+        with self.assertRaises(ValidationError):
+            statistic.full_clean()
+        self.assertIn('capped', statistic.estimator_description())
+
+    def test_update_uptime_counts_checks(self):
+        '''Checks are counted in the slot of their day and hour with one UPDATE.'''
+        statistic = ServerUptimeStatistic.objects.create(server=self.server)
+        with self.assertNumQueries(1):
+            statistic.update_uptime(2, 5, True)
+        statistic.update_uptime(2, 5, False)
+        statistic.add_check(6, 23, True)
+        online, total = ServerUptimeStatistic.objects.get(id=statistic.id).get_counts()
+        self.assertEqual((online[2 * 24 + 5], total[2 * 24 + 5]), (1, 2))
+        self.assertEqual((sum(online), sum(total)), (1, 2))
+        self.assertEqual(len(statistic.counts), 2 * 168 * 4)
+        self.assertEqual(statistic.get_counts()[1][6 * 24 + 23], 1)
+        with self.assertRaises(ValueError):
+            statistic.add_check(7, 0, True)
+
+    def test_update_uptime_statistics_is_batched(self):
+        '''A cron pass costs the same number of queries for any number of servers.'''
+        def add_servers(count):
+            for _ in range(count):
+                server = Server.objects.create(name='server', ip_address='10.0.0.1')
+                ServerUptimeStatistic.objects.create(server=server)
+
+        def probe_servers(servers, **kwargs):
+            return {server.id: server.id % 2 == 0 for server in servers}
+
+        results = []
+        with mock.patch('webui.helpers.helpers.probe_servers',
+                        side_effect=probe_servers) as probe, \
+                mock.patch('django.utils.timezone.now', return_value=self.now):
+            for count in (5, 10):
+                first = set(ServerUptimeStatistic.objects.values_list('id', flat=True))
+                add_servers(count)
+                results.append(update_uptime_statistics())
+        self.assertEqual([result['servers'] for result in results], [5, 15])
+        self.assertEqual(results[0]['queries'], results[1]['queries'])
+        self.assertFalse(probe.call_args.kwargs['use_cache'])
+        slot = self.now.weekday() * 24 + self.now.hour
+        for statistic in ServerUptimeStatistic.objects.all():
+            online, total = statistic.get_counts()
+            self.assertEqual(total[slot], 2 if statistic.id in first else 1)
+            self.assertEqual(sum(total), total[slot])
+
+    def test_matrix_migration_converts_to_counts(self):
+        '''The JSON matrix of ratios is converted to counts and back.'''
+        migration = importlib.import_module('webui.migrations.0047_uptime_counts')
+        statistic = mock.Mock(matrix={'0': {'0': [0.5, 10], '23': [1.0, 3]},
+                                       '6': {'23': ['bad', 4]}})
+        apps = mock.Mock()
+        apps.get_model.return_value.objects.all.return_value = [statistic]
+        migration.matrix_to_counts(apps, None)
+        values = struct.unpack(migration.COUNTS_FORMAT, statistic.counts)
+        online, total = values[:168], values[168:]
+        self.assertEqual((online[0], total[0], online[23], total[23]), (5, 10, 3, 3))
+        self.assertEqual((sum(online), sum(total)), (8, 13))
+
+        migration.counts_to_matrix(apps, None)
+        self.assertEqual(statistic.matrix['0']['0'], [0.5, 10])
+        self.assertEqual(statistic.matrix['6']['23'], [0.0, 0])
+
+    @override_settings(CRON_INTERVAL_MINUTES=10)
+    def test_create_seeds_checks_of_the_cron_interval(self):
+        '''A new statistic is seeded with as many checks per hour as the cron adds.'''
+        self.client.force_login(self.user)
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            self.client.get(f'/create/uptime_statistic/{self.server.id}/')
+        online, total = ServerUptimeStatistic.objects.get(server=self.server).get_counts()
+        self.assertEqual((online[10], total[10]), (4, 6))
+
+
+class ResolverTests(TestCase):
+    '''Tests for the cached reverse DNS lookups.'''
+
+    def setUp(self):
+        resolver.MEMORY_CACHE.clear()
+        caches['status'].clear()
+
+    @staticmethod
+    def lookup(ip):
+        '''Fake PTR lookup, 10.0.0.9 is slow and 10.0.0.5 has no record.'''
+        if ip == '10.0.0.9':
+            time.sleep(0.3)
+        return None if ip == '10.0.0.5' else f'host-{ip}'
+
+    def test_results_are_cached(self):
+        '''Hostnames and missing records are cached, the second call does not look up.'''
+        with mock.patch.object(resolver, 'lookup_hostname', side_effect=self.lookup) as lookup:
+            first = resolver.resolve_hostnames(['10.0.0.1', '10.0.0.5'])
+            second = resolver.resolve_hostnames(['10.0.0.1', '10.0.0.5'])
+        self.assertEqual(first, {'10.0.0.1': 'host-10.0.0.1', '10.0.0.5': None})
+        self.assertEqual(second, first)
+        self.assertEqual(lookup.call_count, 2)
+        resolver.MEMORY_CACHE.clear()
+        self.assertEqual(resolver.cached_hostnames(['10.0.0.1', '10.0.0.5']), first)
+
+    def test_slow_lookup_does_not_block_later_batches(self):
+        '''A timed out lookup is not cached and does not starve the next batches.'''
+        with mock.patch.object(resolver, 'lookup_hostname', side_effect=self.lookup):
+            results = resolver.resolve_hostnames(['10.0.0.9', '10.0.0.1', '10.0.0.2'],
+                                                 timeout=0.1, concurrency=1)
+            self.assertEqual(results, {'10.0.0.9': None, '10.0.0.1': 'host-10.0.0.1',
+                                       '10.0.0.2': 'host-10.0.0.2'})
+            self.assertNotIn('10.0.0.9', resolver.cached_hostnames(['10.0.0.9']))
+            time.sleep(0.4)
+        # The late result is remembered once the lookup finished
+        self.assertEqual(resolver.cached_hostnames(['10.0.0.9']), {'10.0.0.9': 'host-10.0.0.9'})
+
+
+class UptimeHeatmapTests(TestCase):
+    '''Tests for the uptime heatmap on the dashboard.'''
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='password')
+        UserProfile.objects.create(user=self.user)
+        self.homelab = Homelab.objects.create(name='homelab', user=self.user)
+        self.statistics = []
+        for index in range(3):
+            server = Server.objects.create(name=f'server{index}', user=self.user,
+                                           homelab=self.homelab)
+            statistic = ServerUptimeStatistic.objects.create(server=server, estimator='window')
+            statistic.add_check(0, 10, True)
+            statistic.save()
+            self.statistics.append(statistic)
+        AppState.ensure_exists()
+        self.client.force_login(self.user)
+
+    def test_version_changes_with_rollup_and_estimator(self):
+        '''Window and decay heatmaps change with the rollups, cumulative ones do not.'''
+        statistic = self.statistics[0]
+        version = heatmap_version(statistic)
+        AppState.objects.update(last_uptime_rollup=timezone.now())
+        self.assertNotEqual(heatmap_version(statistic), version)
+        statistic.window_days = 7
+        self.assertNotEqual(heatmap_version(statistic), version)
+
+        statistic.estimator = 'cumulative'
+        version = heatmap_version(statistic)
+        AppState.objects.update(last_uptime_rollup=timezone.now() + timezone.timedelta(hours=1))
+        self.assertEqual(heatmap_version(statistic), version)
+
+    def test_dashboard_reads_the_rollup_once(self):
+        '''The dashboard versions all heatmaps with the AppState of the context
+        processor, without a query per server.'''
+        rollup = timezone.now().replace(microsecond=0)
+        AppState.objects.update(last_uptime_rollup=rollup)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/dashboard/{self.homelab.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'-window-28-{rollup.timestamp():.0f}', count=3)
+        self.assertEqual(sum('webui_appstate' in query['sql']
+                             for query in queries.captured_queries), 1)
+
+    def test_matrix_is_copied_as_text(self):
+        '''The clipboard data keeps the format of the probability matrix.'''
+        response = self.client.get(f'/uptime_matrix/{self.statistics[0].server_id}/')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertEqual(response.content.decode(),
+                         str(self.statistics[0].get_probability_matrix()))
+
+
+class AutoDiscoverProgressTests(TestCase):
+    '''Tests for the progress log of the auto discovery.'''
+
+    HOSTNAME = '<img src=x onerror=alert(1)>'
+
+    def discover(self):
+        '''Runs discover_hosts() for one host with a hostile PTR record.'''
+        servers = []
+        with mock.patch.object(auto_discover, 'ping_sweep', return_value=[('10.0.0.1', True)]), \
+                mock.patch.object(auto_discover, 'read_neighbor_table', return_value={}), \
+                mock.patch.object(auto_discover, 'fingerprint_hosts',
+                                  return_value={'10.0.0.1': []}), \
+                mock.patch.object(auto_discover, 'resolve_hostnames',
+                                  return_value={'10.0.0.1': self.HOSTNAME}):
+            progress = ''.join(auto_discover.discover_hosts(['10.0.0.1'], {}, servers))
+        return progress, servers
+
+    def test_progress_is_plain_text(self):
+        '''Progress lines are plain text lines without markup.'''
+        progress, servers = self.discover()
+        self.assertNotIn('<br>', progress)
+        self.assertIn(f'- Hostname: {self.HOSTNAME}\n', progress)
+        self.assertEqual(servers[0]['hostname'], self.HOSTNAME)
+
+    def test_progress_page_escapes_the_log(self):
+        '''The progress page does not render markup from scanned hosts.'''
+        user = User.objects.create_superuser(username='admin', password='password')
+        network = Network.objects.create(name='lan', subnet='10.0.0.0/30', user=user)
+        DiscoveryJob.objects.create(task_id='job', network=network, user=user, status='RUNNING',
+                                    subnet=network.subnet, progress=self.discover()[0])
+        self.client.force_login(user)
+        response = self.client.get(f'/auto_discover/{network.id}/')
+        self.assertNotContains(response, self.HOSTNAME)
+        self.assertContains(response, '&lt;img src=x onerror=alert(1)&gt;')
+        self.assertNotContains(response, 'innerHTML')
+
+
+class LastSeenTests(TestCase):
+    '''Tests for the last seen time of servers.'''
+
+    def test_with_last_seen_annotates_the_latest_observation(self):
+        '''last_seen_at is the latest observation of the server's address in its network.'''
+        network = Network.objects.create(name='lan', subnet='10.0.0.0/24')
+        other = Network.objects.create(name='other', subnet='10.0.0.0/24')
+        server = Server.objects.create(name='server', ip_address='10.0.0.1', network=network)
+        unseen = Server.objects.create(name='unseen', ip_address='10.0.0.2', network=network)
+        now = timezone.now()
+        for seen_at, observed in ((now - timezone.timedelta(days=1), network), (now, network),
+                                  (now + timezone.timedelta(days=1), other)):
+            HostObservation.objects.create(network=observed, ip_address='10.0.0.1', seen_at=seen_at)
+
+        servers = {server.id: server for server in with_last_seen(Server.objects.all())}
+        self.assertEqual(servers[server.id].last_seen_at, now)
+        self.assertIsNone(servers[unseen.id].last_seen_at)
+
+
+class StatusTests(TestCase):
+    '''Tests for the batch status API.'''
+
+    def setUp(self):
+        self.homelab = Homelab.objects.create(name='homelab')
+        self.online = Server.objects.create(name='online', homelab=self.homelab, online=True,
+                                            last_checked=timezone.now(), latency=1.5)
+        self.offline = Server.objects.create(name='offline', homelab=self.homelab, online=False,
+                                             last_checked=timezone.now())
+
+    def test_status_reads_the_polled_state(self):
+        '''Polled servers are reported from their stored state without probing.'''
+        with mock.patch('webui.helpers.poller.probe_status',
+                        return_value={'servers': {}, 'services': {}}) as probe_status:
+            response = self.client.get(f'/status/DEFAULT_API_KEY/{self.homelab.id}/')
+        self.assertEqual(response.status_code, 200)
+        status = response.json()
+        self.assertEqual(status['servers'], {str(self.online.id): True,
+                                             str(self.offline.id): False})
+        self.assertEqual(status['latency']['servers'][str(self.online.id)], 1.5)
+        self.assertEqual(probe_status.call_args.kwargs, {'servers': [], 'services': []})
+
+    def test_status_of_several_homelabs(self):
+        '''Several comma separated homelabs are answered together, services without
+        endpoint report an error message, malformed ids are rejected.'''
+        other = Homelab.objects.create(name='other')
+        server = Server.objects.create(name='other', homelab=other, online=True,
+                                       last_checked=timezone.now())
+        service = Service.objects.create(name='service', server=server)
+        status = self.client.get(f'/status/DEFAULT_API_KEY/{self.homelab.id},{other.id}/').json()
+        self.assertEqual(set(status['servers']),
+                         {str(self.online.id), str(self.offline.id), str(server.id)})
+        self.assertEqual(status['services'], {str(service.id): 'No endpoint provided.'})
+        self.assertEqual(self.client.get('/status/DEFAULT_API_KEY/1,x/').status_code, 400)
+
+    def test_status_rejects_a_wrong_api_key(self):
+        '''The status API requires the API key.'''
+        response = self.client.get(f'/status/wrong/{self.homelab.id}/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_status_stream_sends_changes(self):
+        '''The first event carries the full state, later events only the changes and
+        keep-alive comments are sent while nothing changes.'''
+        clock = [0]
+        with mock.patch.object(status.time, 'monotonic', side_effect=lambda: clock[0]), \
+                mock.patch.object(status.time, 'sleep',
+                                  side_effect=lambda seconds: clock.append(clock.pop() + seconds)):
+            events = status.status_event_stream([self.homelab.id])
+            self.assertEqual(next(events), 'retry: 2000\n\n')
+            self.assertEqual(json.loads(next(events).removeprefix('data: ')), {
+                'servers': {str(self.online.id): True, str(self.offline.id): False},
+                'services': {},
+            })
+            Server.objects.filter(id=self.offline.id).update(online=True)
+            self.assertEqual(json.loads(next(events).removeprefix('data: ')),
+                             {'servers': {str(self.offline.id): True}, 'services': {}})
+            self.assertEqual(next(events), ': keep-alive\n\n')
+            self.assertEqual(clock[0], 2 + status.STATUS_STREAM_HEARTBEAT + 1)
+            self.assertEqual(set(events), {': keep-alive\n\n'})
+            self.assertGreaterEqual(clock[0], status.STATUS_STREAM_DURATION)
+
+    def test_status_stream_response(self):
+        '''The stream is an unbuffered text/event-stream response.'''
+        response = self.client.get(f'/status_stream/DEFAULT_API_KEY/{self.homelab.id}/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+        self.assertEqual(self.client.get('/status_stream/wrong/1/').status_code, 403)
+
+
+class ServiceFingerprintTests(TestCase):
+    '''Tests for the service detection of the auto discovery.'''
+
+    def test_match_service_name(self):
+        '''Known products are named after their signature, others after the title.'''
+        self.assertEqual(auto_discover.match_service_name('Login - OPNsense'), 'OPNsense Firewall')
+        self.assertEqual(auto_discover.match_service_name(' My Wiki '), 'My Wiki')
+        self.assertEqual(auto_discover.match_service_name(None), 'Unknown')
+
+    def test_extract_title(self):
+        '''Titles are read from text or bytes, entities are unescaped.'''
+        self.assertEqual(auto_discover.extract_title(
+            b'<html><TITLE lang="en">\n Tom &amp; Jerry </title ></html>'), 'Tom & Jerry')
+        self.assertEqual(auto_discover.extract_title('<title>Gr\u00fc\u00dfe</title>'),
+                         'Gr\u00fc\u00dfe')
+        self.assertIsNone(auto_discover.extract_title('<html><body>No title</body></html>'))
+
+    def test_fetch_title_stops_reading_after_the_title(self):
+        '''The page is streamed and the download stops once </title> was received.'''
+        chunks = [b'<html><head><title>Home', b' Assistant</ti', b'tle></head>', b'<body>']
+        read = []
+
+        def iter_content(chunk_size):
+            for chunk in chunks:
+                read.append(chunk)
+                yield chunk
+
+        response = mock.MagicMock()
+        response.__enter__.return_value.iter_content.side_effect = iter_content
+        with mock.patch.object(auto_discover.requests, 'get', return_value=response) as get:
+            self.assertEqual(auto_discover.fetch_title('http://10.0.0.1'), 'Home Assistant')
+        self.assertTrue(get.call_args.kwargs['stream'])
+        self.assertEqual(read, chunks[:3])
+
+    def test_open_web_port_is_reported_if_the_fetch_fails(self):
+        '''An open HTTP port whose page cannot be fetched is kept as unknown service.'''
+        with mock.patch.object(auto_discover, 'probe_targets',
+                               side_effect=lambda targets, **kwargs: {
+                                   target: target[1] == 80 for target in targets}), \
+                mock.patch.object(auto_discover, 'fetch_title',
+                                  side_effect=requests.ConnectionError), \
+                mock.patch.object(auto_discover, 'check_dns', return_value=[]):
+            services = auto_discover.fingerprint_hosts(['10.0.0.1'])
+        self.assertEqual(services['10.0.0.1'], [{
+            'name': 'Unknown Service (Port 80)',
+            'endpoint': '10.0.0.1',
+            'port': 80,
+            'url': 'http://10.0.0.1',
+        }])
+
+    def test_web_service_is_named_after_its_title(self):
+        '''A fetched page names the service.'''
+        with mock.patch.object(auto_discover, 'fetch_title',
+                               return_value='Proxmox Virtual Environment'):
+            service = auto_discover.check_http('10.0.0.1', 8006, 'https')
+        self.assertEqual(service['url'], 'https://10.0.0.1:8006')
+        self.assertNotIn('Unknown', service['name'])
+
+
+class ProbeTests(SimpleTestCase):
+    '''Tests for the concurrent probe engine.'''
+
+    def setUp(self):
+        self.listener, self.open_port = listening_port()
+        self.addCleanup(self.listener.close)
+
+    def test_probe_targets_reports_open_and_closed_ports(self):
+        '''Open ports are online, closed ports and targets without host are offline.'''
+        closed = closed_port()
+        rtts = {}
+        results = probe.probe_targets([('127.0.0.1', self.open_port), ('127.0.0.1', closed),
+                                       ('127.0.0.1', self.open_port), (None, 80)], rtts=rtts)
+        self.assertEqual(results, {('127.0.0.1', self.open_port): True,
+                                   ('127.0.0.1', closed): False, (None, 80): False})
+        self.assertEqual(list(rtts), [('127.0.0.1', self.open_port)])
+
+    def test_probe_targets_runs_concurrently(self):
+        '''Many unresponsive targets cost about one timeout, not one per target.'''
+        targets = []
+        for _ in range(5):
+            sockets, port = stalled_port()
+            self.addCleanup(lambda sockets=sockets: [sock.close() for sock in sockets])
+            targets.append(('127.0.0.1', port))
+        start = time.monotonic()
+        results = probe.probe_targets(targets, timeout=0.3)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(set(results.values()), {False})
+
+    def test_probe_status_batches_servers_and_services(self):
+        '''Servers and services are probed in one batch, services without endpoint
+        get an error message.'''
+        server = Server(id=1, name='server', ip_address='127.0.0.1', port=self.open_port)
+        services = [Service(id=2, name='up', server=server, endpoint='127.0.0.1',
+                            port=self.open_port),
+                    Service(id=3, name='down', server=server, endpoint='127.0.0.1',
+                            port=closed_port()),
+                    Service(id=4, name='none', server=server)]
+        with mock.patch.object(probe, 'probe_targets', wraps=probe.probe_targets) as targets:
+            status = probe.probe_status([server], services, use_cache=False)
+        self.assertEqual(targets.call_count, 1)
+        self.assertEqual(status, {'servers': {1: True},
+                                  'services': {2: True, 3: False, 4: 'No endpoint provided.'}})
+
+
+class ProbeCacheTests(TestCase):
+    '''Tests for the probe results shared by all workers through the status cache.'''
+
+    TARGET = ('10.0.0.1', 80)
+
+    def setUp(self):
+        caches['status'].clear()
+
+    def test_results_are_served_from_the_cache(self):
+        '''Online results are probed once per ttl, offline ones per negative_ttl.'''
+        offline = ('10.0.0.2', 80)
+        def probe_targets(targets, **kwargs):
+            return {target: target == self.TARGET for target in targets}
+
+        with mock.patch.object(probe, 'probe_targets', side_effect=probe_targets) as probe_targets:
+            first = probe.cached_probe_targets([self.TARGET, offline], negative_ttl=0)
+            second = probe.cached_probe_targets([self.TARGET, offline], negative_ttl=0)
+        self.assertEqual(first, {self.TARGET: True, offline: False})
+        self.assertEqual(second, first)
+        probed = [call.args[0] for call in probe_targets.call_args_list if call.args[0]]
+        self.assertEqual(probed, [[self.TARGET, offline], [offline]])
+
+    def test_waits_for_the_probe_of_another_worker(self):
+        '''A target locked by another worker is not probed again, its result is awaited.'''
+        key = probe.probe_cache_key(*self.TARGET)
+        caches['status'].add(f'{key}:lock', True)
+        with mock.patch.object(probe, 'probe_targets', return_value={}) as probe_targets, \
+                mock.patch.object(probe.time, 'sleep',
+                                  side_effect=lambda seconds: caches['status'].set(key, True)):
+            results = probe.cached_probe_targets([self.TARGET])
+        self.assertEqual(results, {self.TARGET: True})
+        self.assertFalse(any(call.args[0] for call in probe_targets.call_args_list))
+
+    def test_probes_itself_if_the_other_worker_does_not_answer(self):
+        '''If the lock holder does not store a result in time, the target is probed.'''
+        caches['status'].add(f'{probe.probe_cache_key(*self.TARGET)}:lock', True)
+        with mock.patch.object(probe, 'probe_targets',
+                               side_effect=lambda targets, **kwargs: {
+                                   target: False for target in targets}) as probe_targets:
+            results = probe.cached_probe_targets([self.TARGET], timeout=0.1)
+        self.assertEqual(results, {self.TARGET: False})
+        self.assertEqual(probe_targets.call_args_list[-1].args[0], [self.TARGET])
+
+
+class PollerTests(TestCase):
+    '''Tests for the background status poller and the last known state it stores.'''
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.due = Server.objects.create(name='due', ip_address='10.0.0.1', check_interval=30)
+        self.pending = Server.objects.create(name='pending', ip_address='10.0.0.2', online=False,
+                                             last_checked=self.now,
+                                             next_check=self.now + timezone.timedelta(seconds=20))
+
+    def probe_status(self, servers=(), services=(), use_cache=True, rtts=None):
+        if rtts is not None:
+            rtts.update({server.probe_target(): 0.005 for server in servers})
+        return {'servers': {server.id: True for server in servers},
+                'services': {service.id: True for service in services}}
+
+    @mock.patch.object(poller, 'resolve_hostnames')
+    @mock.patch.object(poller, 'probe_ttfbs', return_value={})
+    def test_poll_due_targets(self, probe_ttfbs, resolve_hostnames):
+        '''Only due targets are probed, their state and next check are stored.'''
+        with mock.patch.object(poller, 'probe_status', side_effect=self.probe_status) as status:
+            self.assertEqual(poller.poll_due_targets(self.now), 1)
+        self.assertEqual(status.call_args.kwargs['servers'], [self.due])
+        self.due.refresh_from_db()
+        self.assertIs(self.due.online, True)
+        self.assertAlmostEqual(self.due.latency, 5)
+        self.assertEqual(self.due.last_checked, self.now)
+        self.assertEqual(self.due.next_check, self.now + timezone.timedelta(seconds=30))
+        self.pending.refresh_from_db()
+        self.assertIs(self.pending.online, False)
+
+        with mock.patch.object(poller, 'probe_status') as status:
+            self.assertEqual(poller.poll_due_targets(self.now), 0)
+        status.assert_not_called()
+
+    def test_seconds_until_next_check(self):
+        '''The poller sleeps until the next target is due, at most `maximum` seconds.'''
+        self.assertEqual(poller.seconds_until_next_check(self.now), 20)
+        self.assertEqual(poller.seconds_until_next_check(self.now, maximum=10), 10)
+        self.assertEqual(poller.seconds_until_next_check(
+            self.now + timezone.timedelta(minutes=1)), 0)
+        Server.objects.update(next_check=None)
+        self.assertEqual(poller.seconds_until_next_check(self.now), 60)
+
+    def test_get_status_probes_only_unchecked_targets(self):
+        '''Polled targets report their stored state, never polled ones are probed.'''
+        with mock.patch.object(poller, 'probe_status', side_effect=self.probe_status) as status:
+            result = poller.get_status([self.due, self.pending], [])
+        self.assertEqual(status.call_args.kwargs['servers'], [self.due])
+        self.assertEqual(result['servers'], {self.due.id: True, self.pending.id: False})
+        self.assertEqual(result['last_checked']['servers'],
+                         {self.pending.id: self.now.isoformat()})
+
+
+class PingTests(SimpleTestCase):
+    '''Tests for the discovery liveness sweep.'''
+
+    def test_ping_sweep_runs_in_parallel(self):
+        '''At most `concurrency` hosts are checked at once, results keep the host order.'''
+        hosts = [f'10.0.0.{index}' for index in range(1, 9)]
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def tcp_alive(ip, timeout=1):
+            with lock:
+                running.append(ip)
+                peak.append(len(running))
+            time.sleep(0.2 if ip.endswith('.1') else 0.1)
+            with lock:
+                running.remove(ip)
+            return ip.endswith(('1', '3'))
+
+        start = time.monotonic()
+        with mock.patch.object(ping, 'icmp_available', return_value=False), \
+                mock.patch.object(ping, 'tcp_alive', side_effect=tcp_alive):
+            results = list(auto_discover.ping_sweep(hosts, concurrency=4, rate=0,
+                                                    adaptive=False))
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertEqual(max(peak), 4)
+        self.assertEqual(results, [(ip, ip.endswith(('1', '3'))) for ip in hosts])
+
+    def test_echo_request_and_reply(self):
+        '''Echo requests carry a valid checksum, replies are parsed with and without
+        the IP header of raw sockets, other ICMP messages are ignored.'''
+        request = ping.build_echo_request(0x1234, 7)
+        self.assertEqual(ping.icmp_checksum(request), 0)
+        reply = bytes([ping.ICMP_ECHO_REPLY]) + request[1:]
+        ip_header = bytes([0x45]) + bytes(19)
+        self.assertEqual(ping.parse_echo_reply(reply, is_raw=False), (0x1234, 7))
+        self.assertEqual(ping.parse_echo_reply(ip_header + reply, is_raw=True), (0x1234, 7))
+        self.assertIsNone(ping.parse_echo_reply(request, is_raw=False))
+        self.assertIsNone(ping.parse_echo_reply(struct.pack('!BBH', 0, 0, 0), is_raw=False))
+
+    @skipUnless(ping.icmp_available(), 'No ICMP socket available')
+    def test_icmp_sweep_pings_localhost(self):
+        '''The loopback address answers echo requests.'''
+        rtts = {}
+        self.assertEqual(list(ping.icmp_sweep(['127.0.0.1'], rtts=rtts)), [('127.0.0.1', True)])
+        self.assertIn('127.0.0.1', rtts)
+
+    def test_tcp_fallback_without_icmp(self):
+        '''Without an ICMP socket, hosts are checked with TCP, a refused port is alive.'''
+        with mock.patch.object(ping, 'open_icmp_socket', return_value=(None, False)):
+            with self.assertRaises(OSError):
+                list(ping.icmp_sweep(['127.0.0.1']))
+            self.assertEqual(ping.ping_hosts(['127.0.0.1', '127.0.0.1']), {'127.0.0.1': True})
+
+    def test_tcp_alive_shares_one_deadline(self):
+        '''Unresponsive ports are connected to at once and cost one timeout together.'''
+        ports = []
+        for _ in range(3):
+            sockets, port = stalled_port()
+            for sock in sockets:
+                self.addCleanup(sock.close)
+            ports.append(port)
+        start = time.monotonic()
+        self.assertFalse(ping.tcp_alive('127.0.0.1', ports=ports, timeout=0.3))
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertTrue(ping.tcp_alive('127.0.0.1', ports=[*ports, closed_port()], timeout=0.3))
+
+    def test_rate_limiter_spaces_out_calls(self):
+        '''The limiter starts at most `rate` calls per second, 0 disables it.'''
+        limiter = ping.RateLimiter(50)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+        limiter = ping.RateLimiter(0)
+        start = time.monotonic()
+        for _ in range(100):
+            limiter.wait()
+        self.assertLess(time.monotonic() - start, 0.05)
+
+
+class NeighborTests(SimpleTestCase):
+    '''Tests for reading the kernel's neighbor tables.'''
+
+    def test_read_arp_table(self):
+        '''Complete entries are read in one pass, incomplete and empty ones are skipped.'''
+        with tempfile.NamedTemporaryFile('w', suffix='arp') as arp:
+            arp.write(
+                'IP address       HW type     Flags       HW address            Mask     Device\n'
+                '10.0.0.1         0x1         0x2         AA:BB:CC:DD:EE:01     *        eth0\n'
+                '10.0.0.2         0x1         0x0         00:00:00:00:00:00     *        eth0\n'
+                '10.0.0.3         0x1         0x2         00:00:00:00:00:00     *        eth0\n'
+                '10.0.0.4         0x1         0x6         aa:bb:cc:dd:ee:04     *        eth1\n')
+            arp.flush()
+            self.assertEqual(neighbors.read_arp_table(arp.name), {
+                '10.0.0.1': 'aa:bb:cc:dd:ee:01',
+                '10.0.0.4': 'aa:bb:cc:dd:ee:04',
+            })
+        self.assertEqual(neighbors.read_arp_table('/nonexistent/arp'), {})
+
+    @staticmethod
+    def neighbor_message(family, address, mac, state=0x02):
+        '''Builds a RTM_NEWNEIGH payload with a NDA_DST and a NDA_LLADDR attribute.'''
+        payload = struct.pack('=BBHiHBB', family, 0, 0, 2, state, 0, 0)
+        for attr_type, value in ((neighbors.NDA_DST, socket.inet_pton(family, address)),
+                                 (neighbors.NDA_LLADDR, mac)):
+            payload += struct.pack('=HH', 4 + len(value), attr_type) + value
+            payload += bytes(-len(payload) % 4)
+        return payload
+
+    def test_parse_neighbor_message(self):
+        '''IPv4 and IPv6 entries are parsed, unusable and empty entries are skipped.'''
+        mac = bytes.fromhex('aabbccddee01')
+        self.assertEqual(neighbors.parse_neighbor_message(
+            self.neighbor_message(socket.AF_INET, '10.0.0.1', mac)),
+            ('10.0.0.1', 'aa:bb:cc:dd:ee:01'))
+        self.assertEqual(neighbors.parse_neighbor_message(
+            self.neighbor_message(socket.AF_INET6, 'fd00::1', mac)),
+            ('fd00::1', 'aa:bb:cc:dd:ee:01'))
+        self.assertIsNone(neighbors.parse_neighbor_message(
+            self.neighbor_message(socket.AF_INET, '10.0.0.2', mac, state=0x20)))
+        self.assertIsNone(neighbors.parse_neighbor_message(
+            self.neighbor_message(socket.AF_INET, '10.0.0.3', bytes(6))))
+        self.assertIsNone(neighbors.parse_neighbor_message(b'\x02'))
+
+    def test_subnets(self):
+        '''Comma separated IPv4 and IPv6 prefixes are parsed and validated.'''
+        subnets = auto_discover.parse_subnets('192.168.1.0/24, fd00::1/64,')
+        self.assertEqual([str(subnet) for subnet in subnets], ['192.168.1.0/24', 'fd00::/64'])
+        self.assertTrue(auto_discover.in_subnets('fd00::abcd', subnets))
+        self.assertFalse(auto_discover.in_subnets('192.168.2.1', subnets))
+        validate_subnets('10.0.0.0/8, fd00::/64')
+        with self.assertRaises(ValidationError):
+            validate_subnets('10.0.0.0/8, fd00::/129')
+        self.assertEqual(auto_discover.url_host('fd00::1'), '[fd00::1]')
+
+    def test_large_and_ipv6_prefixes_are_not_swept(self):
+        '''Only neighbors are discovered in prefixes too large to sweep.'''
+        with mock.patch.object(auto_discover, 'discover_neighbors',
+                               return_value=(['fd00::5', '10.1.2.3'], {'fd00::5'})) as discover, \
+                mock.patch.object(auto_discover, 'discover_hosts',
+                                  return_value=iter(())) as discover_hosts:
+            list(auto_discover.discover_network_stream('fd00::/64, 10.0.0.0/8'))
+        self.assertEqual([str(subnet) for subnet in discover.call_args.args[0]],
+                         ['fd00::/64', '10.0.0.0/8'])
+        discover_hosts.assert_called_once()
+        self.assertEqual(discover_hosts.call_args.args[0], ['fd00::5', '10.1.2.3'])
+        self.assertEqual(discover_hosts.call_args.kwargs['confirmed'], {'fd00::5'})
+
+    def test_discovered_hosts_get_their_mac_from_one_table_read(self):
+        '''The neighbor table is read once per sweep for all alive hosts.'''
+        servers = []
+        with mock.patch.object(auto_discover, 'ping_sweep',
+                               return_value=[('10.0.0.1', True), ('10.0.0.2', True),
+                                             ('10.0.0.3', False)]), \
+                mock.patch.object(auto_discover, 'read_neighbor_table',
+                                  return_value={'10.0.0.1': 'aa:bb:cc:dd:ee:01'}) as table, \
+                mock.patch.object(auto_discover, 'fingerprint_hosts',
+                                  side_effect=lambda ips, **kwargs: {ip: [] for ip in ips}), \
+                mock.patch.object(auto_discover, 'resolve_hostnames', return_value={}):
+            list(auto_discover.discover_hosts(['10.0.0.1', '10.0.0.2', '10.0.0.3'], {}, servers))
+        table.assert_called_once_with()
+        self.assertEqual({server['ip_address']: server['mac_address'] for server in servers},
+                         {'10.0.0.1': 'aa:bb:cc:dd:ee:01', '10.0.0.2': None})
+
+
+class DiscoveryDiffTests(TestCase):
+    '''Tests for incremental discovery scans.'''
+
+    def service(self, port, name):
+        return {'name': name, 'endpoint': '10.0.0.1', 'port': port, 'url': None}
+
+    def test_diff_discovery(self):
+        '''Added, vanished and changed hosts are reported, MAC addresses are compared
+        normalized and unchanged hosts are left out.'''
+        previous = {
+            '10.0.0.1': {'mac_address': 'AA-BB-CC-DD-EE-01',
+                         'services': [self.service(22, 'SSH'), self.service(80, 'Nginx')]},
+            '10.0.0.2': {'mac_address': 'aa:bb:cc:dd:ee:02', 'services': []},
+            '10.0.0.3': {'mac_address': None, 'services': [self.service(22, 'SSH')]},
+        }
+        servers = [
+            {'ip_address': '10.0.0.1', 'mac_address': 'aa:bb:cc:dd:ee:01',
+             'services': [self.service(80, 'Grafana'), self.service(443, 'Grafana')]},
+            {'ip_address': '10.0.0.3', 'mac_address': 'aa:bb:cc:dd:ee:03',
+             'services': [self.service(22, 'SSH')]},
+            {'ip_address': '10.0.0.4', 'mac_address': None, 'services': []},
+        ]
+        self.assertEqual(auto_discover.diff_discovery(previous, servers), {
+            'added': ['10.0.0.4'],
+            'vanished': ['10.0.0.2'],
+            'changed': [{'ip_address': '10.0.0.1', 'mac_address': None,
+                         'services_added': [443], 'services_removed': [22],
+                         'services_changed': [80]}],
+        })
+        previous['10.0.0.3']['mac_address'] = 'aa:bb:cc:dd:ee:30'
+        changed = auto_discover.diff_discovery(previous, servers)['changed']
+        self.assertEqual(changed[1]['mac_address'], ['aa:bb:cc:dd:ee:30', 'aa:bb:cc:dd:ee:03'])
+
+    def test_known_services_are_not_probed_again(self):
+        '''Open ports of a known host reuse the previous service, DNS is only queried
+        again if the host served DNS before.'''
+        known = {'10.0.0.1': [self.service(8123, 'Home Assistant')]}
+        with mock.patch.object(auto_discover, 'probe_targets',
+                               side_effect=lambda targets, **kwargs: {
+                                   target: target[1] in (22, 8123) for target in targets}) \
+                as probe_targets, \
+                mock.patch.object(auto_discover, 'check_service',
+                                  return_value=self.service(22, 'SSH')) as check_service, \
+                mock.patch.object(auto_discover, 'check_dns', return_value=[]) as check_dns:
+            services = auto_discover.fingerprint_hosts(['10.0.0.1'], ports=[22, 80], known=known)
+        self.assertIn(('10.0.0.1', 8123), probe_targets.call_args.args[0])
+        check_service.assert_called_once_with('10.0.0.1', 22)
+        check_dns.assert_not_called()
+        self.assertEqual([service['name'] for service in services['10.0.0.1']],
+                         ['SSH', 'Home Assistant'])
+
+    def test_known_hosts_are_seeded_from_the_last_scan_and_the_inventory(self):
+        '''The last completed scan and the network's servers seed the next scan,
+        hosts outside the scanned subnet are dropped.'''
+        network = Network.objects.create(name='lan', subnet='10.0.0.0/24')
+        DiscoveryJob.objects.create(task_id='old', network=network, status='DONE',
+                                    finished_at=timezone.now(), results=[
+            {'ip_address': '10.0.0.1', 'hostname': 'nas', 'mac_address': None,
+             'services': [self.service(22, 'SSH')]},
+            {'ip_address': '10.0.1.1', 'hostname': 'other', 'services': []},
+        ])
+        server = Server.objects.create(name='nas', ip_address='10.0.0.1', network=network,
+                                       mac_address='aa:bb:cc:dd:ee:01')
+        Service.objects.create(name='SSH', server=server, endpoint='10.0.0.1', port=22)
+        Service.objects.create(name='Web', server=server, endpoint='10.0.0.1', port=80)
+        self.assertEqual(known_hosts(network, '10.0.0.0/24'), {'10.0.0.1': {
+            'hostname': 'nas',
+            'mac_address': 'aa:bb:cc:dd:ee:01',
+            'services': [self.service(22, 'SSH'),
+                         {'name': 'Web', 'endpoint': '10.0.0.1', 'port': 80, 'url': None}],
+        }})
+
+
+class DiscoveryScheduleTests(TestCase):
+    '''Tests for scheduled discoveries and the host observation history.'''
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.network = Network.objects.create(name='lan', subnet='10.0.0.0/24',
+                                              discovery_schedule='hourly')
+
+    def test_enqueue_scheduled_discoveries(self):
+        '''Due networks are queued once and their next run skips missed runs.'''
+        Network.objects.create(name='manual', subnet='10.0.1.0/24')
+        Network.objects.create(name='later', subnet='10.0.2.0/24', discovery_schedule='daily',
+                               discovery_next_run=self.now + timezone.timedelta(minutes=1))
+        self.network.discovery_next_run = self.now - timezone.timedelta(hours=2, minutes=30)
+        self.network.save()
+
+        self.assertEqual(discovery_jobs.enqueue_scheduled_discoveries(self.now), 1)
+        self.network.refresh_from_db()
+        self.assertEqual(self.network.discovery_next_run,
+                         self.now + timezone.timedelta(minutes=30))
+        self.assertEqual(DiscoveryJob.objects.get().network, self.network)
+
+        # The network's job is still queued, it is not queued twice
+        self.assertEqual(discovery_jobs.enqueue_scheduled_discoveries(
+            self.now + timezone.timedelta(hours=1)), 2)
+        self.assertEqual(DiscoveryJob.objects.filter(network=self.network).count(), 1)
+
+    def test_completed_job_records_observations(self):
+        '''A completed job appends one observation per host and fills in missing
+        MAC addresses of the network's servers.'''
+        server = Server.objects.create(name='nas', ip_address='10.0.0.1', network=self.network)
+
+        def discover_network_stream(subnet, servers=None, **kwargs):
+            yield 'Pinging 10.0.0.1... alive.\n'
+            return [{'ip_address': '10.0.0.1', 'hostname': 'nas', 'rtt': 0.5,
+                     'mac_address': 'aa:bb:cc:dd:ee:01',
+                     'services': [{'name': 'SSH', 'endpoint': '10.0.0.1', 'port': 22,
+                                   'url': None}]}]
+
+        job = discovery_jobs.enqueue_discovery(self.network)
+        with mock.patch.object(discovery_jobs, 'discover_network_stream',
+                               side_effect=discover_network_stream):
+            discovery_jobs.run_discovery_job(discovery_jobs.claim_discovery_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'DONE')
+        self.assertEqual(job.diff['changed'][0]['services_added'], [22])
+        observation = HostObservation.objects.get()
+        self.assertEqual((observation.job, observation.ip_address, observation.open_ports,
+                          observation.seen_at), (job, '10.0.0.1', [22], job.finished_at))
+        server.refresh_from_db()
+        self.assertEqual(server.mac_address, 'aa:bb:cc:dd:ee:01')
+
+
+class AdaptiveSweepTests(TestCase):
+    '''Tests for the adaptive throttling of sweeps and the order hosts are swept in.'''
+
+    def test_window_grows_and_backs_off_on_rising_timeouts(self):
+        '''The window grows by one per result in slow start, is halved when timeouts
+        rise and then only grows additively.'''
+        controller = ping.AdaptiveConcurrency(64)
+        self.assertEqual(controller.limit(), 16)
+        for _ in range(10):
+            controller.record(timed_out=False)
+        self.assertEqual(controller.limit(), 26)
+
+        windows = []
+        for _ in range(10):
+            controller.record(timed_out=True)
+            windows.append(controller.limit())
+        # Slow start goes on until the rise is noticed, then the window is halved once
+        self.assertEqual(max(windows), 32)
+        self.assertEqual(windows[-1], 16)
+        self.assertFalse(controller.slow_start)
+        self.assertAlmostEqual(controller.rate_factor(), controller.window / 64)
+
+        window = controller.window
+        for _ in range(8):
+            controller.record(timed_out=False)
+        self.assertAlmostEqual(controller.window, window + 1)
+
+    def test_steady_timeouts_do_not_back_off(self):
+        '''Unused addresses time out all sweep long, only a rise of the ratio counts.'''
+        controller = ping.AdaptiveConcurrency(64)
+        for index in range(200):
+            controller.record(timed_out=index % 2 == 0)
+        self.assertTrue(controller.slow_start)
+        self.assertEqual(controller.limit(), 64)
+
+    def test_window_stays_above_the_minimum(self):
+        '''Repeated back offs never go below `minimum`.'''
+        controller = ping.AdaptiveConcurrency(64, minimum=4)
+        for _ in range(50):
+            controller.record(timed_out=False)
+        for _ in range(500):
+            controller.record(timed_out=True)
+        self.assertGreaterEqual(controller.limit(), 4)
+
+    def test_likely_alive_hosts(self):
+        '''Servers come first, then recently seen hosts and the DHCP range.'''
+        network = Network.objects.create(name='lan', subnet='10.0.0.0/24',
+                                         dhcp_range='10.0.0.100-10.0.0.102')
+        Server.objects.create(name='nas', ip_address='10.0.0.5', network=network)
+        for ip, days in (('10.0.0.7', 1), ('10.0.0.8', 30), ('10.0.0.101', 2)):
+            HostObservation.objects.create(network=network, ip_address=ip,
+                                           seen_at=timezone.now() - timezone.timedelta(days=days))
+        self.assertEqual(discovery_jobs.likely_alive_hosts(network),
+                         ['10.0.0.5', '10.0.0.7', '10.0.0.101', '10.0.0.100', '10.0.0.102'])
+
+    def test_likely_alive_hosts_are_swept_first(self):
+        '''Priority addresses of the subnet are swept in a pass of their own.'''
+        with mock.patch.object(auto_discover, 'discover_hosts',
+                               return_value=iter(())) as discover_hosts:
+            list(auto_discover.discover_network_stream(
+                '10.0.0.0/29', priority=['10.0.0.5', '192.168.0.1']))
+        self.assertEqual([call.args[0] for call in discover_hosts.call_args_list], [
+            ['10.0.0.5'], ['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4', '10.0.0.6']])
+
+
+class UptimeRollupTests(TestCase):
+    '''Tests for the uptime samples and their minute, hour and day rollups.'''
+
+    def setUp(self):
+        self.server = Server.objects.create(name='server')
+        self.day = timezone.datetime(2026, 10, 12, tzinfo=timezone.timezone.utc)
+        for minute, seconds, online in ((600, 10, True), (600, 40, False), (601, 5, True),
+                                        (690, 0, True), (720, 30, False)):
+            self.sample(minute, seconds, online)
+
+    def sample(self, minute, seconds=0, online=True):
+        UptimeSample.objects.create(server=self.server, online=online, timestamp=self.day +
+                                    timezone.timedelta(minutes=minute, seconds=seconds))
+
+    def at(self, minute):
+        return self.day + timezone.timedelta(minutes=minute)
+
+    def rollups(self, level):
+        return list(UptimeRollup.objects.filter(level=level).order_by('bucket')
+                    .values_list('bucket', 'online', 'total'))
+
+    def test_rollup_builds_complete_buckets_once(self):
+        '''Only buckets that ended before the rollup delay are built, a second run
+        does not write them again.'''
+        now = self.at(723)  # 12:03, buckets up to 12:01 are complete
+        self.assertEqual(uptime.rollup_uptime(now), 6)
+        self.assertEqual(self.rollups('minute'), [
+            (self.at(600), 1, 2), (self.at(601), 1, 1), (self.at(690), 1, 1),
+            (self.at(720), 0, 1)])
+        self.assertEqual(self.rollups('hour'), [(self.at(600), 2, 3), (self.at(660), 1, 1)])
+        self.assertEqual(self.rollups('day'), [])
+        self.assertEqual(uptime.rollup_uptime(now), 0)
+
+        # The open hour is built from the minute buckets of both runs
+        self.sample(721)
+        uptime.rollup_uptime(self.at(24 * 60 + 3))
+        self.assertEqual(self.rollups('hour')[-1], (self.at(720), 1, 2))
+        self.assertEqual(self.rollups('day'), [(self.day, 4, 6)])
+
+    def test_rollup_is_idempotent(self):
+        '''Rolling up a range again rebuilds its buckets instead of adding to them.'''
+        uptime.rollup_uptime(self.at(723))
+        AppState.objects.update(last_uptime_rollup=None)
+        uptime.rollup_uptime(self.at(723))
+        self.assertEqual(UptimeRollup.objects.filter(level='minute').count(), 4)
+        self.assertEqual(self.rollups('hour')[0], (self.at(600), 2, 3))
+
+    def test_bucket_counts_combine_rollups_and_recent_samples(self):
+        '''Rolled up buckets are read from the rollups, later ones from the samples.'''
+        uptime.rollup_uptime(self.at(723))
+        self.sample(725, online=True)
+        rolled_up = AppState.objects.get().last_uptime_rollup
+        counts = uptime.bucket_counts('hour', self.at(600), self.at(780), rolled_up)
+        self.assertEqual(counts, {
+            (self.server.id, None, self.at(600)): [2, 3],
+            (self.server.id, None, self.at(660)): [1, 1],
+            (self.server.id, None, self.at(720)): [1, 2],
+        })
+        self.assertEqual(uptime.uptime_availability(self.at(600), self.at(780),
+                                                    server=self.server), 4 / 6)
+
+    def test_prune_keeps_data_that_was_not_rolled_up(self):
+        '''Samples and buckets older than their retention are deleted, unless they
+        have not been rolled up into the next level yet.'''
+        self.assertEqual(uptime.prune_uptime(self.at(10 * 24 * 60)), 0)
+        uptime.rollup_uptime(self.at(723))
+        self.sample(725)
+        deleted = uptime.prune_uptime(self.at(10 * 24 * 60))
+        self.assertEqual(list(UptimeSample.objects.values_list('timestamp', flat=True)),
+                         [self.at(725)])
+        # The minute bucket of the open hour is kept until the hour is rolled up
+        self.assertEqual(self.rollups('minute'), [(self.at(720), 0, 1)])
+        self.assertEqual(len(self.rollups('hour')), 2)
+        self.assertEqual(deleted, 5 + 3)
+
+
+class UptimeReportTests(TestCase):
+    '''Tests for the uptime report API.'''
+
+    def setUp(self):
+        caches['status'].clear()
+        self.now = timezone.datetime(2026, 10, 12, 12, tzinfo=timezone.timezone.utc)
+        self.start = self.now - timezone.timedelta(days=10)
+        self.homelab = Homelab.objects.create(name='homelab')
+        self.server = Server.objects.create(name='flaky', homelab=self.homelab)
+        self.gaps = Server.objects.create(name='gaps', homelab=self.homelab)
+        # Hours 2-3 and 6 are down
+        for hour, online in enumerate([60, 60, 0, 10, 60, 60, 20, 60, 60, 60]):
+            self.bucket(self.server, hour, online)
+        # Hour 1 has no probes, so hours 0 and 2 are separate outages
+        self.bucket(self.gaps, 0, 0)
+        self.bucket(self.gaps, 2, 0)
+        AppState.ensure_exists()
+        AppState.objects.update(last_uptime_rollup=self.now)
+        patcher = mock.patch('django.utils.timezone.now', return_value=self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def bucket(self, server, hour, online):
+        UptimeRollup.objects.create(server=server, level='hour', online=online, total=60,
+                                    bucket=self.start + timezone.timedelta(hours=hour))
+
+    def test_uptime_report(self):
+        '''Availability, outages, MTTR and MTBF are computed per server.'''
+        report = analytics.uptime_report([self.server, self.gaps], self.start,
+                                         self.start + timezone.timedelta(days=1))
+        self.assertEqual(report['level'], 'hour')
+        flaky = report['servers'][self.server.id]
+        self.assertAlmostEqual(flaky['availability'], 450 / 600 * 100)
+        self.assertEqual(flaky['probes'], 600)
+        self.assertEqual([(outage['start'], outage['duration']) for outage in flaky['outages']], [
+            ((self.start + timezone.timedelta(hours=2)).isoformat(), 7200),
+            ((self.start + timezone.timedelta(hours=6)).isoformat(), 3600)])
+        self.assertEqual((flaky['downtime'], flaky['mttr'], flaky['mtbf']),
+                         (3 * 3600, 1.5 * 3600, 3.5 * 3600))
+        gaps = report['servers'][self.gaps.id]
+        self.assertEqual((gaps['availability'], len(gaps['outages'])), (0, 2))
+        self.assertAlmostEqual(report['availability'], 450 / 720 * 100)
+
+    def test_outage_intervals(self):
+        '''Runs of down buckets end at other servers, up buckets and gaps.'''
+        ids, starts, ends = analytics.outage_intervals(
+            np.array([1, 1, 1, 2, 2]), np.array([0., 60, 180, 240, 300]),
+            np.array([True, True, True, True, True]), 60)
+        self.assertEqual((ids.tolist(), starts.tolist(), ends.tolist()),
+                         ([1, 1, 2], [0, 180, 240], [120, 240, 360]))
+        self.assertEqual([len(array) for array in analytics.outage_intervals(
+            np.array([]), np.array([]), np.array([], dtype=bool), 60)], [0, 0, 0])
+
+    def test_report_api(self):
+        '''Reports are served per server and per homelab, malformed ranges are rejected.'''
+        query = f'?start={self.start.isoformat()}&end=2026-10-03T12:00:00'.replace('+', '%2B')
+        response = self.client.get(
+            f'/uptime_report/DEFAULT_API_KEY/server/{self.server.id}/{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['servers'][str(self.server.id)]['probes'], 600)
+        report = self.client.get(
+            f'/uptime_report/DEFAULT_API_KEY/homelab/{self.homelab.id}/{query}').json()
+        self.assertEqual(len(report['servers']), 2)
+        self.assertEqual(self.client.get(f'/uptime_report/DEFAULT_API_KEY/server/'
+                                         f'{self.server.id}/?start=yesterday').status_code, 400)
+        self.assertEqual(self.client.get(
+            f'/uptime_report/wrong/server/{self.server.id}/').status_code, 403)
+
+
+class LatencyTests(TestCase):
+    '''Tests for the probe latencies and their hourly histograms.'''
+
+    def setUp(self):
+        self.server = Server.objects.create(name='server')
+        self.service = Service.objects.create(name='service', server=self.server)
+        self.hour = timezone.datetime(2026, 10, 12, 10, tzinfo=timezone.timezone.utc)
+
+    def sample(self, minutes, rtt=None, ttfb=None, service=False):
+        UptimeSample.objects.create(server=None if service else self.server,
+                                    service=self.service if service else None,
+                                    online=True, rtt=rtt, ttfb=ttfb,
+                                    timestamp=self.hour + timezone.timedelta(minutes=minutes))
+
+    def test_histogram_percentile(self):
+        '''Percentiles are interpolated inside their bucket, the overflow bucket
+        reports the last edge.'''
+        counts = [0] * (len(LatencyHistogram.EDGES) + 1)
+        counts[3] = 10  # 5 - 10 ms
+        self.assertEqual(uptime.histogram_percentile(counts, 0.5), 7.5)
+        counts[-1] = 10
+        self.assertEqual(uptime.histogram_percentile(counts, 0.95), 5000.0)
+        self.assertIsNone(uptime.histogram_percentile([0] * len(counts), 0.5))
+
+    def test_latency_histograms(self):
+        '''Samples are counted per target, metric and hour in their latency bucket.'''
+        for minutes, rtt in ((0, 0.5), (10, 3), (20, 3), (70, 7000)):
+            self.sample(minutes, rtt=rtt)
+        self.sample(5, rtt=4, ttfb=40, service=True)
+        self.sample(30)
+        histograms = {(histogram.server_id, histogram.service_id, histogram.metric,
+                       histogram.bucket): histogram.get_counts()
+                      for histogram in uptime.latency_histograms(
+                          self.hour, self.hour + timezone.timedelta(hours=2))}
+        self.assertEqual(len(histograms), 4)
+        connect = histograms[(self.server.id, None, 'connect', self.hour)]
+        self.assertEqual((connect[0], connect[2], sum(connect)), (1, 2, 3))
+        self.assertEqual(histograms[(self.server.id, None, 'connect',
+                                     self.hour + timezone.timedelta(hours=1))][-1], 1)
+        self.assertEqual(histograms[(None, self.service.id, 'ttfb', self.hour)][5], 1)
+
+    def test_latency_summaries_and_report_rtts(self):
+        '''Rolled up histograms and samples of the open hour are summed.'''
+        for minutes in range(10):
+            self.sample(minutes, rtt=8)
+        AppState.ensure_exists()
+        with mock.patch('django.utils.timezone.now',
+                        return_value=self.hour + timezone.timedelta(minutes=65)):
+            uptime.rollup_uptime()
+            for minutes in range(60, 64):
+                self.sample(minutes, rtt=1.5)
+            counts = uptime.server_latency_counts([self.server.id], self.hour,
+                                                  self.hour + timezone.timedelta(hours=2))
+            summaries = uptime.latency_summaries(servers=[self.server],
+                                                 since=self.hour - timezone.timedelta(hours=1))
+        self.assertEqual(LatencyHistogram.objects.count(), 1)
+        self.assertEqual((counts[self.server.id][1], counts[self.server.id][3]), (4, 10))
+        self.assertEqual(summaries[('server', self.server.id)]['connect']['probes'], 10)
+        self.assertEqual(summaries[('server', self.server.id)]['connect']['p50'], 7.5)
+
+    def test_probe_ttfbs(self):
+        '''The time to the first response byte is measured, silent targets are left out.'''
+        listener, port = listening_port()
+        self.addCleanup(listener.close)
+        silent, silent_port = listening_port()
+        self.addCleanup(silent.close)
+
+        def respond():
+            connection, _ = listener.accept()
+            with connection:
+                connection.recv(1024)
+                connection.sendall(b'HTTP/1.1 200 OK\r\n\r\n')
+
+        thread = threading.Thread(target=respond)
+        thread.start()
+        ttfbs = probe.probe_ttfbs([('127.0.0.1', port, False), ('127.0.0.1', silent_port, False),
+                                   ('127.0.0.1', closed_port(), False)], timeout=0.3)
+        thread.join()
+        self.assertEqual(list(ttfbs), [('127.0.0.1', port, False)])
+
+
+class StatusTransitionTests(TestCase):
+    '''Tests for the log of online state changes.'''
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = User.objects.create_user(username='user', password='password')
+        self.homelab = Homelab.objects.create(name='homelab')
+        self.server = Server.objects.create(name='nas', homelab=self.homelab, user=self.user,
+                                            online=True, latency=2.5)
+        self.service = Service.objects.create(name='web', server=self.server, online=None)
+
+    def test_record_transitions(self):
+        '''Only changed targets with a previous state are logged.'''
+        unchanged = Server.objects.create(name='unchanged', online=False)
+        new = Server.objects.create(name='new', online=True)
+        previous = {('server', self.server.id): False, ('server', unchanged.id): False,
+                    ('service', self.service.id): True}
+        self.assertEqual(poller.record_transitions([self.server, unchanged, new], [self.service],
+                                                   previous, timestamp=self.now), 2)
+        transitions = {(transition.target(), transition.old_state, transition.new_state,
+                        transition.latency) for transition in StatusTransition.objects.all()}
+        self.assertEqual(transitions, {(self.server, False, True, 2.5),
+                                       (self.service, True, None, None)})
+
+    @mock.patch.object(poller, 'resolve_hostnames')
+    @mock.patch.object(poller, 'probe_ttfbs', return_value={})
+    def test_poller_logs_state_changes(self, probe_ttfbs, resolve_hostnames):
+        '''A poll that changes a target's state logs the change once.'''
+        for online in (False, False):
+            with mock.patch.object(poller, 'probe_status', return_value={
+                    'servers': {self.server.id: online},
+                    'services': {self.service.id: 'No endpoint provided.'}}):
+                poller.poll_due_targets(self.now)
+            Server.objects.update(next_check=None)
+        transition = StatusTransition.objects.get()
+        self.assertEqual((transition.server, transition.old_state, transition.new_state),
+                         (self.server, True, False))
+
+    def test_transitions_api_and_notifications(self):
+        '''Recent changes are listed per homelab and notified to the owner.'''
+        StatusTransition.objects.create(server=self.server, old_state=True, new_state=False,
+                                        timestamp=self.now - timezone.timedelta(hours=1))
+        StatusTransition.objects.create(server=self.server, old_state=None, new_state=True,
+                                        timestamp=self.now - timezone.timedelta(hours=2))
+        StatusTransition.objects.create(server=self.server, old_state=False, new_state=True,
+                                        timestamp=self.now - timezone.timedelta(hours=30))
+        other = Server.objects.create(name='other', homelab=Homelab.objects.create(name='x'))
+        StatusTransition.objects.create(server=other, old_state=True, new_state=False,
+                                        timestamp=self.now)
+
+        response = self.client.get(f'/transitions/DEFAULT_API_KEY/{self.homelab.id}/')
+        self.assertEqual([(transition['name'], transition['old_state'], transition['new_state'])
+                          for transition in response.json()['transitions']],
+                         [('nas', True, False), ('nas', None, True)])
+        response = self.client.get(f'/transitions/DEFAULT_API_KEY/{self.homelab.id}/?hours=48')
+        self.assertEqual(len(response.json()['transitions']), 3)
+        for hours in ('0', 'x', str(24 * 91)):
+            self.assertEqual(self.client.get(f'/transitions/DEFAULT_API_KEY/{self.homelab.id}/'
+                                             f'?hours={hours}').status_code, 400)
+
+        profile = UserProfile.objects.create(user=self.user)
+        self.assertEqual([notification['title'] for notification in profile.get_notifications()],
+                         ['nas is offline.'])
@@ -7,7 +7,8 @@ urlpatterns = [
     path('dashboard/<int:homelab_id>', views.dashboard, name='dashboard'),
     path('app_state/', views.app_state, name='app_state'),
 
-    path('auto_discover_stream/<int:network_id>/<str:task_id>', views.auto_discover_stream, name='auto_discover_stream'),
+    path('auto_discover_progress/<str:task_id>/', views.auto_discover_progress, name='auto_discover_progress'),
+    path('auto_discover_cancel/<str:task_id>/', views.auto_discover_cancel, name='auto_discover_cancel'),
     path('auto_discover_results/<int:network_id>/<str:task_id>/', views.auto_discover_results, name='auto_discover_results'),
     path('auto_discover_results/<int:network_id>/', views.auto_discover_results, name='auto_discover_results'),
 
@@ -24,8 +25,16 @@ urlpatterns = [
 
     path('wake/<int:server_id>/', views.wake, name='wake'),
     path('shutdown/<int:server_id>/', views.shutdown, name='shutdown'),
-    path('is_online/<str:api_key>/<int:service_id>/<int:server_id>/', views.is_online,
-         name='is_online'),
+    path('status/<str:api_key>/<str:homelab_ids>/', views.homelab_status,
+         name='homelab_status'),
+    path('status_stream/<str:api_key>/<str:homelab_ids>/', views.homelab_status_stream,
+         name='homelab_status_stream'),
+    path('transitions/<str:api_key>/<str:homelab_ids>/', views.homelab_transitions,
+         name='homelab_transitions'),
+    path('uptime_report/<str:api_key>/server/<int:server_id>/', views.server_uptime_report,
+         name='server_uptime_report'),
+    path('uptime_report/<str:api_key>/homelab/<int:homelab_id>/', views.homelab_uptime_report,
+         name='homelab_uptime_report'),
 
     path('edit/profile/', views.edit_profile, name='edit_profile'),
     path('notifications/', views.notifications, name='notifications'),
@@ -76,8 +85,12 @@ urlpatterns = [
 
      path('create/uptime_statistic/<int:server_id>/',
           views.create_uptime_statistic, name='create_uptime_statistic'),
+     path('edit/uptime_statistic/<int:server_id>/',
+          views.edit_uptime_statistic, name='edit_uptime_statistic'),
      path('delete/uptime_statistic/<int:server_id>/',
           views.delete_uptime_statistic, name='delete_uptime_statistic'),
      path('reset/uptime_statistic/<int:server_id>/',
           views.reset_uptime_statistic, name='reset_uptime_statistic'),
+     path('uptime_heatmap/<int:server_id>/', views.uptime_heatmap, name='uptime_heatmap'),
+     path('uptime_matrix/<int:server_id>/', views.uptime_matrix, name='uptime_matrix'),
 ]
@@ -10,7 +10,10 @@ from django.db.models import Q
 
 from .models import Server, Service, Homelab, UserProfile, AppState, MaintenancePlan, \
     MaintenanceReport
-from .helpers.helpers import rate_limit, process_schedules, update_uptime_statistics
+from .helpers.helpers import process_schedules, update_uptime_statistics
+from .helpers.discovery_jobs import enqueue_scheduled_discoveries, with_last_seen
+from .helpers.resolver import cached_hostnames
+from .helpers.uptime import rollup_uptime, prune_uptime, latency_summaries
 from .forms import UserProfileForm, MaintenancePlanForm, MaintenanceReportForm
 
 from .views_exp.homelab import create_homelab, edit_homelab, delete_homelab
@@ -21,11 +24,14 @@ from .views_exp.schedule import create_schedule, edit_schedule, delete_schedule
 from .views_exp.shutdown_url import create_shutdown_url, edit_shutdown_url, delete_shutdown_url
 from .views_exp.wiki import public_wiki, create_wiki, edit_wiki, delete_wiki
 from .views_exp.uptime_statistic import create_uptime_statistic, delete_uptime_statistic, \
-    reset_uptime_statistic
-from .views_exp.auto_discover import auto_discover, auto_discover_results, auto_discover_stream
+    reset_uptime_statistic, edit_uptime_statistic, uptime_heatmap, uptime_matrix
+from .views_exp.auto_discover import auto_discover, auto_discover_results, auto_discover_progress, \
+    auto_discover_cancel
 from .views_exp.ingress import ingress, create_ingress, edit_ingress, delete_ingress
 from .views_exp.maintenance import maintenance, create_maintenance, edit_maintenance, \
     create_report, edit_report
+from .views_exp.status import homelab_status, homelab_status_stream, homelab_transitions
+from .views_exp.uptime_report import server_uptime_report, homelab_uptime_report
 
 def login_view(request):
     context = {}
@@ -119,7 +125,16 @@ def dashboard(request, homelab_id=None):
 
     homelab = user.homelabs.get(id=homelab_id)
     homelabs = user.homelabs.all()
-    servers = homelab.servers.all()
+    servers = list(with_last_seen(homelab.servers.prefetch_related('services')))
+    services = [service for server in servers for service in server.services.all()]
+    # Reverse DNS names are only read from the cache, which the status poller keeps warm
+    hostnames = cached_hostnames([server.ip_address for server in servers if server.ip_address])
+    latencies = latency_summaries(servers=servers, services=services)
+    for server in servers:
+        server.reverse_dns = hostnames.get(server.ip_address)
+        server.latency_summary = latencies.get(('server', server.id), {})
+    for service in services:
+        service.latency_summary = latencies.get(('service', service.id), {})
     networks = homelab.networks.all()
 
     networks_select = [{'name': network.name,
@@ -128,9 +143,8 @@ def dashboard(request, homelab_id=None):
                         'title': 'Performing Auto-Discover',
                         'message': 'Do you want to auto-discover servers and services in ' + \
                             f'your homelab on <u>{network.subnet}</u>?<br><br>After confirming, ' + \
-                            'the process might take a while. The page might seem ' + \
-                            'unresponsive since service discovery is not yet implemented ' + \
-                            'as a background task.<br><br>Do not refresh this page.',
+                            'the discovery runs in the background and might take a while. ' + \
+                            'You can leave the page and come back to it later.',
                         'redirect_url_confirmed': f'/auto_discover/{network.id}/',
                         'redirect_url_declined': '/dashboard/',} for network in networks]
 
@@ -242,7 +256,23 @@ def cron(request, api_key):
     app_state.save()
 
     try:
-        update_uptime_statistics()
+        cost = update_uptime_statistics()
+        app_state.last_cron_duration = cost['duration']
+        app_state.last_cron_servers = cost['servers']
+        app_state.last_cron_queries = cost['queries']
+        app_state.save(update_fields=['last_cron_duration', 'last_cron_servers',
+                                      'last_cron_queries'])
+    except Exception as e:
+        app_state.add_exception(str(e))
+
+    try:
+        rollup_uptime()
+        prune_uptime()
+    except Exception as e:
+        app_state.add_exception(str(e))
+
+    try:
+        enqueue_scheduled_discoveries()
     except Exception as e:
         app_state.add_exception(str(e))
 
@@ -269,28 +299,3 @@ def confirm(request):
         }
         return render(request, 'html_components/confirm.html', context)
     return HttpResponseBadRequest()
-
-@rate_limit
-def is_online(request, api_key, service_id, server_id):
-    '''This function is used to check if services or servers are online.
-    Returns 200 OK if the service is online, 503 Service Unavailable if not.'''
-    if api_key != os.environ.get('API_KEY', 'DEFAULT_API_KEY'):
-        return HttpResponseForbidden("Forbidden", status=403)
-
-    if service_id != 0:
-        service = Service.objects.get(id=service_id)
-        is_online = service.is_online()
-        if is_online is True:
-            return HttpResponse("OK", status=200)
-        elif is_online is False:
-            return HttpResponse("Service Unavailable", status=503)
-        else:
-            return HttpResponse(is_online, status=500)
-    if server_id != 0:
-        server = Server.objects.get(id=server_id)
-        if server.is_online():
-            return HttpResponse("OK", status=200)
-        else:
-            return HttpResponse("Service Unavailable", status=503)
-
-    return HttpResponseBadRequest("Bad Request", status=400)
@@ -1,29 +1,67 @@
-from django.http import StreamingHttpResponse
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
+from django.utils import timezone
 
-from ..models import Server, Service, Network, Homelab, \
-    AppState
-from ..helpers.helpers import discover_network_stream
-
-import uuid
+from ..models import Server, Service, Network, Homelab, DiscoveryJob
+from ..helpers.discovery_jobs import enqueue_discovery
 
 @login_required
 def auto_discover(request, network_id=None):
-    task_id = uuid.uuid4().hex
+    '''Queues a discovery of the network (or attaches to the one already running)
+    and shows its progress. Scans are incremental unless `?full=1` is given.'''
+    if not request.user.is_superuser:
+        messages.error(request, "Only admins can run discovery.")
+        return redirect('dashboard_default')
+
     network = Network.objects.filter(id=network_id, user=request.user).first()
     if not network:
         messages.error(request, "Network not found or you do not have permission to access it.")
         return redirect('dashboard_default')
+    if not network.subnet:
+        messages.error(request, "No subnet configured for auto discovery.")
+        return redirect('dashboard_default')
+
+    job = enqueue_discovery(network, user=request.user, incremental=not request.GET.get('full'))
 
     context = {
         'network': network,
-        'task_id': task_id,
+        'job': job,
+        'task_id': job.task_id,
     }
     return render(request, 'html/auto_discover.html', context)
 
+@login_required
+def auto_discover_progress(request, task_id):
+    '''Returns the state and progress log of a discovery job as JSON.'''
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Only admins can run discovery.'}, status=403)
+
+    job = get_object_or_404(DiscoveryJob, task_id=task_id, network__user=request.user)
+    return JsonResponse({
+        'status': job.status,
+        'progress': job.progress,
+        'hosts_found': len(job.results),
+        'finished': not job.is_active(),
+    })
+
+@login_required
+def auto_discover_cancel(request, task_id):
+    '''Requests the cancellation of a queued or running discovery job.'''
+    if not request.user.is_superuser:
+        messages.error(request, "Only admins can run discovery.")
+        return redirect('dashboard_default')
+
+    job = get_object_or_404(DiscoveryJob, task_id=task_id, network__user=request.user)
+    if request.method == 'POST' and job.is_active():
+        # Queued jobs are cancelled right away, running jobs by the job runner
+        DiscoveryJob.objects.filter(id=job.id, status='QUEUED') \
+            .update(status='CANCELLED', finished_at=timezone.now())
+        DiscoveryJob.objects.filter(id=job.id, status='RUNNING').update(cancel_requested=True)
+        messages.info(request, "Auto discovery cancelled.")
+    return redirect('dashboard_default')
+
 @login_required
 def auto_discover_results(request, network_id=None, task_id=None):
     '''View to auto discover servers and services in the user's homelab network.'''
@@ -129,47 +167,27 @@ def auto_discover_results(request, network_id=None, task_id=None):
         messages.error(request, "No subnet configured for auto discovery.")
         return redirect('dashboard_default')
 
-    try:
-        servers = cache.get(f"scan:{task_id}")
-        cache.delete(f"scan:{task_id}")
-    except Exception as e:
-        messages.error(request, f"Error during auto discovery: {str(e)}")
-        app_state = AppState.ensure_exists()
-        app_state.add_exception(f"Auto discovery error: {str(e)}")
+    job = DiscoveryJob.objects.filter(task_id=task_id, network=network).first()
+    if not job or job.status != 'DONE':
+        messages.error(request, "Auto discovery results not found or discovery not finished.")
         return redirect('dashboard_default')
+    servers = job.results
     homelabs = request.user.homelabs.all()
+    # Servers and services already in the inventory are offered unchecked
+    existing_ips = set(network.servers.values_list('ip_address', flat=True))
+    existing_services = set(Service.objects.filter(server__network=network)
+                            .values_list('endpoint', 'port'))
+    for server in servers:
+        server['exists'] = server['ip_address'] in existing_ips
+        for service in server['services']:
+            service['exists'] = (service['endpoint'], service['port']) in existing_services
 
     context = {
         'network_id': network.id,
         'servers': servers,
+        'diff': job.diff,
         'homelabs': homelabs,
         'user': request.user,
         }
 
     return render(request, 'html/auto_discover_results.html', context)
-
-@login_required
-def auto_discover_stream(request, network_id, task_id):
-    '''Streaming view to auto discover servers and services in the user's homelab network.'''
-    user = request.user
-    if not user.is_superuser:
-        messages.error(request, "Only admins can run discovery.")
-        return redirect('dashboard_default')
-
-    try:
-        network = Network.objects.get(id=network_id, user=user)
-    except Network.DoesNotExist:
-        messages.error(request, "Network not found.")
-        return redirect('dashboard_default')
-
-    auto_discover_network = network.subnet
-    if not auto_discover_network:
-        messages.error(request, "No subnet configured for auto discovery.")
-        return redirect('dashboard_default')
-    
-    response_generator = discover_network_stream(auto_discover_network, task_id)
-    streaming_response = StreamingHttpResponse(response_generator, content_type='text/html')
-    streaming_response['X-Frame-Options'] = 'SAMEORIGIN'
-    streaming_response['Cache-Control'] = 'no-cache'
-    streaming_response['X-Accel-Buffering'] = 'no'
-    return streaming_response
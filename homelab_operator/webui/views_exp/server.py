@@ -56,6 +56,11 @@ def edit_server(request, server_id):
                 'title': 'Uptime Statistics',
                 'description': 'This server has uptime statistics enabled.',
                 'links': [
+                    {
+                        'url': f'/edit/uptime_statistic/{server.id}/',
+                        'label': 'Configure',
+                        'fa_icon': 'fa-sliders',
+                    },
                     {
                         'url': f'/reset/uptime_statistic/{server.id}/',
                         'label': 'Reset',
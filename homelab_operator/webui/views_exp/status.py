@@ -0,0 +1,122 @@
+import os
+import json
+import time
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponseBadRequest, \
+    HttpResponseForbidden
+
+from ..models import Server, Service
+from ..helpers.helpers import rate_limit
+from ..helpers.poller import get_status, recent_transitions
+
+STATUS_STREAM_INTERVAL = 2  # Seconds between two reads of the status table
+STATUS_STREAM_HEARTBEAT = 15  # Seconds between keep-alive comments
+STATUS_STREAM_DURATION = 300  # Seconds until the stream is closed and the browser reconnects
+TRANSITIONS_MAX_HOURS = 24 * 90
+
+def parse_homelab_ids(homelab_ids):
+    '''Parses a comma separated list of homelab ids, e.g. "1" or "1,2,3".
+    Returns None if the list is malformed.'''
+    try:
+        ids = [int(homelab_id) for homelab_id in homelab_ids.split(',') if homelab_id]
+    except ValueError:
+        return None
+    return ids or None
+
+@rate_limit
+def homelab_status(request, api_key, homelab_ids):
+    '''Returns the online status of every server and service in one or more homelabs
+    in a single response. States are read from the status poller, see get_status().'''
+    if api_key != os.environ.get('API_KEY', 'DEFAULT_API_KEY'):
+        return HttpResponseForbidden("Forbidden", status=403)
+
+    ids = parse_homelab_ids(homelab_ids)
+    if ids is None:
+        return HttpResponseBadRequest("Bad Request", status=400)
+
+    servers = Server.objects.filter(homelab_id__in=ids)
+    services = Service.objects.filter(server__homelab_id__in=ids)
+    return JsonResponse(get_status(servers, services))
+
+def read_stored_status(homelab_ids):
+    '''Reads the stored status of all polled servers and services of the given homelabs.'''
+    servers = Server.objects.filter(homelab_id__in=homelab_ids, last_checked__isnull=False) \
+        .values_list('id', 'online')
+    services = Service.objects.filter(server__homelab_id__in=homelab_ids,
+                                      last_checked__isnull=False) \
+        .values_list('id', 'online', 'status_message')
+    return {
+        'servers': {server_id: online for server_id, online in servers},
+        'services': {service_id: message or online for service_id, online, message in services},
+    }
+
+def status_event_stream(homelab_ids):
+    '''Yields server-sent events with the status changes of the given homelabs.
+    The first event contains the full state. Only the stored state written by the
+    status poller is read, so open streams do not cause additional probes.'''
+    yield f'retry: {STATUS_STREAM_INTERVAL * 1000}\n\n'
+
+    last_status = {'servers': {}, 'services': {}}
+    last_event = time.monotonic()
+    deadline = last_event + STATUS_STREAM_DURATION
+    while time.monotonic() < deadline:
+        status = read_stored_status(homelab_ids)
+        changes = {
+            kind: {target_id: state for target_id, state in status[kind].items()
+                   if last_status[kind].get(target_id) != state}
+            for kind in status
+        }
+        last_status = status
+
+        if changes['servers'] or changes['services']:
+            yield f'data: {json.dumps(changes)}\n\n'
+            last_event = time.monotonic()
+        elif time.monotonic() - last_event >= STATUS_STREAM_HEARTBEAT:
+            yield ': keep-alive\n\n'
+            last_event = time.monotonic()
+
+        time.sleep(STATUS_STREAM_INTERVAL)
+
+@rate_limit
+def homelab_status_stream(request, api_key, homelab_ids):
+    '''Server-sent events stream pushing status changes of one or more homelabs.'''
+    if api_key != os.environ.get('API_KEY', 'DEFAULT_API_KEY'):
+        return HttpResponseForbidden("Forbidden", status=403)
+
+    ids = parse_homelab_ids(homelab_ids)
+    if ids is None:
+        return HttpResponseBadRequest("Bad Request", status=400)
+
+    streaming_response = StreamingHttpResponse(status_event_stream(ids),
+                                               content_type='text/event-stream')
+    streaming_response['Cache-Control'] = 'no-cache'
+    streaming_response['X-Accel-Buffering'] = 'no'
+    return streaming_response
+
+@rate_limit
+def homelab_transitions(request, api_key, homelab_ids):
+    '''Returns the online state changes of the servers and services of one or more
+    homelabs in the last `hours` hours (default 24), newest first.'''
+    if api_key != os.environ.get('API_KEY', 'DEFAULT_API_KEY'):
+        return HttpResponseForbidden("Forbidden", status=403)
+
+    ids = parse_homelab_ids(homelab_ids)
+    try:
+        hours = int(request.GET.get('hours', 24))
+    except ValueError:
+        hours = None
+    if ids is None or hours is None or not 0 < hours <= TRANSITIONS_MAX_HOURS:
+        return HttpResponseBadRequest("Bad Request", status=400)
+
+    transitions = recent_transitions(
+        hours=hours,
+        servers=Server.objects.filter(homelab_id__in=ids),
+        services=Service.objects.filter(server__homelab_id__in=ids))
+    return JsonResponse({'transitions': [{
+        'kind': 'server' if transition.server_id else 'service',
+        'id': transition.server_id or transition.service_id,
+        'name': transition.target().name,
+        'old_state': transition.old_state,
+        'new_state': transition.new_state,
+        'timestamp': transition.timestamp.isoformat(),
+        'latency': transition.latency,
+    } for transition in transitions]})
@@ -0,0 +1,63 @@
+import os
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseForbidden, \
+    HttpResponseNotFound
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import Server, Homelab
+from ..helpers.helpers import rate_limit
+from ..helpers.analytics import uptime_report
+
+UPTIME_REPORT_DEFAULT_DAYS = 30
+
+def parse_report_range(request):
+    '''Parses the `start` and `end` query parameters (ISO 8601, UTC if no offset is
+    given). Defaults to the last UPTIME_REPORT_DEFAULT_DAYS days up to the current
+    minute. Returns (start, end), or None if a parameter is malformed.'''
+    now = timezone.now().replace(second=0, microsecond=0)
+    try:
+        end = parse_datetime(request.GET['end']) if 'end' in request.GET else now
+        start = parse_datetime(request.GET['start']) if 'start' in request.GET else \
+            end - timezone.timedelta(days=UPTIME_REPORT_DEFAULT_DAYS)
+    except ValueError:
+        return None
+    if start is None or end is None:
+        return None
+
+    start, end = [moment if timezone.is_aware(moment) else
+                  timezone.make_aware(moment, timezone.timezone.utc) for moment in (start, end)]
+    if start >= end:
+        return None
+    return start, end
+
+@rate_limit
+def server_uptime_report(request, api_key, server_id):
+    '''Returns the availability, outages, MTBF, MTTR and RTT percentiles of a server
+    between `start` and `end`, see uptime_report().'''
+    if api_key != os.environ.get('API_KEY', 'DEFAULT_API_KEY'):
+        return HttpResponseForbidden("Forbidden", status=403)
+
+    report_range = parse_report_range(request)
+    if report_range is None:
+        return HttpResponseBadRequest("Bad Request", status=400)
+
+    server = Server.objects.filter(id=server_id).first()
+    if not server:
+        return HttpResponseNotFound("Not Found")
+    return JsonResponse(uptime_report([server], *report_range))
+
+@rate_limit
+def homelab_uptime_report(request, api_key, homelab_id):
+    '''Returns the uptime report of all servers of a homelab between `start` and
+    `end`, see uptime_report().'''
+    if api_key != os.environ.get('API_KEY', 'DEFAULT_API_KEY'):
+        return HttpResponseForbidden("Forbidden", status=403)
+
+    report_range = parse_report_range(request)
+    if report_range is None:
+        return HttpResponseBadRequest("Bad Request", status=400)
+
+    homelab = Homelab.objects.filter(id=homelab_id).first()
+    if not homelab:
+        return HttpResponseNotFound("Not Found")
+    return JsonResponse(uptime_report(homelab.servers.all(), *report_range))
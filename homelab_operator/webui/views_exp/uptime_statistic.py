@@ -1,8 +1,15 @@
 from datetime import datetime
-from django.shortcuts import redirect
+from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from ..models import Server, ServerUptimeStatistic
+from ..helpers.uptime import uptime_matrix_counts
+from ..helpers.heatmap import HEATMAP_CACHE_TTL, cached_uptime_heatmap, heatmap_version
+from ..forms import ServerUptimeStatisticForm
 
 @login_required
 def create_uptime_statistic(request, server_id):
@@ -20,11 +27,43 @@ def create_uptime_statistic(request, server_id):
 
     uptime_statistic = ServerUptimeStatistic.objects.create(server=server)
     uptime_statistic.initialize_matrix()
+    # Seed the statistics with the stored hours, weighted like the checks the cron
+    # adds every CRON_INTERVAL_MINUTES
+    online, total = uptime_matrix_counts(server,
+                                         checks_per_bucket=60 / settings.CRON_INTERVAL_MINUTES)
+    uptime_statistic.set_counts([round(value) for value in online],
+                                [round(value) for value in total])
     uptime_statistic.save()
 
     messages.success(request, f"Uptime statistics created for server {server.name}")
     return redirect('dashboard_default')
 
+@login_required
+def edit_uptime_statistic(request, server_id):
+    '''View to configure the estimator of the uptime statistics of a server.'''
+    user = request.user
+    server = Server.objects.get(id=server_id, user=user)
+    uptime_statistic = server.uptime_statistic.first()
+
+    if not uptime_statistic:
+        messages.error(request, "Uptime statistics do not exist for this server")
+        return redirect('dashboard_default')
+
+    if request.method == 'POST':
+        form = ServerUptimeStatisticForm(request.POST, instance=uptime_statistic)
+        if form.is_valid():
+            form.save()
+            messages.success(request, f"Uptime statistics updated for server {server.name}")
+            return redirect('dashboard_default')
+    else:
+        form = ServerUptimeStatisticForm(instance=uptime_statistic)
+
+    context = {
+        'form': form,
+        'form_title': f'Uptime Statistics of {server.name}',
+    }
+    return render(request, 'html_components/form.html', context)
+
 @login_required
 def delete_uptime_statistic(request, server_id):
     '''View to delete uptime statistics for a server.'''
@@ -67,3 +106,31 @@ def reset_uptime_statistic(request, server_id):
 
     messages.success(request, f"Uptime statistics reset for server {server.name}")
     return redirect('dashboard_default')
+
+def uptime_heatmap_etag(request, server_id):
+    '''Returns the ETag of a server's uptime heatmap, or None if there is none.'''
+    uptime_statistic = ServerUptimeStatistic.objects \
+        .filter(server_id=server_id, server__user=request.user).first()
+    return heatmap_version(uptime_statistic) if uptime_statistic else None
+
+@login_required
+@condition(etag_func=uptime_heatmap_etag)
+def uptime_heatmap(request, server_id):
+    '''Returns the uptime heatmap of a server as SVG. The dashboard links it with
+    its version, so browsers keep it until the statistic changes and revalidate
+    it by ETag otherwise.'''
+    uptime_statistic = get_object_or_404(ServerUptimeStatistic, server_id=server_id,
+                                         server__user=request.user)
+    response = HttpResponse(cached_uptime_heatmap(uptime_statistic),
+                            content_type='image/svg+xml')
+    patch_cache_control(response, private=True, max_age=HEATMAP_CACHE_TTL)
+    return response
+
+@login_required
+def uptime_matrix(request, server_id):
+    '''Returns the probability matrix of a server's uptime statistics as plain text,
+    in the format the dashboard copied to the clipboard before the SVG heatmap.'''
+    uptime_statistic = get_object_or_404(ServerUptimeStatistic, server_id=server_id,
+                                         server__user=request.user)
+    return HttpResponse(str(uptime_statistic.get_probability_matrix()),
+                        content_type='text/plain')